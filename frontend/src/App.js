@@ -34,7 +34,16 @@ function Sidebar({ onUploadResult, onSearchResults }) {
         headers: { "Content-Type": "multipart/form-data" },
         timeout: 120000,
       });
-      onUploadResult(res.data);
+      // Processing runs as a background job: poll until it finishes
+      // (already-seen files come back with status "done" and the cached result)
+      const jobId = res.data.job_id;
+      let job = res.data;
+      while (job.status === "queued" || job.status === "running") {
+        await new Promise((r) => setTimeout(r, 1500));
+        job = (await axios.get(`${API_BASE}/jobs/${jobId}`)).data;
+      }
+      if (job.status === "failed") throw new Error(job.error || "Processing failed");
+      onUploadResult(job.result);
     } catch (e) {
       alert("Upload failed: " + (e.response?.data?.detail || e.message));
     } finally {
@@ -4,9 +4,12 @@ CREATE TABLE IF NOT EXISTS uploads (
   filepath TEXT NOT NULL,
   filetype TEXT,
   uploaded_at TEXT NOT NULL,
-  source TEXT DEFAULT 'local'
+  source TEXT DEFAULT 'local',
+  content_hash TEXT
 );
 
+CREATE INDEX IF NOT EXISTS idx_uploads_content_hash ON uploads(content_hash);
+
 CREATE TABLE IF NOT EXISTS processing_results (
   id INTEGER PRIMARY KEY AUTOINCREMENT,
   upload_id INTEGER,
@@ -1,110 +1,394 @@
 # src/api/app.py
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import FastAPI, File, UploadFile, HTTPException, Request, Header
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pathlib import Path
 from typing import Optional, Any, Dict
 import json
+import os
+import asyncio
+import uuid
+import hashlib
+import threading
+import time
 import shutil
 import traceback
 import concurrent.futures
 import functools
 import contextlib
+import collections
 import sys
 
 # --- IMPORTS ---
 try:
-    from core.orchestrator import PipelineOrchestrator
+    from core.retrieval import Retriever
+    from core.hybrid import build_retriever, load_retriever, configured_backend, configured_shards
+    from core.index_store import INDEX_DIR, is_stale, read_manifest, write_manifest
+    from core.filters import infer_modality, normalize_filters, source_modality
+    from core.dedup import dedup_if_enabled
 except ImportError:
-    PipelineOrchestrator = None
+    Retriever = None
+
+from core.cache import QueryCache
+from core import metrics
+from core.snapshots import ActiveIndex, IngestJournal, current_snapshot, gc_snapshots, new_version, publish_snapshot, read_snapshots, snapshot_dir, LEGACY_VERSION
 
 try:
-    from core.retrieval import Retriever
+    from core.jobs import JobQueue, Saturated
+    from core.storage import init_db, find_result_by_hash, register_chunks
 except ImportError:
-    Retriever = None
+    JobQueue = None
+    register_chunks = None
+
+from core.chunking import canonical_text, chunk_document, sidecar_path, source_text
+
+# --- GLOBALS ---
+_jobs = None
+_query_cache = QueryCache(
+    maxsize=int(os.getenv("QUERY_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("QUERY_CACHE_TTL", "300")),
+)
+metrics.CACHE_HITS.fn = lambda: _query_cache.hits
+metrics.CACHE_MISSES.fn = lambda: _query_cache.misses
+
+# --- INDEX BUILD (background; only when data/index is missing or stale) ---
+def _gc_snapshots(version=None):
+    try:
+        for v in gc_snapshots(INDEX_DIR, in_use=_index.in_use()):
+            print(f"   🗑️ Removed index snapshot {v}", flush=True)
+    except Exception as e:
+        print(f"   ⚠️ Snapshot cleanup failed: {e}", flush=True)
+
+# the served index; queries pin a snapshot, replaced ones are closed after their last query
+_index = ActiveIndex(on_retire=_gc_snapshots)
+_index_lock = threading.Lock()   # held while the index changes; the ingest journal is written under it
+_index_status = {
+    "state": "starting",   # starting | loading | building | ready | empty | failed
+    "files_done": 0,
+    "files_total": 0,
+    "chunks": 0,
+    "started_at": None,
+    "finished_at": None,
+    "error": None,
+}
+
+def _build_retriever():
+    """Chunk data/text, build an index and publish it as a new snapshot; returns (retriever, version)."""
+    docs = []
+    txt_dir = Path.cwd() / "data" / "text"
+    
+    if txt_dir.exists():
+        files = sorted(list(txt_dir.glob("*.txt")))
+        _index_status["files_total"] = len(files)
+        print(f"   📂 Found {len(files)} text files.", flush=True)
+        
+        for fp in files:
+            try:
+                full_text = source_text(fp) # Ignore bad chars
+                if not full_text.strip(): 
+                    print(f"   👉 {fp.name}: Skipped (Empty)", flush=True)
+                    continue
+                
+                # sentence-aware chunks with offsets into the file's raw text
+                docs.extend(chunk_document(
+                    full_text, fp.name, str(fp.resolve()),
+                    modality=source_modality(fp),
+                    ingested_at=fp.stat().st_mtime,
+                    path=str(fp.resolve())
+                ))
+                
+            except Exception as e:
+                print(f"   👉 {fp.name}: ERROR: {e}", flush=True)
+            finally:
+                _index_status["files_done"] += 1
+                _index_status["chunks"] = len(docs)
+    
+    if not docs or not Retriever:
+        print("   🧠 No chunks to index.", flush=True)
+        return None, None
+    total = len(docs)
+    docs = dedup_if_enabled(docs)
+    if len(docs) < total:
+        print(f"   🧹 Dropped {total - len(docs)} near-duplicate chunks.", flush=True)
+    _index_status["chunks"] = len(docs)
+    _register_chunks(docs)
 
-# --- SAFETY CHUNKER (Prevents Hangs) ---
-def simple_chunker(text, chunk_size=1000):
+    print(f"   🧠 Training Retriever with {len(docs)} chunks...", flush=True)
+
+    retriever = build_retriever(docs)
+    version = new_version()
+    try:
+        path = snapshot_dir(INDEX_DIR, version)
+        retriever.save(path)
+        write_manifest(path, backend=retriever.backend, source_dirs=[txt_dir], num_chunks=len(docs))
+        publish_snapshot(INDEX_DIR, version, backend=retriever.backend, num_chunks=len(docs))
+        print(f"   💾 Saved index snapshot {version} to {path}", flush=True)
+    except Exception as e:
+        print(f"   ⚠️ Could not persist index: {e}", flush=True)
+        version = None
+    return retriever, version
+
+def _attach_search(retriever):
+    if retriever is not None and not hasattr(retriever, "search"):
+        if hasattr(retriever, "retrieve"):
+            retriever.search = lambda q, k=5: retriever.retrieve(q, k)
+        elif hasattr(retriever, "query"):
+            retriever.search = lambda q, k=5: retriever.query(q, top_k=k)
+        elif hasattr(retriever, "tfidf"):
+            retriever.search = lambda q, k=5: retriever.tfidf(q, k)
+    return retriever
+
+def _chunk_count(retriever) -> int:
+    # sharded indexes keep their chunks in the shard processes
+    return retriever.num_chunks if hasattr(retriever, "num_chunks") else len(retriever.docs)
+
+def _journal():
+    return IngestJournal(INDEX_DIR)
+
+def _upload_chunks(entry: dict, text: str = None) -> list:
+    """Chunks of a file recorded in the ingest journal, cut from its canonical text."""
+    if text is None:
+        text = source_text(entry["text_path"])
+    return dedup_if_enabled(chunk_document(
+        text, Path(entry["source"]).name, entry["source"],
+        modality=entry.get("modality"),
+        ingested_at=entry.get("ingested_at"),
+        path=entry["text_path"]
+    ))
+
+def _replay_journal(retriever):
+    """Apply the API's adds and removes since the last build to a freshly loaded index; returns it."""
+    for entry in _journal().entries():
+        if entry.get("op") == "remove":
+            if retriever is not None:
+                retriever.remove_source(entry["source"])
+            continue
+        try:
+            docs = _upload_chunks(entry)
+        except OSError as e:
+            print(f"   ⚠️ Cannot re-index {entry.get('source')}: {e}", flush=True)
+            continue
+        if not docs:
+            continue
+        if retriever is None:
+            retriever = _attach_search(build_retriever(docs))   # in memory only until the next build
+        else:
+            retriever.add_documents(docs)
+    return retriever
+
+def _swap_index(new, version: str = None):
+    with _index_lock:
+        # under the lock, so no upload lands between the replay and the swap
+        new = _replay_journal(new)
+        if new is not None:
+            _index.swap(new, version)
+
+WARM_QUERIES = int(os.getenv("INDEX_WARM_QUERIES", "64"))
+_recent_queries = collections.OrderedDict()   # (query, k, filters) seen lately, replayed by _warm
+
+def _remember_query(q, k, filters):
+    key = (q, k, json.dumps(filters, sort_keys=True))
+    _recent_queries[key] = (q, k, filters)
+    _recent_queries.move_to_end(key)
+    while len(_recent_queries) > WARM_QUERIES:
+        _recent_queries.popitem(last=False)
+
+def _warm():
     """
-    A dead-simple chunker that cannot freeze.
-    It just slices string[0:1000], string[1000:2000], etc.
+    Replay recent queries on the served index: faults in its pages, fills the
+    query cache. Runs right after _swap_index, once the journal replay has
+    moved the index to the generation its queries are cached under.
     """
-    if not text:
-        return []
-    return [text[i:i+chunk_size] for i in range(0, len(text), chunk_size)]
+    with _index.acquire() as retriever:
+        if retriever is None:
+            return
+        recent = list(_recent_queries.values()) or [("climate change", 5, None)]
+        for q, k, filters in recent:
+            cached_search(retriever, q, k, filters)
 
-# --- GLOBALS ---
-_retriever = None
-_orchestrator = None
+def _load_or_build_index():
+    """
+    Runs on a background thread after startup. A saved snapshot is served right
+    away, even if stale; a rebuild then swaps in once it is trained. Files added
+    or removed through the API are replayed onto both from the ingest journal.
+    """
+    _index_status["started_at"] = time.time()
+    try:
+        if Retriever is None:
+            raise RuntimeError("retrieval backend unavailable")
+        stale = True
+        version, path = current_snapshot(INDEX_DIR)
+        if version is not None:
+            _index_status["state"] = "loading"
+            print(f"⚡ [INDEX] Loading index snapshot {version} from {path} ...", flush=True)
+            loaded = _attach_search(load_retriever(path))
+            print(f"   ✅ Loaded {_chunk_count(loaded)} chunks ({loaded.backend}).", flush=True)
+            stale = is_stale(path)
+            # RETRIEVER_BACKEND changed since the index was built
+            wanted = configured_backend()
+            if wanted and (read_manifest(path) or {}).get("backend") != wanted:
+                stale = True
+            # ... or INDEX_SHARDS did
+            if getattr(loaded, "num_shards", 1) != configured_shards():
+                stale = True
+            _swap_index(loaded, version=version)
+
+        if stale:
+            _index_status["state"] = "building"
+            print("⚡ [INDEX] Index missing or stale, rebuilding in background (Safe Mode)...", flush=True)
+            built, version = _build_retriever()
+            _swap_index(_attach_search(built), version=version)
+            _warm()
+            _gc_snapshots()
+
+        _index_status["state"] = "ready" if _index.retriever is not None else "empty"
+        if _index.retriever is None:
+            print("⚠️ [INDEX] Index empty (this is fine, just means no search results yet).", flush=True)
+        else:
+            print(f"✅ [INDEX] Index Ready (snapshot {_index.version}).", flush=True)
+    except Exception as e:
+        _index_status["state"] = "ready" if _index.retriever is not None else "failed"
+        _index_status["error"] = str(e)
+        print(f"❌ [INDEX] Index build failed: {e}", flush=True)
+        traceback.print_exc()
+    finally:
+        _index_status["finished_at"] = time.time()
+
+# --- HOT RELOAD (admin endpoint / snapshot watcher) ---
+INDEX_WATCH_S = float(os.getenv("INDEX_WATCH_S", "5"))   # 0 disables the watcher
+_reload_lock = threading.Lock()
+_reload_status = {"state": "idle", "version": None, "error": None, "started_at": None, "finished_at": None}
+
+def _reload_index(version: str):
+    """
+    Runs on a background thread that already holds _reload_lock. Loads a
+    published snapshot, swaps it in and warms it; queries in flight finish on
+    the old one, which is closed and garbage-collected after the last of them.
+    """
+    _reload_status.update(state="loading", version=version, error=None, started_at=time.time(), finished_at=None)
+    try:
+        print(f"🔄 [INDEX] Loading snapshot {version} ...", flush=True)
+        new = _attach_search(load_retriever(snapshot_dir(INDEX_DIR, version)))
+        _swap_index(new, version=version)   # replays the ingest journal onto it
+        _warm()
+        _reload_status["state"] = "ready"
+        print(f"   ✅ Now serving snapshot {version} ({_chunk_count(new)} chunks).", flush=True)
+    except Exception as e:
+        _reload_status.update(state="failed", error=str(e))
+        print(f"❌ [INDEX] Reload of {version} failed: {e}", flush=True)
+    finally:
+        _reload_status["finished_at"] = time.time()
+        _reload_lock.release()
+
+def _index_busy() -> bool:
+    return _index_status["state"] in ("starting", "loading", "building")
+
+def _watch_snapshots(stop: threading.Event):
+    """Reload when another process (e.g. scripts/build_index.py) publishes a new snapshot."""
+    while not stop.wait(INDEX_WATCH_S):
+        try:
+            version, _ = current_snapshot(INDEX_DIR)
+        except Exception:
+            continue
+        if version is None or version == _index.version or _index_busy():
+            continue
+        if _reload_status["state"] == "failed" and _reload_status["version"] == version:
+            continue   # do not retry a broken snapshot every tick
+        if _reload_lock.acquire(blocking=False):
+            _reload_index(version)
+
+def _register_chunks(docs):
+    """Record chunk offsets in retrieval_chunks; the index works without them."""
+    if register_chunks is None:
+        return
+    try:
+        register_chunks(docs)
+    except Exception as e:
+        print(f"   ⚠️ Could not record chunk offsets: {e}", flush=True)
+
+def _index_document(path: Path, text: str) -> int:
+    """
+    Make a freshly processed file searchable right away (replaces its old chunks).
+    Plain-text files are chunked from their raw content, like index builds do;
+    for other files the extracted `text` is kept next to the upload and chunked.
+    """
+    if not text or not text.strip() or Retriever is None:
+        return 0
+    modality = infer_modality(path)
+    text, text_path = canonical_text(path, None if modality == "text" else text)
+    if not text.strip():
+        return 0
+    entry = {"source": str(path.resolve()), "text_path": str(text_path.resolve()),
+             "modality": modality, "ingested_at": time.time()}
+    docs = _upload_chunks(entry, text)
+    _register_chunks(docs)
+    with _index_lock:
+        # journaled, so reloads and restarts re-index the file (see _replay_journal)
+        _journal().append("add", **entry)
+        if _index.retriever is None:
+            _index.swap(build_retriever(docs))   # in memory only until the next build
+            added = len(docs)
+        else:
+            added = _index.retriever.add_documents(docs)
+    metrics.CHUNKS_INDEXED.inc(added)
+    return added
+
+def _index_cached_upload(path: Path):
+    """
+    Index a re-uploaded file whose processing result came from the DB, unless
+    the ingest journal says it is already indexed. Returns the chunks added, or
+    None if its text is not on disk (a non-text file without a sidecar) and the
+    file has to be processed again.
+    """
+    entry = _journal().latest(str(path.resolve()))
+    if entry is not None and entry.get("op") == "add":
+        return 0
+    text_path = path if infer_modality(path) == "text" else sidecar_path(path)
+    if not text_path.is_file():
+        return None
+    return _index_document(path, source_text(text_path))
+
+def _on_job_done(job: dict, result: dict):
+    # runs on a pool thread: index the text, keep it out of the stored job result
+    text = result.pop("text", "")
+    try:
+        result["indexed_chunks"] = _index_document(Path(result.get("file", job["file"])), text)
+    except Exception as e:
+        print(f"⚠️ Indexing failed for {job['file']}: {e}", flush=True)
+        result["indexed_chunks"] = 0
 
 # --- LIFESPAN (Startup Logic) ---
 @contextlib.asynccontextmanager
 async def lifespan(app: FastAPI):
-    # 1. Initialize Orchestrator
-    global _orchestrator
+    # 1. Initialize ingestion worker pool (each worker owns a PipelineOrchestrator)
+    global _jobs
     try:
-        print("⚡ [STARTUP] Initializing Orchestrator...", flush=True)
-        _orchestrator = PipelineOrchestrator(use_llm=False)
-        print("   ✅ Orchestrator Ready.", flush=True)
+        print("⚡ [STARTUP] Starting ingestion workers...", flush=True)
+        init_db()
+        _jobs = JobQueue(on_done=_on_job_done)
+        print(f"   ✅ Orchestrator Ready ({_jobs.workers} {_jobs.mode} workers).", flush=True)
     except Exception as e:
         print(f"   ❌ [STARTUP] Orchestrator failed: {e}", flush=True)
 
-    # 2. Initialize Retriever
-    global _retriever
-    try:
-        print("⚡ [STARTUP] Building Search Index (Safe Mode)...", flush=True)
-        docs = []
-        txt_dir = Path.cwd() / "data" / "text"
-        
-        if txt_dir.exists():
-            files = sorted(list(txt_dir.glob("*.txt")))
-            print(f"   📂 Found {len(files)} text files.", flush=True)
-            
-            for fp in files:
-                print(f"   👉 Indexing: {fp.name} ... ", end="", flush=True)
-                try:
-                    full_text = fp.read_text(encoding="utf-8", errors="ignore") # Ignore bad chars
-                    if not full_text.strip(): 
-                        print("Skipped (Empty)", flush=True)
-                        continue
-                    
-                    # USE SIMPLE CHUNKER
-                    chunks = simple_chunker(full_text)
-                    
-                    for i, chunk in enumerate(chunks):
-                        docs.append({
-                            "id": f"{fp.name}_part_{i+1}",
-                            "text": chunk,
-                            "source": str(fp.resolve())
-                        })
-                    print("OK", flush=True)
-                    
-                except Exception as e:
-                    print(f"ERROR: {e}", flush=True)
-        
-        print(f"   🧠 Training Retriever with {len(docs)} chunks...", flush=True)
-        
-        if docs and Retriever:
-            _retriever = Retriever(docs)
-            # Attach search adapter
-            if not hasattr(_retriever, "search"):
-                if hasattr(_retriever, "retrieve"):
-                    _retriever.search = lambda q, k=5: _retriever.retrieve(q, k)
-                elif hasattr(_retriever, "query"):
-                    _retriever.search = lambda q, k=5: _retriever.query(q, top_k=k)
-                elif hasattr(_retriever, "tfidf"):
-                    _retriever.search = lambda q, k=5: _retriever.tfidf(q, k)
-            print(f"✅ [STARTUP] Index Ready.", flush=True)
-        else:
-            print("⚠️ [STARTUP] Index empty (this is fine, just means no search results yet).", flush=True)
-            
-    except Exception as e:
-        print(f"❌ [STARTUP] Retriever failed: {e}", flush=True)
-        traceback.print_exc()
+    # 2. Load / build the index without holding up startup (see /ready)
+    threading.Thread(target=_load_or_build_index, name="index-build", daemon=True).start()
+
+    # 3. Pick up snapshots published by other processes
+    stop_watching = threading.Event()
+    if INDEX_WATCH_S > 0:
+        threading.Thread(target=_watch_snapshots, args=(stop_watching,), name="index-watch", daemon=True).start()
 
     yield
 
+    stop_watching.set()
+    if _jobs is not None:
+        _jobs.shutdown()
+    _index.close()   # stops shard worker processes
+
 # --- APP DEFINITION ---
 app = FastAPI(title="Climate RAG API", lifespan=lifespan)
+app.add_middleware(metrics.MetricsMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -115,72 +399,305 @@ app.add_middleware(
 )
 
 # --- HELPERS ---
-def safe_search_runner(retriever, query, k=5):
+def safe_search_runner(retriever, query, k=5, filters=None):
     if not retriever: return []
     try:
+        if filters:
+            return retriever.search(query, k, filters)
         return retriever.search(query, k)
     except Exception:
         return []
 
+def _cache_key(retriever, q, k, filters=None):
+    return _query_cache.make_key(q, k, filters=filters, tag=getattr(retriever, "cache_tag", id(retriever)))
+
+def _parse_filters(body):
+    """Optional {"source", "modality", "since", "until"} filter from a query body (400 if malformed)."""
+    try:
+        return normalize_filters(body.get("filters"))
+    except (TypeError, ValueError, AttributeError) as e:
+        raise HTTPException(400, f"Invalid filters: {e}")
+
+def cached_search(retriever, query, k=5, filters=None):
+    key = _cache_key(retriever, query, k, filters)
+    hits = _query_cache.get(key)
+    if hits is None:
+        hits = safe_search_runner(retriever, query, k, filters)
+        if hits:
+            _query_cache.put(key, hits)
+    return hits
+
 # --- ENDPOINTS ---
 @app.get("/health")
 def health():
-    return {"status": "ok", "retriever": _retriever is not None}
+    """Liveness: the process is up and serving requests."""
+    return {
+        "status": "ok",
+        "retriever": _index.retriever is not None,
+        "jobs": _jobs.stats() if _jobs is not None else None,
+        "query_cache": _query_cache.stats(),
+    }
 
-@app.post("/process")
-async def process_file(file: UploadFile = File(...)):
-    if _orchestrator is None:
-        raise HTTPException(500, "Orchestrator not initialized")
-        
+@app.get("/ready")
+def ready():
+    """
+    Readiness: 200 once an index is being served (possibly a previous snapshot
+    while a rebuild runs), 503 until then. Reports build progress and the
+    active index version.
+    """
+    r = _index.retriever
+    body = {
+        "ready": r is not None,
+        "index": {
+            "snapshot": _index.stats(),
+            "version": getattr(r, "version", None),
+            "generation": getattr(r, "generation", None),
+            "chunks": _chunk_count(r) if r is not None else 0,
+        },
+        "build": dict(_index_status),
+        "reload": dict(_reload_status),
+    }
+    if hasattr(r, "shard_status"):
+        body["index"]["shards"] = r.shard_status()
+    if r is None and _index_status["state"] not in ("empty", "failed"):
+        return JSONResponse(body, status_code=503)
+    return body
+
+UPLOAD_CHUNK = 1024 * 1024
+
+def _save_upload(file: UploadFile):
+    """
+    Stream the upload to disk while hashing it. Files are stored content-addressed
+    as uploads/<sha256>/<original name>, so a re-upload reuses the same path.
+    """
     uploads_dir = Path("uploads")
     uploads_dir.mkdir(parents=True, exist_ok=True)
-    dest = uploads_dir / Path(file.filename).name
-    
-    with open(dest, "wb") as fh:
-        shutil.copyfileobj(file.file, fh)
+    tmp = uploads_dir / f".incoming-{uuid.uuid4().hex}"
+    digest = hashlib.sha256()
+    with open(tmp, "wb") as fh:
+        while True:
+            block = file.file.read(UPLOAD_CHUNK)
+            if not block:
+                break
+            digest.update(block)
+            fh.write(block)
+            metrics.BYTES_INGESTED.inc(len(block))
+
+    content_hash = digest.hexdigest()
+    dest = uploads_dir / content_hash / Path(file.filename).name
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(tmp, dest)
+    return content_hash, dest
+
+@app.get("/metrics")
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
+def _saturated(e: "Saturated"):
+    return HTTPException(503, str(e), headers={"Retry-After": str(e.retry_after)})
+
+@app.post("/process", status_code=202)
+async def process_file(file: UploadFile = File(...), force: bool = False):
+    """
+    Queue a file for processing. Content seen before is answered from the DB unless force=true.
+    When ingestion is saturated this answers 503 with Retry-After instead of queueing.
+    """
+    if _jobs is None:
+        raise HTTPException(500, "Orchestrator not initialized")
     try:
-        suffix = dest.suffix.lower()
-        if suffix == ".pdf": result = _orchestrator.process_pdf(dest)
-        elif suffix == ".txt": result = _orchestrator.process_text(dest)
-        elif suffix in [".jpg", ".png", ".jpeg", ".webp"]: result = _orchestrator.process_image(dest)
-        elif suffix in [".wav", ".mp3", ".m4a"]: result = _orchestrator.process_audio(dest)
-        else: result = _orchestrator.process_text(dest)
-        return result
-    except Exception as e:
-        traceback.print_exc()
-        raise HTTPException(500, f"Processing error: {e}")
+        _jobs.check_admission()
+    except Saturated as e:
+        raise _saturated(e)
 
-@app.post("/query")
-def query(body: Dict[str, Any]):
-    q = body.get("query", "")
-    k = int(body.get("k", 5))
-    
-    if not q: return {"results": []}
-    if _retriever is None: return {"results": [], "detail": "Index not ready."}
+    content_hash, dest = await run_in_threadpool(_save_upload, file)
+
+    if not force:
+        try:
+            cached = await run_in_threadpool(find_result_by_hash, content_hash)
+        except Exception as e:
+            print(f"⚠️ Result cache lookup failed: {e}", flush=True)
+            cached = None
+        if cached is not None:
+            # the result is known, but the file may not be in the index (e.g. it was removed)
+            try:
+                indexed = await run_in_threadpool(_index_cached_upload, dest)
+            except Exception as e:
+                print(f"⚠️ Indexing failed for {dest}: {e}", flush=True)
+                indexed = 0
+            if indexed is not None:
+                cached["cached"] = True
+                cached["indexed_chunks"] = indexed
+                return {"job_id": None, "status": "done", "content_hash": content_hash, "result": cached}
 
     try:
-        raw_results = safe_search_runner(_retriever, q, k)
-    except Exception as e:
-        return {"results": [], "detail": str(e)}
+        job = _jobs.submit(dest, filename=dest.name, content_hash=content_hash)
+    except Saturated as e:
+        raise _saturated(e)
+    return {"job_id": job["id"], "status": job["status"], "content_hash": content_hash}
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    if _jobs is None:
+        raise HTTPException(500, "Orchestrator not initialized")
+    job = _jobs.get(job_id)
+    if job is None:
+        raise HTTPException(404, "Unknown job")
+    return job
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str, request: Request, since: int = 0):
+    """
+    Server-sent events for one job: stage / page / seconds-decoded progress with ETA,
+    partial text as soon as it is extracted, then a final "done" or "failed" event
+    carrying the job. Reconnecting clients resume via Last-Event-ID or ?since=.
+    """
+    if _jobs is None:
+        raise HTTPException(500, "Orchestrator not initialized")
+    if _jobs.get(job_id) is None:
+        raise HTTPException(404, "Unknown job")
+    last_id = request.headers.get("last-event-id")
+    cursor = int(last_id) + 1 if last_id and last_id.isdigit() else since
 
+    async def stream():
+        nonlocal cursor
+        while True:
+            for ev in _jobs.events(job_id, cursor):
+                cursor = ev["seq"] + 1
+                if ev["stage"] in ("done", "failed"):
+                    yield f"id: {ev['seq']}\nevent: {ev['stage']}\ndata: {json.dumps(_jobs.get(job_id))}\n\n"
+                    return
+                yield f"id: {ev['seq']}\nevent: progress\ndata: {json.dumps(ev)}\n\n"
+            if _jobs.get(job_id) is None:
+                return
+            if await request.is_disconnected():
+                return
+            await asyncio.sleep(0.25)
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.delete("/documents")
+def delete_document(body: Dict[str, Any]):
+    source = body.get("source", "")
+    if not source: raise HTTPException(400, "source is required")
+    with _index_lock:
+        _journal().append("remove", source)
+        with _index.acquire() as retriever:
+            if retriever is None or not hasattr(retriever, "remove_source"):
+                return {"removed": 0}
+            return {"removed": retriever.remove_source(source)}
+
+@app.post("/admin/reload", status_code=202)
+def admin_reload(body: Optional[Dict[str, Any]] = None, x_admin_token: Optional[str] = Header(None)):
+    """
+    Hot-swap the served index: load a published snapshot ({"version": ...},
+    default the current one in snapshots.json) in the background and swap it
+    in. 409 while a build or another reload runs. Disabled (403) unless
+    ADMIN_TOKEN is set; the X-Admin-Token header must match it.
+    """
+    token = os.getenv("ADMIN_TOKEN")
+    if not token:
+        raise HTTPException(403, "Admin endpoints are disabled: ADMIN_TOKEN is not set")
+    if x_admin_token != token:
+        raise HTTPException(403, "Invalid admin token")
+    version = (body or {}).get("version")
+    if version is None:
+        version, _ = current_snapshot(INDEX_DIR)
+        if version is None:
+            raise HTTPException(404, "No index snapshot has been published")
+    elif version != LEGACY_VERSION and version not in read_snapshots(INDEX_DIR).get("snapshots", {}):
+        raise HTTPException(404, f"Unknown snapshot: {version}")
+    if _index_busy() or not _reload_lock.acquire(blocking=False):
+        raise HTTPException(409, "An index build or reload is already running")
+    threading.Thread(target=_reload_index, args=(version,), name="index-reload", daemon=True).start()
+    return {"status": "reloading", "version": version, "serving": _index.version}
+
+def _format_results(raw_results):
     clean_results = []
     for r in raw_results:
         text_preview = r.get("text", "")
         if len(text_preview) > 300:
             text_preview = text_preview[:300] + "..."
             
-        clean_results.append({
+        item = {
             "source": r.get("id", "unknown"),
             "content": text_preview,
             "score": float(r.get("score", 0.0)) if "score" in r else 0.0
-        })
+        }
+        if r.get("duplicates"):
+            item["duplicates"] = [d["id"] for d in r["duplicates"]]
+        clean_results.append(item)
+    return clean_results
+
+@app.post("/query")
+def query(body: Dict[str, Any]):
+    q = body.get("query", "")
+    k = int(body.get("k", 5))
+    filters = _parse_filters(body)
+    
+    if not q: return {"results": []}
+
+    # the snapshot stays open until this query is done, even if a reload swaps it out
+    with _index.acquire() as retriever:
+        if retriever is None: return {"results": [], "detail": "Index not ready."}
+        try:
+            raw_results = cached_search(retriever, q, k, filters)
+        except Exception as e:
+            return {"results": [], "detail": str(e)}
+    _remember_query(q, k, filters)
+
+    return {"results": _format_results(raw_results)}
+
+MAX_BATCH_QUERIES = 1000
+
+@app.post("/query/batch")
+def query_batch(body: Dict[str, Any]):
+    """Score many queries in one call; results[i] answers queries[i]."""
+    queries = body.get("queries") or []
+    k = int(body.get("k", 5))
+    filters = _parse_filters(body)
+
+    if not isinstance(queries, list):
+        raise HTTPException(400, "queries must be a list of strings")
+    if len(queries) > MAX_BATCH_QUERIES:
+        raise HTTPException(400, f"At most {MAX_BATCH_QUERIES} queries per batch")
+    if not queries: return {"results": []}
+    with _index.acquire() as retriever:
+        if retriever is None: return {"results": [[] for _ in queries], "detail": "Index not ready."}
+        return _query_batch(retriever, queries, k, filters)
+
+def _query_batch(retriever, queries, k, filters):
+    # empty queries are answered with no results, like /query; cached ones skip scoring
+    texts = [str(q) for q in queries]
+    results = [[] for _ in texts]
+    keys = {}
+    for i, q in enumerate(texts):
+        if not q.strip():
+            continue
+        keys[i] = _cache_key(retriever, q, k, filters)
+        hits = _query_cache.get(keys[i])
+        if hits is not None:
+            results[i] = _format_results(hits)
+
+    misses = [i for i in keys if not results[i]]
+    try:
+        if hasattr(retriever, "retrieve_batch"):
+            raw = retriever.retrieve_batch([texts[i] for i in misses], k, filters) if misses else []
+        else:
+            raw = [safe_search_runner(retriever, texts[i], k, filters) for i in misses]
+    except Exception as e:
+        return {"results": results, "detail": str(e)}
 
-    return {"results": clean_results}
+    for i, hits in zip(misses, raw):
+        if hits:
+            _query_cache.put(keys[i], hits)
+        results[i] = _format_results(hits)
+    return {"results": results}
 
 @app.get("/demo-outputs")
 def demo_outputs():
     p = Path("demo/outputs")
     if not p.exists(): return {"outputs": []}
-    files = sorted([str(fp) for fp in p.glob("*.json")])
+    # outputs of uploads live under their content hash (see core.utils.save_output_json)
+    files = sorted([str(fp) for fp in p.glob("*.json")] + [str(fp) for fp in p.glob("*/*.json")])
     return {"outputs": files}
\ No newline at end of file
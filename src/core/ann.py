@@ -0,0 +1,201 @@
+# src/core/ann.py
+"""
+FAISS index factory for the dense path.
+
+Inner-product indexes over L2-normalized embeddings (so scores are cosines):
+ - flat    exact brute force (IndexFlatIP), the default and the recall baseline
+ - fp16    brute force over float16 codes (2x smaller)
+ - sq8     brute force over int8 scalar-quantized codes (4x smaller)
+ - pq      brute force over product-quantized codes (pq_m bytes per vector)
+ - ivf     IVF-Flat: k-means into nlist cells, search the nprobe nearest cells
+ - ivfpq   IVF-PQ: as ivf, vectors product-quantized to pq_m bytes (8-bit codes)
+ - hnsw    HNSW graph with hnsw_m links per node, efSearch controls the beam
+
+Build parameters are fixed when the index is trained and saved with it; search
+parameters (nprobe, ef_search) are applied after load, so one saved index can
+be tuned per deployment. scripts/bench_ann.py measures recall@k against flat
+and p50/p99 latency for a grid of settings.
+
+Compressed kinds lose a little precision; with rescore=N the Retriever fetches
+N candidates and re-ranks them by exact dot product against the stored
+embeddings (optionally float16, store_dtype). They are memory-mapped rather
+than kept as a second copy in RAM: from an unlinked temp file right after a
+build or compaction, from embeddings.npy once the index is saved.
+
+Config (env, read by index_params_from_env):
+ - ANN_INDEX       flat | fp16 | sq8 | pq | ivf | ivfpq | hnsw (default flat)
+ - ANN_NLIST       IVF cells (default ~4*sqrt(n), capped so every cell gets 39 training points)
+ - ANN_NPROBE      IVF cells searched per query (default 8)
+ - ANN_PQ_M        PQ sub-quantizers (default dim/8)
+ - ANN_HNSW_M      HNSW links per node (default 32)
+ - ANN_EF_SEARCH   HNSW search beam (default 64)
+ - ANN_RESCORE     candidates re-scored exactly per query (default 0 = off)
+ - EMBED_STORE_DTYPE  dtype of the saved embeddings.npy, float32 (default) or float16
+"""
+import os
+import math
+import numpy as np
+
+try:
+    import faiss
+except Exception:
+    faiss = None
+
+INDEX_KINDS = ("flat", "fp16", "sq8", "pq", "ivf", "ivfpq", "hnsw")
+STORE_DTYPES = ("float32", "float16")
+DEFAULT_NPROBE = 8
+DEFAULT_EF_SEARCH = 64
+DEFAULT_HNSW_M = 32
+
+
+def index_params_from_env() -> dict:
+    params = {
+        "kind": os.getenv("ANN_INDEX", "flat").lower(),
+        "store_dtype": os.getenv("EMBED_STORE_DTYPE", "float32").lower(),
+    }
+    if params["store_dtype"] not in STORE_DTYPES:
+        raise ValueError(f"Unsupported EMBED_STORE_DTYPE: {params['store_dtype']}")
+    for key, env in (("nlist", "ANN_NLIST"), ("nprobe", "ANN_NPROBE"), ("pq_m", "ANN_PQ_M"),
+                     ("hnsw_m", "ANN_HNSW_M"), ("ef_search", "ANN_EF_SEARCH"), ("rescore", "ANN_RESCORE")):
+        if os.getenv(env):
+            params[key] = int(os.getenv(env))
+    return params
+
+
+def default_nlist(n: int) -> int:
+    # faiss wants ~39 training points per centroid
+    return max(1, min(int(4 * math.sqrt(n)), n // 39))
+
+
+def default_pq_m(dim: int) -> int:
+    m = max(1, dim // 8)
+    while dim % m:
+        m -= 1
+    return m
+
+
+def build_index(emb: np.ndarray, kind: str = "flat", nlist: int = None, nprobe: int = None,
+                pq_m: int = None, hnsw_m: int = None, ef_search: int = None, **_):
+    """Train (if needed) and fill an inner-product index of the given kind."""
+    if kind not in INDEX_KINDS:
+        raise ValueError(f"Unknown ANN index kind: {kind}")
+    emb = np.ascontiguousarray(emb, dtype="float32")
+    n, dim = emb.shape
+    metric = faiss.METRIC_INNER_PRODUCT
+
+    if kind == "flat" or n == 0:
+        index = faiss.IndexFlatIP(dim)
+    elif kind in ("fp16", "sq8"):
+        qtype = faiss.ScalarQuantizer.QT_fp16 if kind == "fp16" else faiss.ScalarQuantizer.QT_8bit
+        index = faiss.IndexScalarQuantizer(dim, qtype, metric)
+        index.train(emb)
+    elif kind == "pq":
+        index = faiss.IndexPQ(dim, pq_m or default_pq_m(dim), _pq_bits(n), metric)
+        index.train(emb)
+    elif kind == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, hnsw_m or DEFAULT_HNSW_M, metric)
+    else:
+        nlist = min(nlist or default_nlist(n), n)
+        quantizer = faiss.IndexFlatIP(dim)
+        if kind == "ivf":
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist, metric)
+        else:
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, pq_m or default_pq_m(dim), _pq_bits(n), metric)
+        index.train(emb)
+
+    index.add(emb)
+    set_search_params(index, nprobe=nprobe, ef_search=ef_search)
+    return index
+
+
+def _pq_bits(n: int) -> int:
+    # 8-bit codes need 256 * 39 training points per sub-quantizer; small corpora get fewer bits
+    return max(1, min(8, int(math.log2(max(2, n // 39)))))
+
+
+def set_search_params(index, nprobe: int = None, ef_search: int = None, **_):
+    """Apply query-time knobs; ignored for index types they do not apply to."""
+    if index is None or faiss is None:
+        return index
+    try:
+        ivf = faiss.extract_index_ivf(index)
+    except Exception:
+        ivf = None
+    if ivf is not None:
+        ivf.nprobe = min(nprobe or DEFAULT_NPROBE, ivf.nlist)
+    hnsw = getattr(faiss.downcast_index(index), "hnsw", None)
+    if hnsw is not None:
+        hnsw.efSearch = ef_search or DEFAULT_EF_SEARCH
+    return index
+
+
+def index_kind(index) -> str:
+    if index is None:
+        return "none"
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivfpq"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf"
+    if isinstance(index, faiss.IndexPQ):
+        return "pq"
+    if isinstance(index, faiss.IndexScalarQuantizer):
+        return "fp16" if index.sq.qtype == faiss.ScalarQuantizer.QT_fp16 else "sq8"
+    return "flat"
+
+
+def rescore(Q: np.ndarray, I: np.ndarray, embeddings, k: int):
+    """
+    Exact inner products of each query with its candidate rows (I, -1 = none),
+    returning the best k as (D, I). `embeddings` may be a float16 / float32 memmap;
+    only the candidate rows are read.
+    """
+    valid = I >= 0
+    rows = np.where(valid, I, 0)
+    uniq, inverse = np.unique(rows, return_inverse=True)   # sorted reads are kinder to the page cache
+    vecs = np.asarray(embeddings[uniq], dtype=np.float32)[inverse.reshape(rows.shape)]
+    D = np.einsum("qcd,qd->qc", vecs, Q)
+    D = np.where(valid, D, -np.inf)
+    k = min(k, I.shape[1])
+    top = np.argsort(-D, axis=1, kind="stable")[:, :k]
+    return np.take_along_axis(D, top, axis=1), np.take_along_axis(np.where(valid, I, -1), top, axis=1)
+
+
+def exact_top(Q: np.ndarray, vectors, ids: np.ndarray, k: int):
+    """Exact top-k of Q against vectors[ids] only (a selective filter); returns (D, I) in row ids."""
+    V = np.asarray(vectors[ids], dtype=np.float32)
+    S = Q @ V.T
+    k = min(k, len(ids))
+    if k < len(ids):
+        top = np.argpartition(-S, k - 1, axis=1)[:, :k]
+    else:
+        top = np.broadcast_to(np.arange(len(ids)), S.shape)
+    D = np.take_along_axis(S, top, axis=1)
+    order = np.argsort(-D, axis=1, kind="stable")
+    return np.take_along_axis(D, order, axis=1), ids[np.take_along_axis(top, order, axis=1)]
+
+
+def search_filtered(index, Q: np.ndarray, k: int, allowed: np.ndarray):
+    """index.search restricted to rows where `allowed` is True, via an ID selector bitmap."""
+    bitmap = np.packbits(allowed, bitorder="little")   # must outlive the search call
+    sel = faiss.IDSelectorBitmap(len(allowed), faiss.swig_ptr(bitmap))
+    try:
+        ivf = faiss.extract_index_ivf(index)
+    except Exception:
+        ivf = None
+    hnsw = getattr(faiss.downcast_index(index), "hnsw", None)
+    # per-call parameters replace the index's own knobs, so carry them over
+    if ivf is not None:
+        params = faiss.SearchParametersIVF(sel=sel, nprobe=ivf.nprobe)
+    elif hnsw is not None:
+        params = faiss.SearchParametersHNSW(sel=sel, efSearch=hnsw.efSearch)
+    else:
+        params = faiss.SearchParameters(sel=sel)
+    return index.search(Q, k, params=params)
+
+
+def index_bytes(index) -> int:
+    """Serialized size, a close proxy for resident memory."""
+    return int(faiss.serialize_index(index).size)
@@ -4,6 +4,7 @@ import os
 import wave
 import subprocess
 from pathlib import Path
+from .metrics import STAGE_LATENCY
 
 class AudioUnavailable(Exception):
     pass
@@ -34,10 +35,15 @@ class AudioProcessor:
         except Exception as e:
             raise AudioUnavailable(f"Failed to load VOSK model: {e}")
 
-    def transcribe(self, path: Path) -> str:
+    # emit a progress event at least this often (seconds of audio decoded)
+    progress_interval = 10.0
+
+    def transcribe(self, path: Path, progress=None) -> str:
         """
         Transcribe audio using VOSK.
         Uses system FFmpeg directly to convert MP3/M4A to 16kHz WAV (bypassing pydub).
+        progress, if given, receives {"stage": "transcribe", "done": seconds_decoded,
+        "total": seconds, "unit": "seconds", "text": new_text} as decoding advances.
         """
         self._ensure_model()
         from vosk import KaldiRecognizer
@@ -60,7 +66,8 @@ class AudioProcessor:
             ]
             
             # Run the command
-            subprocess.run(cmd, check=True)
+            with STAGE_LATENCY.time(stage="ffmpeg_convert"):
+                subprocess.run(cmd, check=True)
             
             # 2. Open the clean WAV file
             wf = wave.open(str(temp_wav), "rb")
@@ -74,20 +81,34 @@ class AudioProcessor:
 
         # 3. Run Transcription
         try:
-            rec = KaldiRecognizer(self.model, wf.getframerate())
-            rec.SetWords(True)
+            with STAGE_LATENCY.time(stage="vosk_decode"):
+                rate = wf.getframerate()
+                total = wf.getnframes() / rate if rate else 0.0
+                rec = KaldiRecognizer(self.model, rate)
+                rec.SetWords(True)
             
-            results = []
-            while True:
-                data = wf.readframes(4000)
-                if len(data) == 0:
-                    break
-                if rec.AcceptWaveform(data):
-                    part = json.loads(rec.Result())
-                    results.append(part.get("text", ""))
+                results = []
+                frames = 0
+                last_report = 0.0
+                while True:
+                    data = wf.readframes(4000)
+                    if len(data) == 0:
+                        break
+                    frames += 4000
+                    new_text = ""
+                    if rec.AcceptWaveform(data):
+                        part = json.loads(rec.Result())
+                        new_text = part.get("text", "")
+                        results.append(new_text)
+                    decoded = min(frames / rate, total)
+                    if progress and (new_text or decoded - last_report >= self.progress_interval):
+                        last_report = decoded
+                        progress({"stage": "transcribe", "done": round(decoded, 1), "total": round(total, 1), "unit": "seconds", "text": new_text})
             
-            final_part = json.loads(rec.FinalResult())
-            results.append(final_part.get("text", ""))
+                final_part = json.loads(rec.FinalResult())
+                results.append(final_part.get("text", ""))
+                if progress:
+                    progress({"stage": "transcribe", "done": round(total, 1), "total": round(total, 1), "unit": "seconds", "text": final_part.get("text", "")})
             
         finally:
             wf.close()
@@ -0,0 +1,173 @@
+# src/core/bm25.py
+"""
+Okapi BM25 over a compact inverted index.
+
+Postings are stored CSC-style in flat numpy arrays: term t owns
+doc_ids[indptr[t]:indptr[t+1]] (ascending) and the matching precomputed BM25
+impacts (idf * saturated, length-normalized tf). A query only reads the posting
+lists of its own terms, so its cost follows the matching postings rather than
+the corpus size.
+
+Top-k uses max-score pruning, term at a time: terms are visited from the
+highest to the lowest max impact, and once the k-th best partial score is at
+least what all remaining terms could add, no unseen document can enter the
+top k. From then on the remaining (usually long, low-idf) lists are only
+binary-searched for the surviving candidates.
+"""
+from pathlib import Path
+import numpy as np
+from sklearn.feature_extraction.text import CountVectorizer
+
+K1 = 1.2
+B = 0.75
+
+_EMPTY = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32))
+
+
+def default_analyzer():
+    # same tokenization / stop words as the TF-IDF backend
+    return CountVectorizer(stop_words="english").build_analyzer()
+
+
+class BM25Index:
+    def __init__(self, texts: list, k1: float = K1, b: float = B, base: "BM25Index" = None):
+        """
+        base: an existing index whose collection statistics (document count,
+        average length, document frequencies) are folded in, so a small delta
+        segment scores on the same scale as the main index.
+        """
+        self.k1, self.b = k1, b
+        self.analyzer = default_analyzer()
+        vec = CountVectorizer(analyzer=self.analyzer, dtype=np.float32)
+        try:
+            X = vec.fit_transform(texts).tocsc()
+            terms = vec.get_feature_names_out()
+        except ValueError:
+            # empty vocabulary (no texts, or only stop words)
+            X, terms = None, []
+
+        self.n_docs = len(texts)
+        self.vocab = {t: i for i, t in enumerate(terms)}
+        if X is None:
+            self.indptr = np.zeros(1, dtype=np.int64)
+            self.doc_ids = np.empty(0, dtype=np.int32)
+            self.impacts = np.empty(0, dtype=np.float32)
+            self.term_max = np.empty(0, dtype=np.float32)
+            self.df = np.empty(0, dtype=np.int32)
+            self.doc_len = np.zeros(self.n_docs, dtype=np.float32)
+            self.total_len = 0.0
+            return
+
+        self.indptr = X.indptr.astype(np.int64)
+        self.doc_ids = X.indices.astype(np.int32)
+        self.df = np.diff(self.indptr).astype(np.int32)
+        self.doc_len = np.asarray(X.sum(axis=1)).ravel().astype(np.float32)
+        self.total_len = float(self.doc_len.sum())
+
+        n, total, df = self.n_docs, self.total_len, self.df.astype(np.float64)
+        if base is not None:
+            n += base.n_docs
+            total += base.total_len
+            df = df + np.array([base.doc_freq(t) for t in terms], dtype=np.float64)
+        avgdl = total / max(n, 1) or 1.0
+        idf = np.log1p((n - df + 0.5) / (df + 0.5))
+
+        tf = X.data.astype(np.float64)
+        dl = self.doc_len[self.doc_ids].astype(np.float64)
+        term_of = np.repeat(np.arange(len(terms)), self.df)
+        norm = self.k1 * (1 - self.b + self.b * dl / avgdl)
+        self.impacts = (idf[term_of] * tf * (self.k1 + 1) / (tf + norm)).astype(np.float32)
+        self.term_max = np.maximum.reduceat(self.impacts, self.indptr[:-1]).astype(np.float32)
+
+    def doc_freq(self, term: str) -> int:
+        t = self.vocab.get(term)
+        return int(self.df[t]) if t is not None else 0
+
+    def _postings(self, t: int):
+        lo, hi = self.indptr[t], self.indptr[t + 1]
+        return self.doc_ids[lo:hi], self.impacts[lo:hi]
+
+    def search(self, query: str, k: int, allowed: np.ndarray = None):
+        """
+        Return (doc_ids, scores) of the top-k documents, best first.
+        allowed: optional boolean mask over documents (metadata filters); other
+        postings are dropped before they are scored.
+        """
+        terms = {self.vocab[w] for w in self.analyzer(query) if w in self.vocab}
+        if not terms or k <= 0:
+            return _EMPTY
+        terms = sorted(terms, key=lambda t: -self.term_max[t])
+        maxes = self.term_max[terms].astype(np.float64)
+        # rest[i]: the most that terms i+1.. can still add to any document
+        rest = np.append(np.cumsum(maxes[::-1])[::-1][1:], 0.0)
+
+        cand = np.empty(0, dtype=np.int64)
+        acc = np.empty(0, dtype=np.float64)
+        i = 0
+        # essential terms: any posting may introduce a new candidate
+        while i < len(terms):
+            ids, imp = self._postings(terms[i])
+            if allowed is not None:
+                keep = allowed[ids]
+                ids, imp = ids[keep], imp[keep]
+            cand, acc = _merge(cand, acc, ids, imp)
+            i += 1
+            if len(acc) >= k and _kth(acc, k) >= rest[i - 1]:
+                break
+        # non-essential terms: only refine candidates that can still make the top k
+        for j in range(i, len(terms)):
+            keep = acc + maxes[j] + rest[j] >= _kth(acc, k)
+            cand, acc = cand[keep], acc[keep]
+            ids, imp = self._postings(terms[j])
+            pos = np.minimum(np.searchsorted(ids, cand), len(ids) - 1)
+            hit = ids[pos] == cand
+            acc[hit] += imp[pos[hit]]
+
+        if len(acc) > k:
+            top = np.argpartition(-acc, k - 1)[:k]
+            cand, acc = cand[top], acc[top]
+        order = np.argsort(-acc, kind="stable")
+        return cand[order], acc[order].astype(np.float32)
+
+    # --- PERSISTENCE ---
+    def save(self, path: Path):
+        terms = np.array(sorted(self.vocab, key=self.vocab.get), dtype=str)
+        with open(path, "wb") as fh:
+            np.savez(
+                fh,
+                terms=terms,
+                indptr=self.indptr,
+                doc_ids=self.doc_ids,
+                impacts=self.impacts,
+                term_max=self.term_max,
+                df=self.df,
+                doc_len=self.doc_len,
+                params=np.array([self.k1, self.b, self.n_docs, self.total_len], dtype=np.float64),
+            )
+
+    @classmethod
+    def load(cls, path: Path) -> "BM25Index":
+        with np.load(path) as z:
+            self = cls.__new__(cls)
+            self.k1, self.b, n_docs, self.total_len = (float(x) for x in z["params"])
+            self.n_docs = int(n_docs)
+            self.vocab = {t: i for i, t in enumerate(z["terms"].tolist())}
+            for name in ("indptr", "doc_ids", "impacts", "term_max", "df", "doc_len"):
+                setattr(self, name, z[name])
+        self.analyzer = default_analyzer()
+        return self
+
+
+def _merge(cand, acc, ids, imp):
+    """Add a posting list into the (sorted, unique) candidate set."""
+    if not len(cand):
+        return ids.astype(np.int64), imp.astype(np.float64)
+    merged, inverse = np.unique(np.concatenate([cand, ids]), return_inverse=True)
+    scores = np.bincount(inverse, weights=np.concatenate([acc, imp]), minlength=len(merged))
+    return merged, scores
+
+
+def _kth(acc, k: int) -> float:
+    if len(acc) < k:
+        return -np.inf
+    return float(np.partition(acc, len(acc) - k)[len(acc) - k])
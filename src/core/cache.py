@@ -0,0 +1,96 @@
+# src/core/cache.py
+"""
+Bounded LRU + TTL cache for query results.
+
+Keys carry the index "tag" (retriever version + generation), so any incremental
+update, compaction or reload makes older entries unreachable for new queries.
+Entries of different tags live side by side: queries still pinned to a
+swapped-out snapshot keep hitting their own entries without evicting those a
+warm-up filled for the new one. Stale tags age out through the LRU order, and
+only the max_tags most recently used tags are kept at all.
+"""
+import re
+import json
+import time
+import threading
+from collections import OrderedDict
+
+_MISSING = object()
+
+def normalize_query(query: str) -> str:
+    return re.sub(r"\s+", " ", (query or "").strip().lower())
+
+class QueryCache:
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0, max_tags: int = 4):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_tags = max(1, max_tags)
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._tags = OrderedDict()   # tag -> its keys, least recently used tag first
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(query: str, k: int, filters: dict = None, tag=None):
+        frozen = json.dumps(filters, sort_keys=True, default=str) if filters else ""
+        return (tag, normalize_query(query), int(k), frozen)
+
+    def _touch_tag(self, tag):
+        if tag in self._tags:
+            self._tags.move_to_end(tag)
+
+    def _drop(self, key):
+        del self._data[key]
+        keys = self._tags.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._tags[key[0]]
+
+    def get(self, key, default=None):
+        if self.maxsize <= 0:
+            return default
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING and time.monotonic() - entry[0] < self.ttl:
+                self._data.move_to_end(key)
+                self._touch_tag(key[0])
+                self.hits += 1
+                return entry[1]
+            if entry is not _MISSING:
+                self._drop(key)
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            self._tags.setdefault(key[0], set()).add(key)
+            self._touch_tag(key[0])
+            while len(self._tags) > self.max_tags:
+                _, stale = self._tags.popitem(last=False)
+                for k in stale:
+                    del self._data[k]
+            while len(self._data) > self.maxsize:
+                self._drop(next(iter(self._data)))
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._tags.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "tags": len(self._tags),
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
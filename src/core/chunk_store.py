@@ -0,0 +1,305 @@
+# src/core/chunk_store.py
+"""
+Columnar, memory-mapped chunk store (replaces chunks_meta.json).
+
+An index directory holds the chunks under chunks/:
+ - text.bin + text_offsets.npy     UTF-8 chunk texts back to back, row i is bytes [off[i], off[i+1])
+ - ids.bin + id_offsets.npy        chunk ids, same layout
+ - id_hash.npy + id_rows.npy       sorted 64-bit id hashes and their rows, for lookup by id
+ - columns.npy                     fixed-width metadata: source / modality / path (string table index),
+                                   start / end / start_token / end_token, ingested_at
+                                   (stores written before the path column are still read)
+ - strings.json                    string tables for the string columns
+ - extras.json                     {row: {field: value}} for anything that does not fit a column
+                                   (e.g. "duplicates")
+ - store.json                      row count; written last, so its presence marks a complete store
+
+Opening a store maps the arrays and reads two small JSON files, independent of
+the number of chunks; a row's text and dict are only decoded when asked for.
+Per-value row lists (postings()) come straight from the column codes, so
+retrievers index a store's sources and modalities without decoding rows.
+Every process serving the same index (uvicorn workers, shard workers, scripts)
+shares the mapped pages through the OS page cache.
+"""
+import json
+import hashlib
+import os
+import shutil
+import uuid
+from pathlib import Path
+import numpy as np
+
+STORE_DIR = "chunks"
+STORE_META = "store.json"
+FORMAT_VERSION = 1
+
+_COLUMNS = np.dtype([
+    ("source", "<i4"), ("modality", "<i4"),
+    ("start", "<i8"), ("end", "<i8"),
+    ("start_token", "<i4"), ("end_token", "<i4"),
+    ("ingested_at", "<f8"),
+    ("path", "<i4"),
+])
+_STRING_COLUMNS = ("source", "modality", "path")
+_INT_COLUMNS = ("start", "end", "start_token", "end_token")
+_MISSING = -1
+
+
+def store_exists(index_dir: Path) -> bool:
+    return (Path(index_dir) / STORE_DIR / STORE_META).exists()
+
+
+def _id_hash(chunk_id: str) -> int:
+    return int.from_bytes(hashlib.blake2b(str(chunk_id).encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _blob(strings: list):
+    """(UTF-8 bytes of all strings, int64 offsets with a trailing end offset)."""
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return b"".join(encoded), offsets
+
+
+def _map_bytes(path: Path):
+    if path.stat().st_size == 0:
+        return np.empty(0, dtype=np.uint8)
+    return np.memmap(path, dtype=np.uint8, mode="r")
+
+
+def write_chunk_store(index_dir: Path, docs, count: int = None) -> Path:
+    """
+    Write `docs` (dicts with id, text and optional metadata) as index_dir/chunks.
+    `docs` may be any iterable when `count` gives its length.
+    The store is built in a scratch directory and swapped in, so readers never
+    see a half-written one; processes that still map the old files keep them.
+    """
+    index_dir = Path(index_dir)
+    index_dir.mkdir(parents=True, exist_ok=True)
+    n = len(docs) if count is None else count
+    tables = {name: {} for name in _STRING_COLUMNS}
+    cols = np.zeros(n, dtype=_COLUMNS)
+    for name in _STRING_COLUMNS + _INT_COLUMNS:
+        cols[name] = _MISSING
+    cols["ingested_at"] = np.nan
+    extras = {}
+    texts, ids = [], []
+    for i, d in enumerate(docs):
+        texts.append(d.get("text") or "")
+        ids.append(str(d["id"]))
+        rest = {}
+        for key, value in d.items():
+            if key in ("id", "text") or value is None:
+                continue
+            if key in _STRING_COLUMNS and isinstance(value, str):
+                cols[i][key] = tables[key].setdefault(value, len(tables[key]))
+            elif key in _INT_COLUMNS and isinstance(value, (int, np.integer)) and not isinstance(value, bool) and value >= 0:
+                cols[i][key] = value
+            elif key == "ingested_at" and isinstance(value, (int, float, np.number)) and not isinstance(value, bool):
+                cols[i][key] = value
+            else:
+                rest[key] = value
+        if rest:
+            extras[str(i)] = rest
+
+    text_blob, text_offsets = _blob(texts)
+    id_blob, id_offsets = _blob(ids)
+    hashes = np.array([_id_hash(x) for x in ids], dtype=np.uint64)
+    order = np.argsort(hashes, kind="stable")
+
+    tmp = index_dir / f"{STORE_DIR}.tmp-{uuid.uuid4().hex[:8]}"
+    tmp.mkdir()
+    try:
+        (tmp / "text.bin").write_bytes(text_blob)
+        (tmp / "ids.bin").write_bytes(id_blob)
+        np.save(tmp / "text_offsets.npy", text_offsets)
+        np.save(tmp / "id_offsets.npy", id_offsets)
+        np.save(tmp / "id_hash.npy", hashes[order])
+        np.save(tmp / "id_rows.npy", order.astype(np.int64))
+        np.save(tmp / "columns.npy", cols)
+        (tmp / "strings.json").write_text(json.dumps({k: list(v) for k, v in tables.items()}), encoding="utf-8")
+        (tmp / "extras.json").write_text(json.dumps(extras, default=str), encoding="utf-8")
+        (tmp / STORE_META).write_text(json.dumps({"version": FORMAT_VERSION, "count": n}), encoding="utf-8")
+
+        target = index_dir / STORE_DIR
+        old = None
+        if target.exists():
+            old = index_dir / f"{STORE_DIR}.old-{uuid.uuid4().hex[:8]}"
+            os.replace(target, old)
+        os.replace(tmp, target)
+        if old is not None:
+            shutil.rmtree(old, ignore_errors=True)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return index_dir / STORE_DIR
+
+
+class ChunkStore:
+    """Read-only view of a chunk store; a Sequence of chunk dicts decoded on access."""
+
+    def __init__(self, path: Path):
+        path = Path(path)
+        meta = json.loads((path / STORE_META).read_text(encoding="utf-8"))
+        if meta.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported chunk store version: {meta.get('version')}")
+        self.path = path
+        self._n = int(meta["count"])
+        self._text = _map_bytes(path / "text.bin")
+        self._text_off = np.load(path / "text_offsets.npy", mmap_mode="r")
+        self._ids = _map_bytes(path / "ids.bin")
+        self._id_off = np.load(path / "id_offsets.npy", mmap_mode="r")
+        self._id_hash = np.load(path / "id_hash.npy", mmap_mode="r")
+        self._id_rows = np.load(path / "id_rows.npy", mmap_mode="r")
+        self.columns = np.load(path / "columns.npy", mmap_mode="r")
+        self._names = set(self.columns.dtype.names)   # older stores lack later columns
+        strings = json.loads((path / "strings.json").read_text(encoding="utf-8"))
+        self._strings = {k: strings.get(k, []) for k in _STRING_COLUMNS}
+        self._extras = None
+        if not (len(self._text_off) == len(self._id_off) == self._n + 1 and len(self.columns) == self._n):
+            raise ValueError(f"Chunk store at {path} is inconsistent")
+
+    @classmethod
+    def open(cls, index_dir: Path):
+        return cls(Path(index_dir) / STORE_DIR)
+
+    def __len__(self):
+        return self._n
+
+    def __iter__(self):
+        for i in range(self._n):
+            yield self[i]
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self._n))]
+        i = self._row(i)
+        return {"id": self.id(i), "text": self.text(i), **self.metadata(i)}
+
+    def _row(self, i) -> int:
+        i = int(i)
+        if i < 0:
+            i += self._n
+        if not 0 <= i < self._n:
+            raise IndexError("chunk row out of range")
+        return i
+
+    @staticmethod
+    def _decode(blob, offsets, i) -> str:
+        return bytes(blob[offsets[i]:offsets[i + 1]]).decode("utf-8")
+
+    def text(self, i) -> str:
+        return self._decode(self._text, self._text_off, self._row(i))
+
+    def id(self, i) -> str:
+        return self._decode(self._ids, self._id_off, self._row(i))
+
+    def metadata(self, i) -> dict:
+        """Every field of row i except id and text."""
+        i = self._row(i)
+        row = self.columns[i]
+        d = {}
+        for name in _STRING_COLUMNS:
+            v = int(row[name]) if name in self._names else _MISSING
+            d[name] = self._strings[name][v] if v != _MISSING else None
+        for name in ("modality", "path"):
+            if d[name] is None:
+                del d[name]
+        for name in _INT_COLUMNS:
+            if row[name] != _MISSING:
+                d[name] = int(row[name])
+        if not np.isnan(row["ingested_at"]):
+            d["ingested_at"] = float(row["ingested_at"])
+        d.update(self.extras().get(str(i), {}))
+        return d
+
+    def extras(self) -> dict:
+        """{str(row): fields} for the fields that do not fit a column; loaded on first use."""
+        if self._extras is None:
+            self._extras = json.loads((self.path / "extras.json").read_text(encoding="utf-8"))
+        return self._extras
+
+    def strings(self, column: str) -> list:
+        """The string table of a string column: code -> value."""
+        return self._strings[column]
+
+    def postings(self, column: str) -> dict:
+        """{value: sorted int64 rows} of a string column (None for rows without one), from the codes alone."""
+        if column not in self._names:
+            return {None: np.arange(self._n, dtype=np.int64)} if self._n else {}
+        codes = np.asarray(self.columns[column])
+        order = np.argsort(codes, kind="stable")
+        values, starts = np.unique(codes[order], return_index=True)
+        table = self.strings(column)
+        return {(table[v] if v != _MISSING else None): rows
+                for v, rows in zip(values.tolist(), np.split(order, starts[1:]))}
+
+    def row_of(self, chunk_id: str):
+        """Row of `chunk_id` (binary search over the id hashes), or None."""
+        h = np.uint64(_id_hash(chunk_id))
+        pos = int(np.searchsorted(self._id_hash, h))
+        while pos < self._n and self._id_hash[pos] == h:
+            row = int(self._id_rows[pos])
+            if self.id(row) == chunk_id:
+                return row
+            pos += 1
+        return None
+
+    def get(self, chunk_id: str):
+        row = self.row_of(chunk_id)
+        return None if row is None else self[row]
+
+    def text_of(self, chunk_id: str):
+        row = self.row_of(chunk_id)
+        return None if row is None else self.text(row)
+
+
+class ChunkList:
+    """
+    The chunks a Retriever indexes: rows of an on-disk ChunkStore (if any)
+    followed by chunks added in memory since. Indexable like a list of dicts.
+    """
+
+    def __init__(self, store: ChunkStore = None, docs=()):
+        self.store = store
+        self._base = len(store) if store is not None else 0
+        self._tail = list(docs)
+
+    @property
+    def stored(self) -> int:
+        """Rows served from the store; the rest were added in memory."""
+        return self._base
+
+    def copy(self):
+        return ChunkList(self.store, self._tail)
+
+    def __len__(self):
+        return self._base + len(self._tail)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        return self.store[i] if i < self._base else self._tail[i - self._base]
+
+    def extend(self, docs):
+        self._tail.extend(docs)
+
+    def text(self, i) -> str:
+        return self.store.text(i) if i < self._base else self._tail[i - self._base]["text"]
+
+    def fields(self, i) -> dict:
+        """Row i without decoding a stored text (added rows are returned as is)."""
+        return self.store.metadata(i) if i < self._base else self._tail[i - self._base]
+
+    def texts(self, start: int = 0, stop: int = None) -> list:
+        return [self.text(i) for i in range(start, len(self) if stop is None else stop)]
+
+    def metadata(self, start: int = 0):
+        """Chunk dicts without decoding stored texts; enough for source / filter bookkeeping."""
+        for i in range(start, len(self)):
+            yield self.store.metadata(i) if i < self._base else self._tail[i - self._base]
@@ -0,0 +1,148 @@
+# src/core/chunking.py
+"""
+Sentence-aware chunking with character and token offsets.
+
+Text is split into sentences (and paragraphs) as (start, end) spans; tokens
+are whitespace-separated words. Sentences are packed greedily into chunks of
+at most max_tokens tokens, a chunk at least half full also ends at a paragraph
+break, and each chunk starts with the trailing sentences
+of the previous one that fit in overlap_tokens. Everything is computed on
+offsets, and chunk text is sliced once at the end. A sentence longer than the
+budget (e.g. an unpunctuated transcript) is cut into word runs of
+overlap_tokens words (max_tokens without overlap), so chunks still overlap
+and never exceed the budget.
+
+Every chunk records start / end (character offsets into the text) and
+start_token / end_token (word offsets), so a snippet can be served from the
+source text instead of a second copy. Indexers chunk one canonical text per
+file (canonical_text) and record the file holding it as the chunk's "path",
+so source_text(chunk["path"])[chunk["start"]:chunk["end"]] == chunk["text"]
+for every chunk, whichever code path indexed it.
+
+Config (env):
+ - CHUNK_MAX_TOKENS      words per chunk (default 200)
+ - CHUNK_OVERLAP_TOKENS  words shared by consecutive chunks, rounded to whole sentences (default 20)
+"""
+import os
+import re
+from bisect import bisect_left
+from pathlib import Path
+
+DEFAULT_MAX_TOKENS = 200
+DEFAULT_OVERLAP_TOKENS = 20
+_TOKEN = re.compile(r"\S+")
+_SENTENCE_END = re.compile(r"[.!?]+[\"'”’)\]]*(?=\s|$)|\n[ \t]*\n")
+
+
+def default_budget():
+    return (int(os.getenv("CHUNK_MAX_TOKENS", str(DEFAULT_MAX_TOKENS))),
+            int(os.getenv("CHUNK_OVERLAP_TOKENS", str(DEFAULT_OVERLAP_TOKENS))))
+
+
+def _sentence_spans(text: str):
+    """(start, end, opens_paragraph) of every sentence, whitespace trimmed."""
+    spans, start, para = [], 0, True
+    for m in _SENTENCE_END.finditer(text):
+        sentence_end = text[m.start()] in ".!?"
+        end = m.end() if sentence_end else m.start()
+        if end > start:
+            spans.append((start, end, para))
+            para = False
+        start = m.end()
+        para = para or not sentence_end
+    spans.append((start, len(text), para))
+    out = []
+    for s, e, p in spans:
+        while s < e and text[s].isspace():
+            s += 1
+        while e > s and text[e - 1].isspace():
+            e -= 1
+        if e > s:
+            out.append((s, e, p))
+    return out
+
+
+def chunk_spans(text: str, max_tokens: int = None, overlap_tokens: int = None) -> list:
+    """[(start, end, start_token, end_token)] of each chunk of `text`."""
+    if not text:
+        return []
+    env_max, env_overlap = default_budget()
+    max_tokens = max(1, max_tokens or env_max)
+    overlap_tokens = env_overlap if overlap_tokens is None else overlap_tokens
+    overlap_tokens = max(0, min(overlap_tokens, max_tokens - 1))
+
+    tokens = [(m.start(), m.end()) for m in _TOKEN.finditer(text)]
+    if not tokens:
+        return []
+    starts = [s for s, _ in tokens]
+    piece = overlap_tokens or max_tokens
+
+    # units: (token_start, token_end) ranges, a sentence or a piece of a long one
+    units, paragraph = [], set()
+    for s, e, opens in _sentence_spans(text):
+        t0, t1 = bisect_left(starts, s), bisect_left(starts, e)
+        if t1 <= t0:
+            continue
+        if opens:
+            paragraph.add(len(units))
+        if t1 - t0 <= max_tokens:
+            units.append((t0, t1))
+        else:
+            units.extend((t, min(t + piece, t1)) for t in range(t0, t1, piece))
+
+    chunks, i, n = [], 0, len(units)
+    while i < n:
+        j, size = i, 0
+        while j < n and (j == i or size + units[j][1] - units[j][0] <= max_tokens):
+            if j > i and j in paragraph and size >= max_tokens // 2:
+                break
+            size += units[j][1] - units[j][0]
+            j += 1
+        t0, t1 = units[i][0], units[j - 1][1]
+        chunks.append((tokens[t0][0], tokens[t1 - 1][1], t0, t1))
+        if j == n:
+            break
+        # the next chunk repeats the trailing units that fit in the overlap budget
+        k, tail = j, 0
+        while k - 1 > i and tail + units[k - 1][1] - units[k - 1][0] <= overlap_tokens:
+            k -= 1
+            tail += units[k][1] - units[k][0]
+        i = k
+    return chunks
+
+
+def chunk_document(text: str, doc_id: str, source: str = None, max_tokens: int = None,
+                   overlap_tokens: int = None, **fields) -> list:
+    """Chunk dicts (id, text, source, start, end, start_token, end_token, **fields) for one document."""
+    return [
+        {"id": f"{doc_id}_part_{i+1}", "text": text[s:e], "source": source,
+         "start": s, "end": e, "start_token": t0, "end_token": t1, **fields}
+        for i, (s, e, t0, t1) in enumerate(chunk_spans(text, max_tokens, overlap_tokens))
+    ]
+
+
+def source_text(path) -> str:
+    """The text a chunk's offsets point into: the file at its "path", read as is."""
+    return Path(path).read_text(encoding="utf-8", errors="ignore")
+
+
+def sidecar_path(path) -> Path:
+    """Default file for the extracted text of a non-text file: <path>.txt."""
+    path = Path(path)
+    return path.with_name(path.name + ".txt")
+
+
+def canonical_text(path, extracted: str = None, sidecar=None):
+    """
+    (text, text_path) that `path` is chunked from. A plain-text file is its own
+    canonical text, raw and uncleaned; for anything else (PDF, OCR, transcript)
+    the `extracted` text is written to `sidecar` (default sidecar_path(path)) first.
+    """
+    path = Path(path)
+    if extracted is None:
+        return source_text(path), path
+    sidecar = Path(sidecar) if sidecar is not None else sidecar_path(path)
+    sidecar.parent.mkdir(parents=True, exist_ok=True)
+    sidecar.write_text(extracted, encoding="utf-8")
+    # read back, so the offsets match what source_text() will return later
+    return source_text(sidecar), sidecar
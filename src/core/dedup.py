@@ -0,0 +1,135 @@
+# src/core/dedup.py
+"""
+Near-duplicate chunk removal with MinHash signatures and LSH banding.
+
+Transcripts repeat caption lines and reports repeat boilerplate, so many chunks
+are near copies of each other; they inflate the index and crowd the top-k.
+Every chunk gets a MinHash signature over its word 5-shingles (NUM_PERM
+hashes whose agreement rate estimates Jaccard similarity). Signatures are cut
+into bands and only chunks that share a whole band are compared, which keeps
+the stage near-linear instead of all pairs. Candidate pairs whose estimated
+similarity reaches the threshold are merged into clusters; each cluster keeps
+its first chunk (in document order), which lists the others under
+"duplicates" (each dropped chunk's fields except its text) so their provenance
+survives, and a retriever can index a dropped copy again if the representative's
+source is removed (see Retriever.remove_sources).
+
+Config (env):
+ - CHUNK_DEDUP        "off" to index every chunk (default on)
+ - DEDUP_THRESHOLD    estimated Jaccard similarity at which chunks are duplicates (default 0.8)
+"""
+import os
+import re
+import zlib
+import numpy as np
+
+NUM_PERM = 128
+SHINGLE_WORDS = 5
+DEFAULT_THRESHOLD = 0.8
+_PRIME = np.uint64((1 << 61) - 1)
+_MASK32 = np.uint64(0xFFFFFFFF)
+_EMPTY = np.iinfo(np.uint64).max
+_MAX_COMPARISONS = 32   # per chunk and bucket; bounds the cost of huge buckets
+_WORD = re.compile(r"\w+")
+
+
+class MinHasher:
+    def __init__(self, num_perm: int = NUM_PERM, shingle_words: int = SHINGLE_WORDS, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        # a * x + b stays below 2**64 for 32-bit shingle hashes
+        self.a = rng.integers(1, 1 << 31, num_perm, dtype=np.uint64)[:, None]
+        self.b = rng.integers(0, 1 << 31, num_perm, dtype=np.uint64)[:, None]
+        self.num_perm = num_perm
+        self.shingle_words = shingle_words
+        self._mix = rng.integers(1, 1 << 31, shingle_words, dtype=np.uint64)
+
+    def shingles(self, text: str) -> np.ndarray:
+        """32-bit hashes of the word n-grams of `text` (lowercased), without repeats."""
+        words = np.array([zlib.crc32(w.encode("utf-8")) for w in _WORD.findall(text.lower())], dtype=np.uint64)
+        if len(words) == 0:
+            return words
+        n = max(1, len(words) - self.shingle_words + 1)
+        h = np.zeros(n, dtype=np.uint64)
+        for j in range(min(self.shingle_words, len(words))):
+            h = (h * np.uint64(0x01000193) + words[j:j + n] * self._mix[j]) & _MASK32
+        return np.unique(h)
+
+    def signature(self, text: str) -> np.ndarray:
+        sh = self.shingles(text)
+        if len(sh) == 0:
+            return np.full(self.num_perm, _EMPTY, dtype=np.uint64)
+        return ((self.a * sh[None, :] + self.b) % _PRIME).min(axis=1)
+
+    def signatures(self, texts: list) -> np.ndarray:
+        out = np.empty((len(texts), self.num_perm), dtype=np.uint64)
+        for i, t in enumerate(texts):
+            out[i] = self.signature(t)
+        return out
+
+
+def lsh_bands(num_perm: int, threshold: float):
+    """(bands, rows) with bands * rows == num_perm whose S-curve midpoint (1/b)**(1/r) sits just below threshold."""
+    options = [(num_perm // r, r) for r in range(1, num_perm + 1) if num_perm % r == 0]
+    # prefer catching true duplicates (verified afterwards) over skipping comparisons
+    below = [(b, r) for b, r in options if (1 / b) ** (1 / r) <= threshold]
+    return max(below, key=lambda br: (1 / br[0]) ** (1 / br[1])) if below else options[-1]
+
+
+def near_duplicate_groups(texts: list, threshold: float = DEFAULT_THRESHOLD, hasher: MinHasher = None) -> list:
+    """rep[i] = index of the first text in i's near-duplicate cluster (i itself if unique)."""
+    n = len(texts)
+    if n < 2:
+        return list(range(n))
+    hasher = hasher or MinHasher()
+    sigs = hasher.signatures(texts)
+    bands, rows = lsh_bands(hasher.num_perm, threshold)
+    usable = ~(sigs == _EMPTY).all(axis=1)   # empty texts are never duplicates
+
+    parent = list(range(n))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for band in range(bands):
+        buckets = {}
+        block = np.ascontiguousarray(sigs[:, band * rows:(band + 1) * rows])
+        for i in np.flatnonzero(usable):
+            buckets.setdefault(block[i].tobytes(), []).append(i)
+        for members in buckets.values():
+            for pos, j in enumerate(members[1:], 1):
+                for i in members[max(0, pos - _MAX_COMPARISONS):pos]:
+                    ri, rj = find(i), find(j)
+                    if ri == rj:
+                        break
+                    if np.mean(sigs[i] == sigs[j]) >= threshold:
+                        parent[max(ri, rj)] = min(ri, rj)   # the earliest chunk stays the representative
+                        break
+    return [find(i) for i in range(n)]
+
+
+def dedup_chunks(docs: list, threshold: float = DEFAULT_THRESHOLD) -> list:
+    """Drop near-duplicate chunks; each kept chunk lists the ones it stands for under "duplicates"."""
+    reps = near_duplicate_groups([d["text"] for d in docs], threshold)
+    dropped = {}
+    for i, r in enumerate(reps):
+        if r != i:
+            dropped.setdefault(r, []).extend(
+                [{k: v for k, v in docs[i].items() if k not in ("text", "duplicates")}] + docs[i].get("duplicates", []))
+    kept = []
+    for i, d in enumerate(docs):
+        if reps[i] != i:
+            continue
+        if i in dropped:
+            d = {**d, "duplicates": d.get("duplicates", []) + dropped[i]}
+        kept.append(d)
+    return kept
+
+
+def dedup_if_enabled(docs: list) -> list:
+    """dedup_chunks with the CHUNK_DEDUP / DEDUP_THRESHOLD settings."""
+    if os.getenv("CHUNK_DEDUP", "on").lower() in ("0", "off", "false", "no"):
+        return docs
+    return dedup_chunks(docs, float(os.getenv("DEDUP_THRESHOLD", str(DEFAULT_THRESHOLD))))
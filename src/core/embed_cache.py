@@ -0,0 +1,120 @@
+# src/core/embed_cache.py
+"""
+On-disk embedding cache keyed by (model key, sha1 of the chunk text).
+
+Index builds look every chunk up first and only encode the misses, so a
+rebuild after a small change costs about as much as the change. The model key
+includes the sentence-transformers version, and rows written under any other
+key are evicted the first time a model is used, so a model upgrade never
+mixes vectors from two embedding spaces.
+
+Config (env):
+ - EMBED_CACHE  sqlite path (default data/embed_cache.sqlite), "off" to disable
+"""
+import os
+import sqlite3
+import hashlib
+import threading
+import contextlib
+from pathlib import Path
+
+import numpy as np
+
+DEFAULT_PATH = Path("data/embed_cache.sqlite")
+_MAX_PARAMS = 500   # stay well under SQLite's bound-parameter limit
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    model TEXT NOT NULL,
+    text_hash TEXT NOT NULL,
+    dim INTEGER NOT NULL,
+    vector BLOB NOT NULL,
+    PRIMARY KEY (model, text_hash)
+) WITHOUT ROWID;
+"""
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def model_key(model_name: str) -> str:
+    try:
+        import sentence_transformers
+        version = sentence_transformers.__version__
+    except Exception:
+        version = "unknown"
+    return f"{model_name}@st{version}"
+
+
+class EmbeddingCache:
+    def __init__(self, path: Path = DEFAULT_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._evicted = set()
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA_SQL)
+
+    @contextlib.contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def evict_other_models(self, model: str) -> int:
+        """Drop vectors of every other model key (once per key and process)."""
+        with self._lock:
+            if model in self._evicted:
+                return 0
+            self._evicted.add(model)
+        with self._connect() as conn:
+            return conn.execute("DELETE FROM embeddings WHERE model != ?", (model,)).rowcount
+
+    def get_many(self, model: str, hashes: list) -> dict:
+        found = {}
+        unique = list(dict.fromkeys(hashes))
+        with self._connect() as conn:
+            for i in range(0, len(unique), _MAX_PARAMS):
+                part = unique[i:i + _MAX_PARAMS]
+                marks = ",".join("?" * len(part))
+                rows = conn.execute(
+                    f"SELECT text_hash, dim, vector FROM embeddings WHERE model = ? AND text_hash IN ({marks})",
+                    [model, *part],
+                )
+                for h, dim, blob in rows:
+                    found[h] = np.frombuffer(blob, dtype=np.float32, count=dim)
+        return found
+
+    def put_many(self, model: str, hashes: list, vectors: np.ndarray):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        rows = [(model, h, vectors.shape[1], vectors[i].tobytes()) for i, h in enumerate(hashes)]
+        with self._connect() as conn:
+            conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", rows)
+
+    def count(self, model: str = None) -> int:
+        with self._connect() as conn:
+            if model is None:
+                return conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            return conn.execute("SELECT COUNT(*) FROM embeddings WHERE model = ?", (model,)).fetchone()[0]
+
+
+_default = None
+
+def default_cache():
+    """The process-wide cache from EMBED_CACHE, or None when disabled / unusable."""
+    global _default
+    setting = os.getenv("EMBED_CACHE", str(DEFAULT_PATH))
+    if setting.lower() in ("", "0", "off", "false", "none"):
+        return None
+    if _default is None or _default.path != Path(setting):
+        try:
+            _default = EmbeddingCache(Path(setting))
+        except Exception as e:
+            print(f"[WARN] Embedding cache unavailable: {e}")
+            return None
+    return _default
@@ -0,0 +1,146 @@
+# src/core/embeddings.py
+"""
+Batched sentence-transformer encoding for index builds.
+
+embed_texts() encodes chunks in batches (one model.encode call per batch
+instead of per chunk) and writes each batch straight into a preallocated
+float32 array, which can be a np.memmap so large builds never hold a second
+copy of the matrix. With workers > 1 batches fan out over a process pool:
+on fork platforms the workers inherit the already-loaded model pages
+copy-on-write, and they write results into one shared-memory array.
+
+With a cache (core.embed_cache) only chunks whose text was never embedded
+by this model are encoded; the rest are copied from the cache.
+
+Config (env):
+ - EMBED_BATCH_SIZE  chunks per encode call (default 64)
+ - EMBED_WORKERS     encoder processes (default 1 = in-process)
+"""
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+EMBED_MODEL_NAME = "all-MiniLM-L6-v2"
+DEFAULT_BATCH_SIZE = 64
+
+# --- WORKER SIDE ---
+_model = None
+_out = None
+_shm = None
+
+def _encode(model, texts: list) -> np.ndarray:
+    return model.encode(texts, batch_size=len(texts), convert_to_numpy=True, show_progress_bar=False)
+
+def _init_worker(model_name: str, shm_name: str, shape: tuple, threads: int):
+    global _model, _out, _shm
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except Exception:
+        pass
+    if _model is None:
+        # spawn platforms: nothing inherited, load once per worker
+        from sentence_transformers import SentenceTransformer
+        _model = SentenceTransformer(model_name)
+    _shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        # the parent owns (and unlinks) the segment
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(_shm._name, "shared_memory")
+    except Exception:
+        pass
+    _out = np.ndarray(shape, dtype=np.float32, buffer=_shm.buf)
+
+def _encode_batch(start: int, texts: list) -> int:
+    _out[start:start + len(texts)] = _encode(_model, texts)
+    return len(texts)
+
+
+# --- API ---
+def load_model(model_name: str = EMBED_MODEL_NAME):
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name)
+
+def embed_texts(texts: list, model=None, model_name: str = EMBED_MODEL_NAME, batch_size: int = None,
+                workers: int = None, out: np.ndarray = None, normalize: bool = False, cache=None) -> np.ndarray:
+    """
+    Encode texts into an (n, dim) float32 array, `out` if given (e.g. a memmap).
+    normalize=True L2-normalizes rows in place, as the inner-product FAISS indexes expect.
+    cache: an EmbeddingCache; hits are reused and misses are written back (unnormalized).
+    """
+    texts = list(texts)
+    if model is None:
+        model = load_model(model_name)
+    batch_size = int(batch_size or os.getenv("EMBED_BATCH_SIZE") or DEFAULT_BATCH_SIZE)
+    workers = int(workers or os.getenv("EMBED_WORKERS") or 1)
+    shape = (len(texts), model.get_sentence_embedding_dimension())
+    if out is None:
+        out = np.empty(shape, dtype=np.float32)
+    elif out.shape != shape or out.dtype != np.float32:
+        raise ValueError(f"out must be float32 with shape {shape}")
+
+    if cache is not None:
+        _embed_cached(texts, model, model_name, batch_size, workers, out, cache)
+    else:
+        _embed_into(texts, model, model_name, batch_size, workers, out)
+
+    if normalize:
+        for start in range(0, len(texts), batch_size):
+            block = out[start:start + batch_size]
+            norms = np.linalg.norm(block, axis=1, keepdims=True)
+            block /= np.maximum(norms, 1e-12)
+    return out
+
+def _embed_into(texts, model, model_name, batch_size, workers, out):
+    batches = [(i, texts[i:i + batch_size]) for i in range(0, len(texts), batch_size)]
+    if workers <= 1 or len(batches) <= 1:
+        for start, batch in batches:
+            out[start:start + len(batch)] = _encode(model, batch)
+    else:
+        _embed_parallel(model, model_name, batches, out.shape, out, workers)
+
+def _embed_cached(texts, model, model_name, batch_size, workers, out, cache):
+    from .embed_cache import text_hash, model_key
+    key = model_key(model_name)
+    cache.evict_other_models(key)
+    hashes = [text_hash(t) for t in texts]
+    found = cache.get_many(key, hashes)
+    missing = {}   # hash -> first row with that text
+    for i, h in enumerate(hashes):
+        vec = found.get(h)
+        if vec is not None and len(vec) == out.shape[1]:
+            out[i] = vec
+        elif h not in missing:
+            missing[h] = i
+
+    if missing:
+        rows = list(missing.values())
+        fresh = np.empty((len(rows), out.shape[1]), dtype=np.float32)
+        _embed_into([texts[i] for i in rows], model, model_name, batch_size, workers, fresh)
+        cache.put_many(key, list(missing), fresh)
+        by_hash = dict(zip(missing, fresh))
+        for i, h in enumerate(hashes):
+            if h in by_hash:
+                out[i] = by_hash[h]
+
+def _embed_parallel(model, model_name: str, batches: list, shape: tuple, out: np.ndarray, workers: int):
+    global _model
+    shm = shared_memory.SharedMemory(create=True, size=max(1, shape[0] * shape[1] * 4))
+    methods = multiprocessing.get_all_start_methods()
+    ctx = multiprocessing.get_context("fork" if "fork" in methods else None)
+    threads = max(1, (os.cpu_count() or workers) // workers)
+    try:
+        if ctx.get_start_method() == "fork":
+            _model = model   # inherited by the forked workers, not pickled
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_worker,
+                                 initargs=(model_name, shm.name, shape, threads)) as pool:
+            for _ in pool.map(_encode_batch, *zip(*batches)):
+                pass
+        out[:] = np.ndarray(shape, dtype=np.float32, buffer=shm.buf)
+    finally:
+        _model = None
+        shm.close()
+        shm.unlink()
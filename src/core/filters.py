@@ -0,0 +1,228 @@
+# src/core/filters.py
+"""
+Per-chunk metadata columns and filter bitmaps for Retriever.
+
+Every chunk row has a source, a modality (pdf / image / audio / youtube /
+text) and an ingest time (epoch seconds). A text file's modality is that of
+the file it was converted from, if any (see source_modality). Sources and modalities keep a
+posting list of rows per value, ingest times a float column, so a filter
+such as
+
+    {"source": ["a.pdf", "b.pdf"], "modality": "pdf", "since": "2024-01-01"}
+
+becomes a boolean row mask from a few array operations, without scanning the
+chunks. Masks are cached until rows are added, and the retriever scores only
+the allowed rows. For rows in a chunk store the posting lists and the time
+column are taken from its columns with numpy (for_chunks), not row by row.
+"""
+from datetime import datetime, timezone
+from pathlib import Path
+import threading
+import numpy as np
+
+MODALITIES = ("pdf", "image", "audio", "youtube", "text")
+IMAGE_SUFFIXES = (".jpg", ".png", ".jpeg", ".webp")
+AUDIO_SUFFIXES = (".wav", ".mp3", ".m4a")
+TRANSCRIPT_SUFFIXES = (".vtt", ".srt")
+FILTER_KEYS = ("source", "modality", "since", "until")
+_MASK_CACHE_SIZE = 64
+# data/<dir> that a converted text file (data/text/<stem>.txt) may come from, by original suffix
+ORIGIN_DIRS = {"youtube_transcripts": TRANSCRIPT_SUFFIXES, "pdfs": (".pdf",), "audio": AUDIO_SUFFIXES}
+
+
+def infer_modality(path) -> str:
+    p = Path(str(path))
+    suffix = p.suffix.lower()
+    if suffix == ".pdf": return "pdf"
+    if suffix in IMAGE_SUFFIXES: return "image"
+    if suffix in AUDIO_SUFFIXES: return "audio"
+    if suffix in TRANSCRIPT_SUFFIXES or "youtube" in str(p).lower(): return "youtube"
+    return "text"
+
+
+def text_origin(path):
+    """
+    The file a .txt file was converted from, or None for original text: the
+    file a sidecar belongs to ("a.pdf.txt", see core.chunking.sidecar_path), or
+    a file with the same stem in a sibling origin directory, e.g.
+    data/youtube_transcripts/x.en.vtt for data/text/x.en.txt.
+    """
+    p = Path(str(path))
+    if p.suffix.lower() != ".txt":
+        return None
+    original = p.with_name(p.stem)
+    if original.suffix and infer_modality(original) != "text":
+        return original
+    for name, suffixes in ORIGIN_DIRS.items():
+        folder = p.parent.parent / name
+        if folder == p.parent:
+            continue
+        for suffix in suffixes:
+            candidate = folder / (p.stem + suffix)
+            if candidate.exists():
+                return candidate
+    return None
+
+
+def source_modality(path) -> str:
+    """Modality a file's chunks are tagged with: infer_modality of the file, or of its text_origin."""
+    return infer_modality(text_origin(path) or path)
+
+
+def to_epoch(value) -> float:
+    """Epoch seconds from a number or an ISO date / datetime string (naive = UTC)."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    dt = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def normalize_filters(filters: dict):
+    """Validate a filter dict; returns a canonical dict, or None for "no filter"."""
+    if not filters:
+        return None
+    unknown = set(filters) - set(FILTER_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown filter keys: {sorted(unknown)}")
+    out = {}
+    for key in ("source", "modality"):
+        v = filters.get(key)
+        if v:
+            out[key] = sorted({v} if isinstance(v, str) else set(v))
+    for key in ("since", "until"):
+        if filters.get(key) not in (None, ""):
+            out[key] = to_epoch(filters[key])
+    return out or None
+
+
+class MetadataIndex:
+    def __init__(self, docs: list = ()):
+        # posting lists are int64 arrays (rows from a chunk store) or lists (rows added since)
+        self._by_source = {}
+        self._by_modality = {}
+        self._stored_ts = np.empty(0, dtype=np.float64)
+        self._ingested = []
+        self._arr = None        # _stored_ts + _ingested as one array, rebuilt lazily
+        self._masks = {}        # (frozen filter, n_rows) -> mask
+        self._lock = threading.Lock()
+        self.extend(docs)
+
+    @classmethod
+    def for_chunks(cls, docs):
+        """Index a ChunkList: its stored rows from the store's columns, the in-memory rest row by row."""
+        index = cls()
+        if docs.store is not None and docs.stored:
+            index._load_store(docs.store)
+        index.extend(docs.metadata(docs.stored))
+        return index
+
+    def _load_store(self, store):
+        self._by_source = store.postings("source")
+        self._stored_ts = np.array(store.columns["ingested_at"], dtype=np.float64)
+        extra = {}
+        for row, fields in store.extras().items():
+            row = int(row)
+            # a deduplicated chunk also stands for the sources of its near-copies
+            for dup in fields.get("duplicates", ()):
+                extra.setdefault(dup.get("source"), []).append(row)
+            if "ingested_at" in fields:
+                # values that did not fit the float column, e.g. ISO dates
+                try:
+                    ts = to_epoch(fields["ingested_at"])
+                except (TypeError, ValueError):
+                    ts = None
+                self._stored_ts[row] = np.nan if ts is None else ts
+        for source, rows in extra.items():
+            self._by_source[source] = np.union1d(self._by_source.get(source, np.empty(0, np.int64)), rows)
+
+        self._by_modality = store.postings("modality")
+        missing = self._by_modality.pop(None, None)
+        if missing is not None:
+            # rows saved without a modality: infer it once per distinct source
+            codes = np.asarray(store.columns["source"])[missing]
+            sources = store.strings("source")
+            for code in np.unique(codes).tolist():
+                modality = source_modality(sources[code] if code >= 0 else "")
+                rows = missing[codes == code]
+                known = self._by_modality.get(modality)
+                self._by_modality[modality] = rows if known is None else np.union1d(known, rows)
+
+    def __len__(self):
+        return len(self._stored_ts) + len(self._ingested)
+
+    def source_rows(self, source) -> list:
+        """Rows matching a source filter: the source's own chunks and chunks that list it as a duplicate."""
+        return [int(i) for i in self._by_source.get(source, ())]
+
+    def extend(self, docs: list):
+        with self._lock:
+            start = len(self)
+            for i, d in enumerate(docs, start):
+                # a deduplicated chunk also stands for the sources of its near-copies
+                for source in dict.fromkeys([d.get("source")] + [x.get("source") for x in d.get("duplicates", ())]):
+                    add_posting(self._by_source, source, i)
+                add_posting(self._by_modality, d.get("modality") or source_modality(d.get("source") or ""), i)
+                ts = d.get("ingested_at")
+                try:
+                    ts = to_epoch(ts)
+                except (TypeError, ValueError):
+                    ts = None
+                self._ingested.append(np.nan if ts is None else ts)
+            self._arr = None
+            self._masks.clear()
+
+    def _ingested_array(self) -> np.ndarray:
+        arr = self._arr
+        if arr is None or len(arr) != len(self):
+            arr = self._stored_ts if not self._ingested else np.concatenate([self._stored_ts, self._ingested])
+            self._arr = arr
+        return arr
+
+    def mask(self, filters: dict, n_rows: int = None) -> np.ndarray:
+        """Boolean mask over rows [0, n_rows) of chunks matching every filter."""
+        n = len(self) if n_rows is None else n_rows
+        key = (tuple((k, tuple(v) if isinstance(v, list) else v) for k, v in sorted(filters.items())), n)
+        with self._lock:
+            cached = self._masks.get(key)
+        if cached is not None:
+            return cached
+
+        mask = np.ones(n, dtype=bool)
+        for col, lists in (("source", self._by_source), ("modality", self._by_modality)):
+            if col in filters:
+                allowed = np.zeros(n, dtype=bool)
+                for value in filters[col]:
+                    rows = np.asarray(lists.get(value, ()), dtype=np.int64)
+                    allowed[rows[rows < n]] = True
+                mask &= allowed
+        if "since" in filters or "until" in filters:
+            ts = self._ingested_array()[:n]
+            if len(ts) < n:
+                # rows appended by a concurrent add_documents, not described yet
+                ts = np.concatenate([ts, np.full(n - len(ts), np.nan)])
+            if "since" in filters:
+                mask &= ts >= filters["since"]    # NaN (unknown date) never matches
+            if "until" in filters:
+                mask &= ts <= filters["until"]
+
+        mask.flags.writeable = False   # shared by every query with these filters
+        with self._lock:
+            if len(self._masks) >= _MASK_CACHE_SIZE:
+                self._masks.pop(next(iter(self._masks)))
+            self._masks[key] = mask
+        return mask
+
+
+def add_posting(postings: dict, key, row: int):
+    """Append `row` to the posting list of `key` (an int64 array from a store becomes a list)."""
+    rows = postings.get(key)
+    if rows is None:
+        postings[key] = [row]
+    elif isinstance(rows, list):
+        rows.append(row)
+    else:
+        postings[key] = rows.tolist() + [row]
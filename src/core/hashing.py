@@ -0,0 +1,206 @@
+# src/core/hashing.py
+"""
+Sparse retrieval over a hashed feature space (no fitted vocabulary).
+
+Terms are hashed into N_FEATURES columns (same tokenization and stop words as
+the TF-IDF backend), so any batch of documents can be vectorized on its own.
+Documents are weighted lnc (1 + log tf, cosine-normalized) and queries ltc
+(1 + log tf times smoothed idf, cosine-normalized): collection statistics only
+enter on the query side, so stored rows never change when documents are added.
+The statistics are just the document count and a per-column document frequency
+array, updated as rows are appended.
+
+On disk (see core.index_store) the rows are a CSR triplet of .npy files that
+load memory-mapped, plus a small stats file:
+ - hashed_data.npy / hashed_indices.npy / hashed_indptr.npy
+ - hashed_stats.npz   n_features, n_docs, df
+
+HashedIndexWriter streams batches straight to those files, so a build holds
+one batch of rows in memory instead of the whole matrix. At query time the
+(immutable) rows are also kept term-major, built once on first use, so a
+query only reads the postings of its own columns.
+
+Config (env):
+ - HASH_FEATURES   hashed columns (default 2**20)
+ - HASH_BATCH      documents vectorized per batch (default 1024)
+"""
+import os
+from itertools import islice
+from pathlib import Path
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.preprocessing import normalize
+from .index_store import HASHED_DATA, HASHED_INDICES, HASHED_INDPTR, HASHED_STATS
+
+DEFAULT_FEATURES = 1 << 20
+DEFAULT_BATCH = 1024
+
+_COPY_BLOCK = 1 << 22   # array entries copied per step when assembling the .npy files
+
+
+def default_features() -> int:
+    return int(os.getenv("HASH_FEATURES", str(DEFAULT_FEATURES)))
+
+
+def default_batch() -> int:
+    return int(os.getenv("HASH_BATCH", str(DEFAULT_BATCH)))
+
+
+def _batches(texts, size: int):
+    it = iter(texts)
+    while True:
+        batch = list(islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+
+class HashedIndex:
+    def __init__(self, texts=(), n_features: int = None, batch_size: int = None):
+        self.n_features = n_features or default_features()
+        self._vectorizer = HashingVectorizer(n_features=self.n_features, stop_words="english",
+                                             alternate_sign=False, norm=None, dtype=np.float32)
+        self.df = np.zeros(self.n_features, dtype=np.int32)
+        self.n_docs = 0
+        blocks = []
+        for batch in _batches(texts, batch_size or default_batch()):
+            rows = self.encode(batch)
+            self._count(rows)
+            blocks.append(rows)
+        self.matrix = sp.vstack(blocks, format="csr") if blocks else self._empty()
+
+    def _empty(self):
+        return sp.csr_matrix((0, self.n_features), dtype=np.float32)
+
+    def _count(self, rows):
+        self.df += np.bincount(rows.indices, minlength=self.n_features).astype(np.int32)
+        self.n_docs += rows.shape[0]
+
+    def _tf(self, texts) -> sp.csr_matrix:
+        X = self._vectorizer.transform(texts).tocsr()
+        X.sum_duplicates()
+        X.data = (1 + np.log(X.data)).astype(np.float32)
+        return X
+
+    def encode(self, texts) -> sp.csr_matrix:
+        """lnc document rows; depends on nothing but the texts."""
+        return normalize(self._tf(texts), copy=False)
+
+    def transform(self, queries) -> sp.csr_matrix:
+        """ltc query rows, weighted with the current collection statistics."""
+        Q = self._tf(queries)
+        Q.data *= (np.log((1 + self.n_docs) / (1 + self.df[Q.indices])) + 1).astype(np.float32)
+        return normalize(Q, copy=False)
+
+    @property
+    def postings(self) -> sp.csr_matrix:
+        """matrix.T as CSR: row t lists the documents containing column t."""
+        p = self.__dict__.get("_postings")
+        if p is None or p.shape[1] != self.matrix.shape[0]:
+            p = self._postings = self.matrix.T.tocsr()
+        return p
+
+    def with_rows(self, rows) -> "HashedIndex":
+        """A copy whose statistics also count `rows` (e.g. a delta segment); self is untouched."""
+        other = self._shallow_copy()
+        other.df = self.df.copy()
+        other._count(rows)
+        return other
+
+    def with_matrix(self, matrix) -> "HashedIndex":
+        """A copy holding exactly `matrix`, statistics recounted from its rows (compaction)."""
+        other = self._shallow_copy()
+        other._postings = None
+        other.matrix = sp.csr_matrix(matrix)
+        other.df = np.zeros(self.n_features, dtype=np.int32)
+        other.n_docs = 0
+        other._count(other.matrix)
+        return other
+
+    def _shallow_copy(self) -> "HashedIndex":
+        other = HashedIndex.__new__(HashedIndex)
+        other.__dict__.update(self.__dict__)
+        return other
+
+    # --- PERSISTENCE ---
+    def save(self, index_dir: Path):
+        writer = HashedIndexWriter(index_dir, self.n_features)
+        step = max(1, _COPY_BLOCK // max(1, self.matrix.nnz // max(1, self.matrix.shape[0])))
+        for start in range(0, self.matrix.shape[0], step):
+            writer.add_rows(self.matrix[start:start + step])
+        writer.close()
+
+    @classmethod
+    def load(cls, index_dir: Path) -> "HashedIndex":
+        index_dir = Path(index_dir)
+        with np.load(index_dir / HASHED_STATS) as z:
+            n_features, n_docs = (int(x) for x in z["params"])
+            df = z["df"]
+        self = cls.__new__(cls)
+        self.n_features, self.n_docs, self.df = n_features, n_docs, df
+        self._vectorizer = HashingVectorizer(n_features=n_features, stop_words="english",
+                                             alternate_sign=False, norm=None, dtype=np.float32)
+        data = np.load(index_dir / HASHED_DATA, mmap_mode="r")
+        indices = np.load(index_dir / HASHED_INDICES, mmap_mode="r")
+        indptr = np.load(index_dir / HASHED_INDPTR, mmap_mode="r")
+        self.matrix = sp.csr_matrix((data, indices, indptr), shape=(len(indptr) - 1, n_features), copy=False)
+        return self
+
+
+class HashedIndexWriter:
+    """
+    Streams rows into a hashed index on disk: data / indices are spooled to raw
+    files batch by batch and assembled into .npy files by close().
+    """
+
+    def __init__(self, index_dir: Path, n_features: int = None):
+        self.index_dir = Path(index_dir)
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        self.index = HashedIndex(n_features=n_features)
+        self._indptr = [0]
+        self._spool = {name: self.index_dir / (name + ".spool") for name in (HASHED_DATA, HASHED_INDICES)}
+        self._fh = {name: open(p, "wb") for name, p in self._spool.items()}
+
+    def add(self, texts, batch_size: int = None) -> int:
+        """Vectorize and append documents; returns how many were added."""
+        n = 0
+        for batch in _batches(texts, batch_size or default_batch()):
+            self.add_rows(self.index.encode(batch))
+            n += len(batch)
+        return n
+
+    def add_rows(self, rows):
+        rows = sp.csr_matrix(rows)
+        self.index._count(rows)
+        self._fh[HASHED_DATA].write(np.ascontiguousarray(rows.data, dtype=np.float32).tobytes())
+        self._fh[HASHED_INDICES].write(np.ascontiguousarray(rows.indices, dtype=np.int32).tobytes())
+        self._indptr.extend((self._indptr[-1] + rows.indptr[1:]).tolist())
+
+    def close(self):
+        for fh in self._fh.values():
+            fh.close()
+        nnz = self._indptr[-1]
+        for name, dtype in ((HASHED_DATA, np.float32), (HASHED_INDICES, np.int32)):
+            tmp = self.index_dir / (name + ".tmp")
+            out = np.lib.format.open_memmap(tmp, mode="w+", dtype=dtype, shape=(nnz,))
+            if nnz:
+                src = np.memmap(self._spool[name], dtype=dtype, mode="r")
+                for start in range(0, nnz, _COPY_BLOCK):
+                    out[start:start + _COPY_BLOCK] = src[start:start + _COPY_BLOCK]
+                del src
+            out.flush()
+            del out
+            # replace, not overwrite: a loaded index may still map the old file
+            os.replace(tmp, self.index_dir / name)
+            self._spool[name].unlink()
+        tmp = self.index_dir / (HASHED_INDPTR + ".tmp")
+        with open(tmp, "wb") as fh:
+            np.save(fh, np.array(self._indptr, dtype=np.int64))
+        os.replace(tmp, self.index_dir / HASHED_INDPTR)
+        # the stats file goes last; load() reads it first
+        tmp = self.index_dir / (HASHED_STATS + ".tmp")
+        with open(tmp, "wb") as fh:
+            np.savez(fh, df=self.index.df, params=np.array([self.index.n_features, self.index.n_docs], dtype=np.int64))
+        os.replace(tmp, self.index_dir / HASHED_STATS)
+        return self.index.n_docs
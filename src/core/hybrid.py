@@ -0,0 +1,245 @@
+# src/core/hybrid.py
+"""
+Hybrid lexical + dense retrieval.
+
+HybridRetriever keeps two Retrievers over the same chunks, a lexical one
+(BM25 or TF-IDF, good at exact tokens such as "RCP8.5" or "AR6") and a dense
+FAISS one (good at paraphrases). Both legs run concurrently (the dense leg on a
+process-wide pool shared by every hybrid, the lexical one on the calling
+thread), so latency stays close to the slower leg, and their candidates are merged with reciprocal rank
+fusion or a weighted sum of min-max normalized scores.
+
+build_retriever / load_retriever pick the backend from RETRIEVER_BACKEND
+(tfidf | hashed | bm25 | faiss | hybrid) and INDEX_SHARDS, so callers do not need to
+know about hybrids or shards.
+
+Config (env):
+ - RETRIEVER_BACKEND   backend for new indexes (default: tfidf); when unset, load uses the
+                       backend recorded on disk (index manifest, else what the files hold)
+ - HYBRID_LEXICAL      lexical leg of the hybrid, "bm25" (default), "tfidf" or "hashed"
+ - HYBRID_FUSION       "rrf" (default) or "weighted"
+ - HYBRID_ALPHA        dense weight for weighted fusion (default 0.5)
+ - HYBRID_DEPTH        candidates fetched per leg (default 50; at least top_k)
+ - HYBRID_WORKERS      threads running dense legs for all hybrids in the process (default 4)
+ - INDEX_SHARDS        split new indexes over this many worker processes (default 1, see core.shards)
+"""
+import os
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+from .metrics import RETRIEVAL_LATENCY
+from .retrieval import Retriever
+from .index_store import SHARDS_META, has_chunks, read_manifest
+
+RRF_K = 60
+DENSE_SUBDIR = "dense"
+
+_leg_pool = None
+_leg_pool_lock = threading.Lock()
+
+
+def _legs_executor() -> ThreadPoolExecutor:
+    """One pool for every hybrid in the process, so swapped-out indexes leave no threads behind."""
+    global _leg_pool
+    with _leg_pool_lock:
+        if _leg_pool is None:
+            _leg_pool = ThreadPoolExecutor(max_workers=int(os.getenv("HYBRID_WORKERS", "4")),
+                                           thread_name_prefix="hybrid")
+        return _leg_pool
+
+
+class HybridRetriever:
+    def __init__(self, lexical: Retriever, dense: Retriever = None, fusion: str = None,
+                 alpha: float = None, lexical_depth: int = None, dense_depth: int = None):
+        self.lexical = lexical
+        self.dense = dense
+        self.fusion, self.alpha, depth = fusion_settings(fusion, alpha)
+        self.lexical_depth = lexical_depth or depth
+        self.dense_depth = dense_depth or depth
+
+    @classmethod
+    def build(cls, docs: list, lexical_backend: str = None, **kwargs):
+        lexical = Retriever(docs, backend=lexical_backend or os.getenv("HYBRID_LEXICAL", "bm25"))
+        return cls(lexical, _dense_or_none(Retriever(docs, backend="faiss")), **kwargs)
+
+    @classmethod
+    def load(cls, index_dir: Path, **kwargs):
+        """The lexical leg lives in index_dir, the dense one in index_dir/dense."""
+        index_dir = Path(index_dir)
+        lexical = Retriever.load(index_dir, use_faiss=False)
+        dense = None
+        if has_chunks(index_dir / DENSE_SUBDIR):
+            dense = _dense_or_none(Retriever.load(index_dir / DENSE_SUBDIR, backend="faiss"))
+            if dense is not None and len(dense.docs) != len(lexical.docs):
+                dense = None
+        if dense is None:
+            dense = _dense_or_none(Retriever(lexical.docs, backend="faiss"))
+        return cls(lexical, dense, **kwargs)
+
+    def save(self, index_dir: Path):
+        index_dir = Path(index_dir)
+        self.lexical.save(index_dir)
+        if self.dense is not None:
+            self.dense.save(index_dir / DENSE_SUBDIR)
+
+    def close(self):
+        for leg in self.legs:
+            if hasattr(leg, "close"):
+                leg.close()
+
+    # --- SAME SURFACE AS Retriever ---
+    @property
+    def legs(self):
+        return [leg for leg in (self.lexical, self.dense) if leg is not None]
+
+    @property
+    def backend(self) -> str:
+        return "hybrid"
+
+    @property
+    def docs(self):
+        return self.lexical.docs
+
+    @property
+    def version(self):
+        return "+".join(leg.version for leg in self.legs)
+
+    @property
+    def generation(self):
+        return sum(leg.generation for leg in self.legs)
+
+    @property
+    def cache_tag(self):
+        return (self.version, self.generation)
+
+    def add_documents(self, docs: list, replace: bool = True) -> int:
+        added = self.lexical.add_documents(docs, replace=replace)
+        if self.dense is not None:
+            self.dense.add_documents(docs, replace=replace)
+        return added
+
+    def remove_source(self, source: str) -> int:
+        return self.remove_sources([source])
+
+    def remove_sources(self, sources) -> int:
+        removed = self.lexical.remove_sources(sources)
+        if self.dense is not None:
+            self.dense.remove_sources(sources)
+        return removed
+
+    def retrieve(self, query: str, top_k: int = 5, filters: dict = None):
+        return self.retrieve_batch([query], top_k, filters)[0]
+
+    def search(self, query: str, k: int = 5, filters: dict = None):
+        return self.retrieve(query, k, filters)
+
+    def retrieve_batch(self, queries: list, top_k: int = 5, filters: dict = None):
+        if not queries:
+            return []
+        if self.dense is None:
+            return self.lexical.retrieve_batch(queries, top_k, filters)
+        legs = self.retrieve_legs(queries, top_k, filters)
+        with RETRIEVAL_LATENCY.time(phase="fuse"):
+            return [fuse(lex, dense, top_k, self.fusion, self.alpha) for lex, dense in legs]
+
+    def retrieve_legs(self, queries: list, top_k: int = 5, filters: dict = None):
+        """
+        Unfused candidates: one (lexical hits, dense hits) pair per query, each leg
+        at its fusion depth. A sharded hybrid merges these across shards and fuses
+        once at the coordinator, since fused scores of different shards do not compare.
+        """
+        dense = None
+        if self.dense is not None:
+            dense = _legs_executor().submit(self.dense.retrieve_batch, queries, max(top_k, self.dense_depth), filters)
+        lex_hits = self.lexical.retrieve_batch(queries, max(top_k, self.lexical_depth), filters)
+        dense_hits = dense.result() if dense is not None else [[] for _ in queries]
+        return list(zip(lex_hits, dense_hits))
+
+
+def fusion_settings(fusion: str = None, alpha: float = None):
+    """(fusion, alpha, depth) from the arguments or HYBRID_FUSION / HYBRID_ALPHA / HYBRID_DEPTH."""
+    fusion = (fusion or os.getenv("HYBRID_FUSION", "rrf")).lower()
+    if fusion not in ("rrf", "weighted"):
+        raise ValueError(f"Unknown fusion method: {fusion}")
+    alpha = float(alpha if alpha is not None else os.getenv("HYBRID_ALPHA", "0.5"))
+    return fusion, alpha, int(os.getenv("HYBRID_DEPTH", "50"))
+
+
+def fuse(lexical_hits: list, dense_hits: list, top_k: int, fusion: str = "rrf", alpha: float = 0.5):
+    """Merge one query's two candidate lists by reciprocal rank or weighted min-max scores."""
+    fused, legs = {}, {}
+    for name, hits in (("lexical", lexical_hits), ("dense", dense_hits)):
+        if fusion == "rrf":
+            contrib = [1.0 / (RRF_K + rank) for rank in range(1, len(hits) + 1)]
+        else:
+            weight = alpha if name == "dense" else 1.0 - alpha
+            contrib = [weight * s for s in _minmax([h["score"] for h in hits])]
+        for hit, c in zip(hits, contrib):
+            key = (hit.get("source"), hit["id"])
+            if key not in fused:
+                fused[key] = [0.0, hit]
+                legs[key] = {}
+            fused[key][0] += c
+            legs[key][name] = hit["score"]
+
+    ranked = sorted(fused.items(), key=lambda kv: -kv[1][0])[:top_k]
+    return [{**hit, "score": score, "leg_scores": legs[key]} for key, (score, hit) in ranked]
+
+
+def _dense_or_none(retriever: Retriever):
+    # Retriever quietly falls back to TF-IDF without faiss / sentence-transformers
+    if retriever.use_faiss:
+        return retriever
+    print("[WARN] Dense retrieval unavailable; hybrid search uses the lexical leg only.")
+    return None
+
+
+def _minmax(scores: list) -> list:
+    if not scores:
+        return []
+    lo, hi = min(scores), max(scores)
+    if hi - lo < 1e-12:
+        return [1.0] * len(scores)
+    return [(s - lo) / (hi - lo) for s in scores]
+
+
+# --- FACTORIES ---
+def configured_backend():
+    return os.getenv("RETRIEVER_BACKEND") or None
+
+def configured_shards() -> int:
+    return max(1, int(os.getenv("INDEX_SHARDS", "1")))
+
+def build_retriever(docs: list, backend: str = None):
+    backend = backend or configured_backend() or "tfidf"
+    if configured_shards() > 1:
+        from .shards import ShardedRetriever
+        return ShardedRetriever.build(docs, configured_shards(), backend)
+    return build_local(docs, backend)
+
+def load_retriever(index_dir: Path, backend: str = None):
+    backend = backend or configured_backend()
+    if (Path(index_dir) / SHARDS_META).exists():
+        from .shards import ShardedRetriever
+        return ShardedRetriever.load(index_dir, backend)
+    return load_local(index_dir, backend)
+
+def saved_backend(index_dir: Path):
+    """The backend an index was saved with: its manifest, else a hybrid if it has a dense leg."""
+    backend = (read_manifest(index_dir) or {}).get("backend")
+    if backend is None and has_chunks(Path(index_dir) / DENSE_SUBDIR):
+        backend = "hybrid"
+    return backend
+
+def build_local(docs: list, backend: str):
+    """One in-process retriever (what each shard of a sharded index runs)."""
+    if backend == "hybrid":
+        return HybridRetriever.build(docs)
+    return Retriever(docs, backend=backend)
+
+def load_local(index_dir: Path, backend: str = None):
+    backend = backend or saved_backend(index_dir)
+    if backend == "hybrid":
+        return HybridRetriever.load(index_dir)
+    return Retriever.load(index_dir, backend=backend)
@@ -0,0 +1,130 @@
+# src/core/index_store.py
+"""
+On-disk layout of the retrieval index and freshness checks.
+
+scripts/build_index.py and the API both write to data/index:
+ - chunks/                                   chunk id / text / metadata (memory-mapped, see core.chunk_store;
+                                             indexes from before it have chunks_meta.json instead)
+ - faiss.index + embeddings.npy              (dense path)
+ - tfidf_vectorizer.pkl + tfidf_matrix.pkl   (sparse path)
+ - hashed_*.npy + hashed_stats.npz           (hashed sparse path, see core.hashing)
+ - bm25.npz                                  (BM25 inverted index)
+ - shards.json + shard_NN/                   (sharded index: one of the layouts above per shard)
+ - index_manifest.json                       fingerprint of the files the index was built from
+ - ingest_journal.jsonl                      files added / removed through the API since (see core.snapshots)
+
+Builds write all of the above into snapshots/<version>/ and publish it in
+snapshots.json (see core.snapshots); an index directly in data/index is the
+pre-snapshot layout and is still served.
+"""
+import json
+from pathlib import Path
+from datetime import datetime, timezone
+from .chunk_store import STORE_DIR, STORE_META
+
+INDEX_DIR = Path("data/index")
+SOURCE_DIRS = [Path("data/text"), Path("data/pdfs")]
+SOURCE_PATTERNS = ("*.txt", "*.pdf")
+
+CHUNKS_META = "chunks_meta.json"
+FAISS_INDEX = "faiss.index"
+EMBEDDINGS = "embeddings.npy"
+TFIDF_VECTORIZER = "tfidf_vectorizer.pkl"
+TFIDF_MATRIX = "tfidf_matrix.pkl"
+BM25_INDEX = "bm25.npz"
+HASHED_DATA = "hashed_data.npy"
+HASHED_INDICES = "hashed_indices.npy"
+HASHED_INDPTR = "hashed_indptr.npy"
+HASHED_STATS = "hashed_stats.npz"
+MANIFEST = "index_manifest.json"
+SHARDS_META = "shards.json"
+SNAPSHOTS_DIR = "snapshots"
+INGEST_JOURNAL = "ingest_journal.jsonl"
+SNAPSHOTS_MANIFEST = "snapshots.json"
+
+# artifacts written by each Retriever backend (the chunk store is shared)
+BACKEND_FILES = {
+    "faiss": (FAISS_INDEX, EMBEDDINGS),
+    "tfidf": (TFIDF_VECTORIZER, TFIDF_MATRIX),
+    "hashed": (HASHED_DATA, HASHED_INDICES, HASHED_INDPTR, HASHED_STATS),
+    "bm25": (BM25_INDEX,),
+}
+
+
+def source_fingerprint(source_dirs=None) -> dict:
+    """Map every source file to [size, mtime_ns]. Only stats files, never reads them."""
+    fp = {}
+    for d in source_dirs or SOURCE_DIRS:
+        d = Path(d)
+        if not d.exists():
+            continue
+        for pattern in SOURCE_PATTERNS:
+            for p in sorted(d.glob(pattern)):
+                st = p.stat()
+                fp[str(p)] = [st.st_size, st.st_mtime_ns]
+    return fp
+
+
+def write_manifest(index_dir: Path, backend: str, source_dirs=None, num_chunks: int = 0, index_params: dict = None):
+    index_dir = Path(index_dir)
+    dirs = [str(d) for d in (source_dirs or SOURCE_DIRS)]
+    manifest = {
+        "backend": backend,
+        "index_params": index_params or {},
+        "num_chunks": num_chunks,
+        "built_at": datetime.now(timezone.utc).isoformat(),
+        "source_dirs": dirs,
+        "sources": source_fingerprint(dirs),
+    }
+    (index_dir / MANIFEST).write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    return manifest
+
+
+def read_manifest(index_dir: Path):
+    p = Path(index_dir) / MANIFEST
+    if not p.exists():
+        return None
+    try:
+        return json.loads(p.read_text(encoding="utf-8"))
+    except Exception:
+        return None
+
+
+def chunks_path(index_dir: Path):
+    """The file marking the stored chunks of an index (chunk store or legacy JSON), or None."""
+    index_dir = Path(index_dir)
+    for p in (index_dir / STORE_DIR / STORE_META, index_dir / CHUNKS_META):
+        if p.exists():
+            return p
+    return None
+
+
+def has_chunks(index_dir: Path) -> bool:
+    return chunks_path(index_dir) is not None
+
+
+def index_exists(index_dir: Path = INDEX_DIR) -> bool:
+    # stored chunks alone are enough: without a saved vectorizer the sparse
+    # index is refit from them, which still skips reading + chunking.
+    index_dir = Path(index_dir)
+    return has_chunks(index_dir) or (index_dir / SHARDS_META).exists()
+
+
+def is_stale(index_dir: Path = INDEX_DIR, source_dirs=None) -> bool:
+    """
+    An index is stale when the source files changed since it was built.
+    With a manifest we compare fingerprints; indexes built before manifests
+    existed fall back to comparing mtimes.
+    """
+    index_dir = Path(index_dir)
+    manifest = read_manifest(index_dir)
+    if manifest is not None:
+        dirs = manifest.get("source_dirs") or source_dirs
+        return source_fingerprint(dirs) != manifest.get("sources", {})
+
+    meta = chunks_path(index_dir)
+    if meta is None:
+        return True
+    built_at = meta.stat().st_mtime_ns
+    newest = max((v[1] for v in source_fingerprint(source_dirs).values()), default=0)
+    return newest > built_at
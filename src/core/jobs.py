@@ -0,0 +1,310 @@
+# src/core/jobs.py
+"""
+Background ingestion jobs for POST /process.
+
+Uploads are queued and run through PipelineOrchestrator in a worker pool, so
+blocking pdfminer / Tesseract / Vosk work never runs on the API event loop.
+Each worker process builds its own orchestrator once and reuses it.
+
+Workers report progress (stage, pages / seconds done, partial text) over a
+queue; a listener thread in the API process folds it into the job record and
+an ordered event log that GET /jobs/{id}/events streams to clients. Event logs
+are kept with the job, so extracted text in them is cut to a preview of
+INGEST_EVENT_TEXT characters (the full text only goes to on_done).
+
+Admission control: every upload gets a weight from orchestrator.estimate_cost
+(1 unit = one OCR'd image). submit() raises Saturated, with a Retry-After
+estimate, when too many jobs are pending or their total weight would exceed
+the budget, so a burst degrades into fast rejections instead of piling up
+OCR / ffmpeg work. A single job is always admitted when the queue is empty.
+
+Config (env):
+ - INGEST_WORKERS       pool size (default: half the cores, at least 1)
+ - INGEST_EXECUTOR      "process" (default) or "thread"
+ - INGEST_QUEUE_DEPTH   max queued + running jobs (default: 8 per worker)
+ - INGEST_MAX_COST      max total weight of queued + running jobs (default: 100 per worker)
+ - INGEST_COST_WEIGHTS  per-modality multipliers, e.g. "audio=2,pdf=1.5"
+ - INGEST_EVENT_TEXT    characters of extracted text kept in a progress event (default 2000)
+"""
+import os
+import math
+import queue
+import threading
+import time
+import uuid
+import traceback
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+from core import metrics
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+DEFAULT_EVENT_TEXT = 2000
+
+class Saturated(Exception):
+    """The ingestion queue is full; retry_after is a hint in seconds."""
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.retry_after = retry_after
+
+# --- WORKER SIDE ---
+_worker_orchestrator = None
+_progress_queue = None
+
+def _init_worker():
+    global _worker_orchestrator
+    if _worker_orchestrator is None:
+        from core.orchestrator import PipelineOrchestrator
+        _worker_orchestrator = PipelineOrchestrator(use_llm=False)
+
+def _init_process_worker(progress_queue=None):
+    global _progress_queue
+    _progress_queue = progress_queue
+    # stage timings recorded in a child process are shipped back with the result
+    metrics.enable_buffering()
+    _init_worker()
+
+def _run_pipeline(path: str, content_hash: str = None, job_id: str = None, events=None) -> dict:
+    _init_worker()
+    channel = events if events is not None else _progress_queue
+
+    def progress(event):
+        if channel is not None and job_id:
+            channel.put((job_id, event))
+
+    progress({"stage": "started"})
+    result = _worker_orchestrator.process_file(Path(path), content_hash=content_hash, progress=progress)
+    samples = metrics.drain_samples()
+    if samples:
+        result["_metrics"] = samples
+    return result
+
+
+# --- API SIDE ---
+def _default_workers() -> int:
+    return max(1, (os.cpu_count() or 2) // 2)
+
+def _parse_weights(spec: str) -> dict:
+    weights = {}
+    for part in (spec or "").split(","):
+        name, _, value = part.partition("=")
+        if name.strip() and value.strip():
+            weights[name.strip().lower()] = float(value)
+    return weights
+
+def _estimate_cost(path) -> dict:
+    from core.orchestrator import estimate_cost
+    return estimate_cost(path)
+
+class JobQueue:
+    def __init__(self, workers: int = None, mode: str = None, on_done=None, max_jobs: int = 1000,
+                 max_queued: int = None, max_cost: float = None, cost_weights: dict = None, cost_fn=None):
+        """
+        on_done(job, result) is called from a pool thread once a job succeeds,
+        before the job is marked done (used to index the extracted text).
+        cost_fn(path) -> {"modality", "weight", ...} prices a file for admission.
+        """
+        self.workers = int(workers or os.getenv("INGEST_WORKERS") or _default_workers())
+        self.mode = (mode or os.getenv("INGEST_EXECUTOR", "process")).lower()
+        self.on_done = on_done
+        self.max_jobs = max_jobs
+        self.max_queued = int(max_queued or os.getenv("INGEST_QUEUE_DEPTH") or 8 * self.workers)
+        self.max_cost = float(max_cost or os.getenv("INGEST_MAX_COST") or 100 * self.workers)
+        self.cost_weights = cost_weights if cost_weights is not None else _parse_weights(os.getenv("INGEST_COST_WEIGHTS"))
+        self.cost_fn = cost_fn or _estimate_cost
+        self.event_text_chars = int(os.getenv("INGEST_EVENT_TEXT", str(DEFAULT_EVENT_TEXT)))
+        self._pending_cost = 0.0
+        self._seconds_per_unit = 2.0   # running average, feeds the Retry-After hint
+        self._manager = None
+        if self.mode == "thread":
+            _init_worker()
+            self._events = queue.Queue()
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ingest")
+        else:
+            # a manager queue's put() is synchronous, so a worker's events are all
+            # enqueued before its result comes back and the final event follows them
+            self._manager = multiprocessing.Manager()
+            self._events = self._manager.Queue()
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers, initializer=_init_process_worker, initargs=(self._events,)
+            )
+        self._jobs = OrderedDict()
+        self._futures = {}
+        self._inflight = {}   # content_hash -> job_id of a queued/running job
+        self._lock = threading.Lock()
+        self._listener = threading.Thread(target=self._listen, name="ingest-progress", daemon=True)
+        self._listener.start()
+
+    def _pending(self) -> int:
+        return len(self._futures)
+
+    def _retry_after(self, extra: float = 0.0) -> int:
+        backlog = (self._pending_cost + extra) * self._seconds_per_unit / self.workers
+        return int(min(600, max(1, math.ceil(backlog))))
+
+    def check_admission(self):
+        """Cheap pre-check before an upload is even read: raise Saturated if the queue is full."""
+        if self._pending() >= self.max_queued:
+            raise Saturated("ingestion queue full", self._retry_after())
+
+    def submit(self, path: Path, filename: str = None, content_hash: str = None) -> dict:
+        """
+        Queue a file. Identical content already queued or running joins that job.
+        Raises Saturated when the queue depth or cost budget would be exceeded.
+        """
+        try:
+            cost = self.cost_fn(path)
+        except Exception:
+            cost = {"modality": "unknown", "weight": 1}
+        weight = cost.get("weight", 1) * self.cost_weights.get(cost.get("modality"), 1.0)
+        with self._lock:
+            existing = self._inflight.get(content_hash) if content_hash else None
+            if existing is not None:
+                return self.get(existing)
+            pending = self._pending()
+            if pending >= self.max_queued:
+                raise Saturated("ingestion queue full", self._retry_after())
+            if pending and self._pending_cost + weight > self.max_cost:
+                raise Saturated("ingestion cost budget exhausted", self._retry_after(weight))
+            self._pending_cost += weight
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {
+                "id": job_id,
+                "status": QUEUED,
+                "file": filename or Path(path).name,
+                "content_hash": content_hash,
+                "submitted_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+                "progress": None,
+                "cost": {**cost, "weight": weight},
+                "result": None,
+                "error": None,
+                "events": [],
+            }
+            if content_hash:
+                self._inflight[content_hash] = job_id
+            self._evict()
+            # a thread pool can share the in-process queue; process workers got theirs at startup
+            events = self._events if self.mode == "thread" else None
+            future = self._pool.submit(_run_pipeline, str(path), content_hash, job_id, events)
+            self._futures[job_id] = future
+        future.add_done_callback(lambda f, jid=job_id: self._finish(jid, f))
+        return self.get(job_id)
+
+    def _listen(self):
+        while True:
+            try:
+                job_id, event = self._events.get()
+            except (EOFError, OSError):
+                return
+            if job_id is None:
+                return
+            try:
+                self._on_progress(job_id, event)
+            except Exception:
+                traceback.print_exc()
+
+    def _on_progress(self, job_id: str, event: dict):
+        job = self._jobs.get(job_id)
+        if job is None:
+            return
+        now = time.time()
+        if event.get("stage") in (DONE, FAILED):
+            self._add_event(job, {"time": now, **event})
+            return
+        if event.get("stage") == "started":
+            job["started_at"] = now
+            if job["status"] == QUEUED:
+                job["status"] = RUNNING
+
+        progress = {k: v for k, v in event.items() if k != "text"}
+        done, total = event.get("done"), event.get("total")
+        if done and total and job["started_at"]:
+            elapsed = now - job["started_at"]
+            fraction = min(1.0, done / total)
+            progress["eta_seconds"] = round(elapsed * (1 - fraction) / fraction, 1)
+        job["progress"] = progress
+        text = event.get("text")
+        if text:
+            # the event log lives as long as the job: keep a preview, not the whole document
+            progress = {**progress, "text": text[:self.event_text_chars]}
+            if len(text) > self.event_text_chars:
+                progress.update(text_truncated=True, text_chars=len(text))
+        self._add_event(job, {"time": now, **progress})
+
+    def _add_event(self, job: dict, event: dict):
+        with self._lock:
+            event["seq"] = len(job["events"])
+            job["events"].append(event)
+
+    def _finish(self, job_id: str, future):
+        with self._lock:
+            self._futures.pop(job_id, None)
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            weight = job["cost"]["weight"]
+            self._pending_cost = max(0.0, self._pending_cost - weight)
+            if job["started_at"]:
+                per_unit = (time.time() - job["started_at"]) / weight
+                self._seconds_per_unit = 0.8 * self._seconds_per_unit + 0.2 * per_unit
+            if self._inflight.get(job.get("content_hash")) == job_id:
+                del self._inflight[job["content_hash"]]
+        try:
+            result = future.result()
+            metrics.replay(result.pop("_metrics", None))
+            if self.on_done:
+                self.on_done(job, result)
+            job["result"], job["status"] = result, DONE
+        except Exception as e:
+            traceback.print_exc()
+            job["error"], job["status"] = str(e), FAILED
+        job["finished_at"] = time.time()
+        # through the queue, so it lands after every progress event of this job
+        self._events.put((job_id, {"stage": job["status"]}))
+
+    def _evict(self):
+        # forget the oldest finished jobs once the registry is full
+        while len(self._jobs) > self.max_jobs:
+            for jid, j in self._jobs.items():
+                if j["status"] in (DONE, FAILED):
+                    del self._jobs[jid]
+                    break
+            else:
+                return
+
+    def get(self, job_id: str):
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        return {k: v for k, v in job.items() if k != "events"}
+
+    def events(self, job_id: str, since: int = 0) -> list:
+        """Events with seq >= since (stage / progress / partial text), oldest first."""
+        job = self._jobs.get(job_id)
+        if job is None:
+            return []
+        return job["events"][since:]
+
+    def stats(self) -> dict:
+        counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+        for job in list(self._jobs.values()):
+            counts[job["status"]] += 1
+        return {
+            "workers": self.workers,
+            "mode": self.mode,
+            **counts,
+            "max_queued": self.max_queued,
+            "pending_cost": round(self._pending_cost, 2),
+            "max_cost": self.max_cost,
+        }
+
+    def shutdown(self, wait: bool = False):
+        self._pool.shutdown(wait=wait, cancel_futures=not wait)
+        self._events.put((None, None))
+        self._listener.join(timeout=5)
+        if self._manager is not None:
+            self._manager.shutdown()
@@ -0,0 +1,190 @@
+# src/core/metrics.py
+"""
+Minimal in-process metrics with Prometheus text exposition (no external deps).
+
+Histograms / counters are cheap enough for the /query hot path: one bisect and
+a dict update under a lock. Pipeline stages that run in ingestion worker
+processes are buffered there and replayed in the API process (see core.jobs).
+"""
+import time
+import bisect
+import threading
+import contextlib
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+_REGISTRY = []
+_buffer = None   # list of samples when running inside a worker process
+
+
+def _label_str(labels: tuple, extra: str = "") -> str:
+    parts = [f'{k}="{str(v)}"' for k, v in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._lock = threading.Lock()
+        _REGISTRY.append(self)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str):
+        super().__init__(name, help)
+        self._values = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        if _buffer is not None:
+            _buffer.append((self.name, labels, amount))
+            return
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(sorted(labels.items())), 0.0)
+
+    def render(self):
+        lines = self.header()
+        for key, v in sorted(self._values.items()):
+            lines.append(f"{self.name}{_label_str(key)} {v}")
+        return lines
+
+
+class FunctionCounter(_Metric):
+    """Counter whose value is read from a callable at scrape time (e.g. cache hit counts)."""
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, fn=None):
+        super().__init__(name, help)
+        self.fn = fn
+
+    def render(self):
+        if self.fn is None:
+            return []
+        try:
+            v = float(self.fn())
+        except Exception:
+            return []
+        return self.header() + [f"{self.name} {v}"]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}   # labels -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        if _buffer is not None:
+            _buffer.append((self.name, labels, value))
+            return
+        key = tuple(sorted(labels.items()))
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            s = self._series.get(key)
+            if s is None:
+                s = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            if i < len(self.buckets):
+                s[i] += 1
+            s[-2] += value
+            s[-1] += 1
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        s = self._series.get(tuple(sorted(labels.items())))
+        return s[-1] if s else 0
+
+    def render(self):
+        lines = self.header()
+        for key, s in sorted(self._series.items()):
+            cumulative = 0
+            for le, n in zip(self.buckets, s):
+                cumulative += n
+                bound = 'le="%s"' % le
+                lines.append(f"{self.name}_bucket{_label_str(key, bound)} {cumulative}")
+            inf = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_label_str(key, inf)} {s[-1]}")
+            lines.append(f"{self.name}_sum{_label_str(key)} {s[-2]}")
+            lines.append(f"{self.name}_count{_label_str(key)} {s[-1]}")
+        return lines
+
+
+def render() -> str:
+    lines = []
+    for m in _REGISTRY:
+        lines.extend(m.render())
+    return "\n".join(lines) + "\n"
+
+
+# --- WORKER PROCESS SUPPORT ---
+def enable_buffering():
+    """Call in a worker process: samples are kept for the parent instead of recorded locally."""
+    global _buffer
+    _buffer = []
+
+def drain_samples() -> list:
+    global _buffer
+    if _buffer is None:
+        return []
+    samples, _buffer = _buffer, []
+    return samples
+
+def replay(samples: list):
+    by_name = {m.name: m for m in _REGISTRY}
+    for name, labels, value in samples or []:
+        m = by_name.get(name)
+        if isinstance(m, Histogram):
+            m.observe(value, **labels)
+        elif isinstance(m, Counter):
+            m.inc(value, **labels)
+
+
+# --- METRICS ---
+REQUEST_LATENCY = Histogram("http_request_duration_seconds", "Request latency per endpoint.")
+STAGE_LATENCY = Histogram("pipeline_stage_duration_seconds", "Ingestion pipeline stage latency.")
+RETRIEVAL_LATENCY = Histogram("retrieval_duration_seconds", "Retrieval latency split into encode and search phases.")
+BYTES_INGESTED = Counter("ingested_bytes_total", "Bytes received through /process.")
+CHUNKS_INDEXED = Counter("indexed_chunks_total", "Chunks added to the live index.")
+SHARD_FAILURES = Counter("shard_failures_total", "Shard requests that timed out or failed.")
+CACHE_HITS = FunctionCounter("query_cache_hits_total", "Query cache hits.")
+CACHE_MISSES = FunctionCounter("query_cache_misses_total", "Query cache misses.")
+
+
+class MetricsMiddleware:
+    """Plain ASGI middleware (cheaper than BaseHTTPMiddleware) recording REQUEST_LATENCY."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            route = scope.get("route")
+            endpoint = getattr(route, "path", None) or "unmatched"
+            REQUEST_LATENCY.observe(time.perf_counter() - start, endpoint=endpoint, method=scope.get("method", ""))
@@ -1,24 +1,32 @@
 # src/core/ocr_processor.py
+import os
 from pathlib import Path
+from .metrics import STAGE_LATENCY
 try:
     from PIL import Image
     import pytesseract
-    # Allow large images
-    Image.MAX_IMAGE_PIXELS = None 
+    # Large scans are fine, decompression bombs are not: Pillow refuses anything
+    # over 2x this many pixels (default ~180 MP, i.e. an A3 page at 1200 dpi).
+    Image.MAX_IMAGE_PIXELS = int(os.getenv("OCR_MAX_IMAGE_PIXELS", "89478485"))
 except ImportError:
     Image = None
     pytesseract = None
 
 try:
-    from pdf2image import convert_from_path
+    from pdf2image import convert_from_path, pdfinfo_from_path
 except ImportError:
     convert_from_path = None
+    pdfinfo_from_path = None
 
 class OCRProcessor:
     def __init__(self):
         pass
 
-    def ocr_file(self, file_path: Path) -> str:
+    def ocr_file(self, file_path: Path, progress=None) -> str:
+        """
+        progress, if given, is called after every page with
+        {"stage": "ocr", "done": pages_done, "total": pages, "unit": "pages", "text": page_text}.
+        """
         if not pytesseract or not Image:
             print("[WARN] Tesseract/Pillow not installed. OCR skipped.")
             return ""
@@ -31,14 +39,46 @@ class OCRProcessor:
             if suffix == ".pdf":
                 if not convert_from_path:
                     return ""
-                images = convert_from_path(str(file_path))
-                for image in images:
-                    text += pytesseract.image_to_string(image) + "\n\n"
+                total, pages = self._ocr_pdf_pages(file_path)
+                for i, page_text in enumerate(pages, 1):
+                    text += page_text + "\n\n"
+                    if progress:
+                        progress({"stage": "ocr", "done": i, "total": total, "unit": "pages", "text": page_text})
             else:
                 img = Image.open(file_path)
-                text = pytesseract.image_to_string(img)
+                with STAGE_LATENCY.time(stage="ocr_page"):
+                    text = pytesseract.image_to_string(img)
+                if progress:
+                    progress({"stage": "ocr", "done": 1, "total": 1, "unit": "pages", "text": text})
         except Exception as e:
             print(f"[OCR ERROR] {file_path.name}: {e}")
             return ""
 
-        return text
\ No newline at end of file
+        return text
+
+    def _ocr_pdf_pages(self, file_path: Path):
+        """
+        Returns (page_count, iterator of page texts). Pages are rasterized and OCR'd
+        one at a time so progress (and memory) is per page.
+        """
+        try:
+            count = int(pdfinfo_from_path(str(file_path))["Pages"])
+        except Exception:
+            count = 0
+
+        if not count:
+            with STAGE_LATENCY.time(stage="pdf_rasterize"):
+                images = convert_from_path(str(file_path))
+            return len(images), self._ocr_images(images)
+
+        def pages():
+            for page in range(1, count + 1):
+                with STAGE_LATENCY.time(stage="pdf_rasterize"):
+                    images = convert_from_path(str(file_path), first_page=page, last_page=page)
+                yield from self._ocr_images(images)
+        return count, pages()
+
+    def _ocr_images(self, images):
+        for image in images:
+            with STAGE_LATENCY.time(stage="ocr_page"):
+                yield pytesseract.image_to_string(image)
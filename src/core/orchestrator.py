@@ -11,6 +11,8 @@ from .ocr_processor import OCRProcessor
 from .audio_processor import AudioProcessor, AudioUnavailable
 from .utils import clean_text, clean_transcript_text, save_output_json, log_processing
 from core.storage import init_db, record_upload, record_result
+from core.metrics import STAGE_LATENCY
+from .filters import IMAGE_SUFFIXES, AUDIO_SUFFIXES, TRANSCRIPT_SUFFIXES, infer_modality as modality
 
 # Try importing Sentiment Analyzer (Optional)
 try:
@@ -46,9 +48,17 @@ def _cleanup_summary_field(text: str, max_chars: int = 400) -> str:
         out = out[:max_chars].rsplit(" ", 1)[0] + "..."
     return out.strip()
 
+def _emit(progress, **event):
+    if progress is None: return
+    try:
+        progress(event)
+    except Exception as e:
+        print("Warning: progress callback failed:", e)
+
 # --- COST ESTIMATION LOGIC ---
-def _calculate_cost(text: str = "", image_count: int = 0, audio_seconds: int = 0) -> dict:
-    word_count = len(text.split()) if text else 0
+def _calculate_cost(text: str = "", image_count: int = 0, audio_seconds: int = 0, word_count: int = None) -> dict:
+    if word_count is None:
+        word_count = len(text.split()) if text else 0
     est_tokens = int(word_count * 1.33)
     text_cost = (est_tokens / 1_000_000) * 0.15
     image_cost = image_count * 0.002
@@ -61,6 +71,33 @@ def _calculate_cost(text: str = "", image_count: int = 0, audio_seconds: int = 0
         "details": f"{est_tokens} tokens, {image_count} images, {audio_seconds}s audio"
     }
 
+
+# --- ADMISSION COST (before processing) ---
+COST_UNIT_USD = 0.002        # one OCR'd image = 1 unit of work
+PDF_BYTES_PER_PAGE = 100_000
+TEXT_BYTES_PER_WORD = 6
+
+def estimate_cost(path: Path) -> dict:
+    """
+    Price a file from its size alone, with the same rates as _calculate_cost.
+    PDFs are priced as if every page needs OCR. "weight" is the price in units
+    of one image (at least 1); the job queue admits work by weight.
+    """
+    path = Path(path)
+    size = path.stat().st_size
+    kind = modality(path)
+    if kind == "audio":
+        cost = _calculate_cost(audio_seconds=int(size / (1024 * 1024) * 60))  # same guess as process_audio
+    elif kind == "image":
+        cost = _calculate_cost(image_count=1)
+    elif kind == "pdf":
+        cost = _calculate_cost(image_count=max(1, size // PDF_BYTES_PER_PAGE))
+    else:
+        cost = _calculate_cost(word_count=size // TEXT_BYTES_PER_WORD)
+    cost["modality"] = kind
+    cost["weight"] = max(1, math.ceil(cost["estimated_cost_usd"] / COST_UNIT_USD))
+    return cost
+
 class PipelineOrchestrator:
     def __init__(self, use_llm: bool = False):
         self.summarizer = ExtractiveSummarizer()
@@ -72,34 +109,52 @@ class PipelineOrchestrator:
         except Exception:
             self.sentiment = None
 
-    def process_pdf(self, path: Path):
+    def process_file(self, path: Path, content_hash: str = None, progress=None):
+        """
+        Dispatch on file extension; unknown types are treated as text.
+        content_hash (sha256 of the upload) is stored with the upload row for dedup.
+        progress, if given, is called with stage events (see OCRProcessor / AudioProcessor);
+        events carrying "text" hold extracted text as soon as it exists.
+        """
+        path = Path(path)
+        suffix = path.suffix.lower()
+        if suffix == ".pdf": return self.process_pdf(path, content_hash, progress)
+        if suffix in IMAGE_SUFFIXES: return self.process_image(path, content_hash, progress)
+        if suffix in AUDIO_SUFFIXES: return self.process_audio(path, content_hash, progress)
+        return self.process_text(path, content_hash, progress)
+
+    def process_pdf(self, path: Path, content_hash: str = None, progress=None):
         path = Path(path)
         method = "text-extraction"
+        _emit(progress, stage="extract")
         text = self._extract_pdf_text(path)
         if not text or len(text.strip()) < 300:
             method = "ocr"
-            text = self.ocr.ocr_file(path)
+            text = self.ocr.ocr_file(path, progress=progress)
+        else:
+            _emit(progress, stage="extract", text=text)
         text = clean_text(text)
         cost_info = _calculate_cost(text=text)
-        return self._postprocess_and_save(path, text, method, cost_info)
+        return self._postprocess_and_save(path, text, method, cost_info, content_hash, progress)
 
-    def process_text(self, path: Path):
+    def process_text(self, path: Path, content_hash: str = None, progress=None):
         path = Path(path)
         raw = path.read_text(encoding="utf-8")
-        if path.suffix.lower() in (".vtt", ".srt"):
+        if path.suffix.lower() in TRANSCRIPT_SUFFIXES:
             text = clean_transcript_text(raw)
         else:
             text = clean_text(raw)
+        _emit(progress, stage="extract", text=text)
         cost_info = _calculate_cost(text=text)
-        return self._postprocess_and_save(path, text, "text", cost_info)
+        return self._postprocess_and_save(path, text, "text", cost_info, content_hash, progress)
 
-    def process_image(self, path: Path):
+    def process_image(self, path: Path, content_hash: str = None, progress=None):
         path = Path(path)
-        text = clean_text(self.ocr.ocr_file(path))
+        text = clean_text(self.ocr.ocr_file(path, progress=progress))
         cost_info = _calculate_cost(text=text, image_count=1)
-        return self._postprocess_and_save(path, text, "image_ocr", cost_info)
+        return self._postprocess_and_save(path, text, "image_ocr", cost_info, content_hash, progress)
 
-    def process_audio(self, path: Path):
+    def process_audio(self, path: Path, content_hash: str = None, progress=None):
         path = Path(path)
         if not self.audio:
             self.audio = AudioProcessor()
@@ -108,26 +163,27 @@ class PipelineOrchestrator:
         est_seconds = int(file_size_mb * 60) # Rough estimate
         
         try:
-            transcript = self.audio.transcribe(path)
+            transcript = self.audio.transcribe(path, progress=progress)
         except AudioUnavailable as e:
             print(f"[WARN] Audio unavailable: {e}")
-            return self._postprocess_and_save(path, "", "audio_transcript")
+            return self._postprocess_and_save(path, "", "audio_transcript", content_hash=content_hash)
         except Exception as e:
             print(f"[WARN] Audio failed: {e}")
-            return self._postprocess_and_save(path, "", "audio_transcript")
+            return self._postprocess_and_save(path, "", "audio_transcript", content_hash=content_hash)
             
         transcript = clean_text(transcript)
         cost_info = _calculate_cost(text=transcript, audio_seconds=est_seconds)
-        return self._postprocess_and_save(path, transcript, "audio_transcript", cost_info)
+        return self._postprocess_and_save(path, transcript, "audio_transcript", cost_info, content_hash, progress)
 
     def _extract_pdf_text(self, path: Path) -> Optional[str]:
         try:
             from pdfminer.high_level import extract_text
-            return extract_text(str(path))
+            with STAGE_LATENCY.time(stage="pdf_extract"):
+                return extract_text(str(path))
         except Exception:
             return None
 
-    def _postprocess_and_save(self, path: Path, text: str, method: str, cost_info: dict = None):
+    def _postprocess_and_save(self, path: Path, text: str, method: str, cost_info: dict = None, content_hash: str = None, progress=None):
         if cost_info is None:
             cost_info = {"tokens": 0, "estimated_cost_usd": 0.0}
 
@@ -144,10 +200,12 @@ class PipelineOrchestrator:
         if not text or len(text.strip()) < 20:
             out["summaries"] = {"one_line": "", "three_bullets": "", "five_sentence": ""}
             out["follow_up_needed"] = True
-            save_output_json(out)
+            save_output_json(out, content_hash=content_hash)
             return out
 
-        summaries = self.summarizer.summarize_all(text)
+        _emit(progress, stage="summarize")
+        with STAGE_LATENCY.time(stage="summarize"):
+            summaries = self.summarizer.summarize_all(text)
         
         # Cleanup summary text
         try:
@@ -162,7 +220,8 @@ class PipelineOrchestrator:
         # Sentiment
         if self.sentiment:
             try:
-                vs = self.sentiment.polarity_scores(text)
+                with STAGE_LATENCY.time(stage="sentiment"):
+                    vs = self.sentiment.polarity_scores(text)
                 label = "neutral"
                 if vs["compound"] >= 0.05: label = "positive"
                 elif vs["compound"] <= -0.05: label = "negative"
@@ -173,7 +232,7 @@ class PipelineOrchestrator:
             out["sentiment"] = {"label": "unknown", "score": 0.0}
 
         out["follow_up_needed"] = False
-        save_output_json(out)
+        summary_path = save_output_json(out, content_hash=content_hash)
         log_processing(f"{path} processed successfully via {method}")
         
         # Save to DB
@@ -181,9 +240,12 @@ class PipelineOrchestrator:
             filename = path.name
             filepath = str(path.resolve())
             filetype = Path(filename).suffix.lstrip(".").lower()
-            upload_id = record_upload(filename, filepath, filetype=filetype, source="local")
-            record_result(upload_id, str(Path("demo/outputs") / f"{path.stem}_summary.json"), summaries, out.get("sentiment"), out["follow_up_needed"])
+            with STAGE_LATENCY.time(stage="db_write"):
+                upload_id = record_upload(filename, filepath, filetype=filetype, source="local", content_hash=content_hash)
+                record_result(upload_id, str(summary_path), summaries, out.get("sentiment"), out["follow_up_needed"])
         except Exception as e:
             print("Warning: failed to write DB:", e)
 
+        # cleaned text goes back to the caller (e.g. for indexing) but is not saved in the output JSON
+        out["text"] = text
         return out
\ No newline at end of file
@@ -1,8 +1,28 @@
 # src/core/retrieval.py
 from pathlib import Path
+import collections
+import os
+import json
+import pickle
+import shutil
+import tempfile
+import threading
+import uuid
+import weakref
 import numpy as np
+import scipy.sparse as sp
+from sklearn.base import clone
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from .metrics import RETRIEVAL_LATENCY
+from .bm25 import BM25Index
+from .hashing import HashedIndex
+from .embeddings import embed_texts, EMBED_MODEL_NAME
+from .embed_cache import default_cache
+from .ann import build_index, set_search_params, index_params_from_env, rescore, exact_top, search_filtered
+from .filters import MetadataIndex, add_posting, normalize_filters
+from .chunking import source_text
+from .chunk_store import ChunkList, ChunkStore, STORE_DIR, store_exists, write_chunk_store
+from .index_store import CHUNKS_META, FAISS_INDEX, EMBEDDINGS, TFIDF_VECTORIZER, TFIDF_MATRIX, BM25_INDEX, HASHED_STATS, BACKEND_FILES, SHARDS_META
 try:
     import faiss
     FAISS_AVAILABLE = True
@@ -16,26 +36,51 @@ except Exception:
     ST_AVAILABLE = False
 
 class Retriever:
-    def __init__(self, docs: list, use_faiss: bool = False):
+    """
+    Chunk retriever over FAISS embeddings, TF-IDF, a hashed sparse index
+    (core.hashing), or a BM25 inverted index.
+
+    Documents added after construction go into small "delta" segments (sparse rows,
+    a BM25 index, or a flat FAISS index with its vectors), so ingest cost does not
+    depend on corpus size. Each add becomes a new segment, merged with the segments
+    before it while they are no larger, so the delta holds O(log n) segments and
+    every row is rebuilt O(log n) times. Replaced or deleted chunks are tombstoned
+    and skipped at query time; compact() folds the delta back into the main index
+    and drops tombstones, normally in a background thread once the delta or
+    tombstone count crosses a threshold.
+    """
+    # compaction triggers: a delta of this many rows, whatever the corpus size ...
+    compact_delta_rows = 2048
+    # ... or tombstones larger than this many rows and this fraction of the index
+    compact_min_rows = 512
+    compact_ratio = 0.25
+
+    def __init__(self, docs: list, use_faiss: bool = False, backend: str = None, index_params: dict = None):
         """
-        docs: list of dicts with keys: id, text, metadata
+        docs: list of dicts with keys: id, text, metadata (or a ChunkList)
+        backend: "tfidf", "hashed", "faiss" or "bm25" (default: "faiss" if use_faiss else "tfidf")
+        index_params: FAISS index kind and knobs, see core.ann (default: ANN_* env)
         """
-        self.docs = docs
-        self.texts = [d["text"] for d in docs]
-        self.ids = [d["id"] for d in docs]
-        self.use_faiss = use_faiss and FAISS_AVAILABLE
-        self.tfidf = None
-        self.tfidf_matrix = None
-        self.embed_model = None
-        self.embeddings = None
+        self._init_state(docs)
+        if index_params is not None:
+            self.index_params = index_params
+        backend = backend or ("faiss" if use_faiss else "tfidf")
+        if backend not in BACKEND_FILES:
+            raise ValueError(f"Unknown retrieval backend: {backend}")
+        if backend == "bm25":
+            self._fit_bm25()
+            return
+        if backend == "hashed":
+            self._fit_hashed()
+            return
+        self.use_faiss = backend == "faiss" and FAISS_AVAILABLE
         if self.use_faiss:
             if ST_AVAILABLE:
-                self.embed_model = SentenceTransformer("all-MiniLM-L6-v2")
-                self.embeddings = np.vstack([self.embed_model.encode(t) for t in self.texts]).astype("float32")
-                dim = self.embeddings.shape[1]
-                self.index = faiss.IndexFlatIP(dim)
-                faiss.normalize_L2(self.embeddings)
-                self.index.add(self.embeddings)
+                self.embed_model = SentenceTransformer(EMBED_MODEL_NAME)
+                # full builds may fan out over EMBED_WORKERS processes
+                emb = self._encode(self.docs.texts(), workers=None)
+                self.index = build_index(emb, **self.index_params)
+                self.embeddings = self._stored(emb)
             else:
                 # cannot use faiss without sentence-transformers; fallback to TF-IDF
                 self.use_faiss = False
@@ -43,21 +88,688 @@ class Retriever:
         else:
             self._fit_tfidf()
 
+    def _init_state(self, docs: list):
+        # stored rows stay on disk (see core.chunk_store); only added chunks live in memory
+        self.docs = docs.copy() if isinstance(docs, ChunkList) else ChunkList(docs=docs)
+        self.use_faiss = False
+        self.bm25 = None
+        self.hashed = None
+        self.tfidf = None
+        self.tfidf_matrix = None
+        self.embed_model = None
+        self.embeddings = None
+        self.index = None
+        self.index_params = index_params_from_env()
+        # live-update state; (version, generation) identifies what a query saw, e.g. for caching
+        self.version = uuid.uuid4().hex[:12]
+        self.generation = 0
+        self._n_main = len(self.docs)
+        self._delta = ()   # _Segment per merged run of adds, in row order
+        self._tombstones = frozenset()
+        self._live = None   # (tombstones, n_rows, mask) of the last _live_mask
+        # built from the store's columns, so opening a large index does not walk its rows
+        self._rows_by_source = _source_rows(self.docs)
+        self._meta = MetadataIndex.for_chunks(self.docs)
+        # _lock guards short reference swaps; _write_lock serializes writers. Compaction
+        # holds _compact_lock throughout but the others only to snapshot and to swap.
+        self._lock = threading.RLock()
+        self._write_lock = threading.RLock()
+        self._compact_lock = threading.Lock()
+        self._dropped = None   # sources removed while a compaction builds, replayed at its swap
+
     def _fit_tfidf(self):
         self.tfidf = TfidfVectorizer(stop_words="english")
-        self.tfidf_matrix = self.tfidf.fit_transform(self.texts)
-
-    def retrieve(self, query: str, top_k: int = 5):
-        if self.use_faiss and self.embed_model:
-            q_emb = self.embed_model.encode([query]).astype("float32")
-            faiss.normalize_L2(q_emb)
-            D, I = self.index.search(q_emb, top_k)
-            results = []
-            for idx in I[0]:
-                results.append(self.docs[idx])
-            return results
+        self.tfidf_matrix = self.tfidf.fit_transform(self.docs.texts())
+
+    def _fit_bm25(self):
+        self.bm25 = BM25Index(self.docs.texts())
+
+    def _fit_hashed(self):
+        self.hashed = HashedIndex(self.docs.texts())
+
+    @property
+    def backend(self) -> str:
+        if self.use_faiss:
+            return "faiss"
+        if self.hashed is not None:
+            return "hashed"
+        return "bm25" if self.bm25 is not None else "tfidf"
+
+    def _encode(self, texts, workers: int = 1) -> np.ndarray:
+        emb = embed_texts(texts, model=self.embed_model, workers=workers, cache=default_cache())
+        faiss.normalize_L2(emb)
+        return emb
+
+    @staticmethod
+    def _flat_index(emb: np.ndarray):
+        index = faiss.IndexFlatIP(emb.shape[1])
+        index.add(np.ascontiguousarray(emb, dtype="float32"))
+        return index
+
+    # --- PERSISTENCE ---
+    @classmethod
+    def load(cls, index_dir: Path, use_faiss: bool = True, backend: str = None):
+        """
+        Open an index written by save() or scripts/build_index.py without re-chunking.
+        The FAISS index is read from disk (mmap where supported) and embeddings are
+        memory-mapped. Otherwise the saved BM25 or TF-IDF index is used; with
+        `backend` set only that one is considered. Only when nothing usable is on
+        disk is the sparse index refit from the stored chunks.
+        """
+        index_dir = Path(index_dir)
+        if store_exists(index_dir):
+            docs = ChunkList(ChunkStore.open(index_dir))
+        else:
+            # indexes written before the chunk store
+            docs = json.loads((index_dir / CHUNKS_META).read_text(encoding="utf-8"))
+        self = cls.__new__(cls)
+        self._init_state(docs)
+
+        faiss_path = index_dir / FAISS_INDEX
+        if backend in (None, "faiss") and use_faiss and FAISS_AVAILABLE and ST_AVAILABLE and faiss_path.exists():
+            try:
+                self.index = faiss.read_index(str(faiss_path), faiss.IO_FLAG_MMAP)
+            except Exception:
+                self.index = faiss.read_index(str(faiss_path))
+            set_search_params(self.index, **self.index_params)
+            emb_path = index_dir / EMBEDDINGS
+            if emb_path.exists():
+                self.embeddings = np.load(emb_path, mmap_mode="r")
+            if self.index.ntotal == len(docs):
+                self.embed_model = SentenceTransformer(EMBED_MODEL_NAME)
+                self.use_faiss = True
+                return self
+            self.index = None
+            self.embeddings = None
+
+        bm25_path = index_dir / BM25_INDEX
+        if backend in (None, "bm25") and bm25_path.exists():
+            self.bm25 = BM25Index.load(bm25_path)
+            if self.bm25.n_docs == len(docs):
+                return self
+            self.bm25 = None
+
+        if backend in (None, "hashed") and (index_dir / HASHED_STATS).exists():
+            self.hashed = HashedIndex.load(index_dir)
+            if self.hashed.matrix.shape[0] == len(docs):
+                return self
+            self.hashed = None
+
+        vec_path, mat_path = index_dir / TFIDF_VECTORIZER, index_dir / TFIDF_MATRIX
+        if backend in (None, "tfidf") and vec_path.exists() and mat_path.exists():
+            with open(vec_path, "rb") as fh:
+                self.tfidf = pickle.load(fh)
+            with open(mat_path, "rb") as fh:
+                self.tfidf_matrix = pickle.load(fh)
+            if self.tfidf_matrix.shape[0] == len(docs):
+                return self
+            self.tfidf = self.tfidf_matrix = None
+
+        if backend == "bm25":
+            self._fit_bm25()
+        elif backend == "hashed":
+            self._fit_hashed()
         else:
-            qv = self.tfidf.transform([query])
-            sims = cosine_similarity(qv, self.tfidf_matrix)[0]
-            top_idx = sims.argsort()[::-1][:top_k]
-            return [self.docs[i] for i in top_idx]
\ No newline at end of file
+            self._fit_tfidf()
+        return self
+
+    def save(self, index_dir: Path):
+        index_dir = Path(index_dir)
+        index_dir.mkdir(parents=True, exist_ok=True)
+        if self.is_dirty():
+            self.compact()
+        # drop the other backends' artifacts so load() never pairs them with these chunks
+        for backend, names in BACKEND_FILES.items():
+            if backend != self.backend:
+                for name in names:
+                    (index_dir / name).unlink(missing_ok=True)
+        # an unsharded index replaces a sharded one written here before
+        (index_dir / SHARDS_META).unlink(missing_ok=True)
+        if self.bm25 is not None:
+            self.bm25.save(index_dir / BM25_INDEX)
+        elif self.hashed is not None:
+            self.hashed.save(index_dir)
+        elif self.use_faiss:
+            faiss.write_index(self.index, str(index_dir / FAISS_INDEX))
+            # write aside and rename: self.embeddings may be a memmap of the current file
+            emb_path = index_dir / EMBEDDINGS
+            tmp = emb_path.with_name(emb_path.name + ".tmp")
+            emb = self.embeddings if self.embeddings is not None else self._main_embeddings()
+            with open(tmp, "wb") as fh:
+                np.save(fh, emb.astype(self.index_params.get("store_dtype", "float32"), copy=False))
+            os.replace(tmp, emb_path)
+            # from now on the rescoring copy is mapped from the index directory
+            self.embeddings = np.load(emb_path, mmap_mode="r")
+        else:
+            with open(index_dir / TFIDF_VECTORIZER, "wb") as fh:
+                pickle.dump(self.tfidf, fh)
+            with open(index_dir / TFIDF_MATRIX, "wb") as fh:
+                pickle.dump(self.tfidf_matrix, fh)
+        (index_dir / CHUNKS_META).unlink(missing_ok=True)
+        if self.docs.store is not None and self.docs.store.path == index_dir / STORE_DIR and len(self.docs) == len(self.docs.store):
+            return
+        write_chunk_store(index_dir, self.docs)
+        # like the embeddings, the saved chunks are served from disk from now on
+        with self._write_lock:
+            store = ChunkStore.open(index_dir)
+            if len(store) == len(self.docs):
+                with self._lock:
+                    self.docs = ChunkList(store)
+
+    def _stored(self, emb: np.ndarray) -> np.ndarray:
+        """The rescoring copy of `emb`: spilled to an unlinked temp file and memory-mapped, not kept in RAM."""
+        dtype = self.index_params.get("store_dtype", "float32")
+        if len(emb) == 0:
+            return np.asarray(emb, dtype=dtype)
+        with tempfile.TemporaryFile(prefix="embeddings-") as fh:
+            stored = np.memmap(fh, dtype=dtype, mode="w+", shape=emb.shape)
+        stored[:] = emb
+        return stored
+
+    def _main_embeddings(self) -> np.ndarray:
+        if self.embeddings is not None:
+            return np.asarray(self.embeddings, dtype="float32")
+        return self.index.reconstruct_n(0, self.index.ntotal)
+
+    # --- LIVE UPDATES ---
+    def add_documents(self, docs: list, replace: bool = True) -> int:
+        """
+        Append chunks without refitting. With replace=True, chunks already indexed
+        for the same source are tombstoned first. TF-IDF terms unseen at fit time
+        are added to the vocabulary (see _grow_vocabulary), so they are searchable
+        right away, not only after the next compaction.
+        """
+        docs = [d for d in docs if d.get("text")]
+        if not docs:
+            return 0
+        with self._write_lock:
+            dead, kept = set(), []
+            if replace:
+                _, dead, kept = self._drop_sources({d.get("source") for d in docs})
+            self._apply(docs + kept, dead)
+        self.maybe_compact()
+        return len(docs)
+
+    def _drop_sources(self, sources: set):
+        """
+        (own rows, rows to tombstone, chunks to add back) for removing `sources`.
+        Near-duplicates of another source's chunk are only indexed through that
+        chunk's "duplicates" (see core.dedup), so a removed chunk is replaced by
+        its first duplicate from a remaining source, with the others as its
+        duplicates, and chunks that list a removed source are re-added without it.
+        """
+        own = set()
+        for src in sources:
+            own.update(map(int, self._rows_by_source.pop(src, ())))
+        if self._dropped is not None:
+            self._dropped.update(sources)
+        own -= self._tombstones    # e.g. rows already re-added without a removed duplicate
+        listing = {i for src in sources for i in self._meta.source_rows(src)} - own - self._tombstones
+        kept, texts = [], {}
+        for i in sorted(own | listing):
+            d = self.docs.fields(i)
+            dups = d.get("duplicates")
+            if not dups:
+                continue
+            rest = [x for x in dups if x.get("source") not in sources]
+            if i in listing:
+                kept.append(_with_duplicates({**d, "text": self.docs.text(i)}, rest))
+            elif rest:
+                first = rest[0]
+                text = _duplicate_text(first, texts)
+                kept.append(_with_duplicates({**first, "text": text or self.docs.text(i)}, rest[1:]))
+        return own, own | listing, kept
+
+    def _apply(self, docs: list, dead: set, emb: np.ndarray = None):
+        """
+        Index `docs` in the delta segment and tombstone the `dead` rows in one
+        generation. FAISS reuses `emb` (their vectors) when given.
+        """
+        if not docs:
+            if dead:
+                with self._lock:
+                    self._tombstones = self._tombstones | dead
+                    self.generation += 1
+            return
+        texts = [d["text"] for d in docs]
+        start = len(self.docs)
+        rows = None
+        width = None
+        if self.use_faiss:
+            if emb is None:
+                emb = self._encode(texts)
+        elif self.hashed is not None:
+            # document rows do not depend on collection statistics; only the df counts grow
+            rows = self.hashed.encode(texts)
+            hashed = self.hashed.with_rows(rows)
+        elif self.bm25 is None:
+            tfidf = self._grow_vocabulary(texts)
+            width = len(tfidf.vocabulary_)
+            rows = tfidf.transform(texts)
+            main_matrix = _widen(self.tfidf_matrix, width)
+
+        # extend in place: readers only look at rows covered by the segments they snapshot
+        self.docs.extend(docs)
+        for i, d in enumerate(docs, start):
+            add_posting(self._rows_by_source, d.get("source"), i)
+        self._meta.extend(docs)
+
+        delta = list(self._delta)
+        segment = self._segment(start, len(docs), emb, rows)
+        # merge runs of no larger segments into the new one: O(log n) segments, O(log n) rebuilds per row
+        while delta and delta[-1].n <= segment.n:
+            segment = self._merge(delta.pop(), segment)
+        delta.append(segment)
+        if width is not None:
+            delta = [s._replace(index=_widen(s.index, width)) for s in delta]
+
+        with self._lock:
+            if self.hashed is not None:
+                self.hashed = hashed
+            elif width is not None:
+                self.tfidf, self.tfidf_matrix = tfidf, main_matrix
+            self._delta = tuple(delta)
+            if dead:
+                self._tombstones = self._tombstones | dead
+            self.generation += 1
+
+    def _segment(self, offset: int, n: int, emb=None, rows=None) -> "_Segment":
+        """Delta segment over rows [offset, offset + n) of self.docs, from their vectors / sparse rows."""
+        if self.bm25 is not None:
+            # scored with the main index's collection statistics folded in
+            return _Segment(offset, n, BM25Index(self.docs.texts(offset, offset + n), base=self.bm25), None)
+        if self.use_faiss:
+            return _Segment(offset, n, self._flat_index(emb), emb)
+        return _Segment(offset, n, rows, None)
+
+    def _merge(self, a: "_Segment", b: "_Segment") -> "_Segment":
+        """One segment for two adjacent ones (a right before b)."""
+        if self.bm25 is not None:
+            return self._segment(a.offset, a.n + b.n)
+        if self.use_faiss:
+            return self._segment(a.offset, a.n + b.n, emb=np.vstack([a.emb, b.emb]))
+        rows = sp.vstack([_widen(a.index, b.index.shape[1]), b.index], format="csr")
+        return self._segment(a.offset, a.n + b.n, rows=rows)
+
+    def _grow_vocabulary(self, texts: list):
+        """
+        The TF-IDF vectorizer, or a copy whose vocabulary also has the terms of
+        `texts` it has not seen. No indexed row contains those terms, so existing
+        rows only gain empty columns; their idf is the smoothed idf over the
+        documents indexed so far. The next compaction refits everything.
+        """
+        vocab = self.tfidf.vocabulary_
+        analyze = self.tfidf.build_analyzer()
+        df = {}
+        for text in texts:
+            for term in set(analyze(text)):
+                if term not in vocab:
+                    df[term] = df.get(term, 0) + 1
+        if not df:
+            return self.tfidf
+        n = len(self.docs) + len(texts)
+        tfidf = clone(self.tfidf)
+        tfidf.vocabulary_ = {**vocab, **{term: len(vocab) + i for i, term in enumerate(df)}}
+        tfidf.idf_ = np.concatenate([self.tfidf.idf_, np.log((1 + n) / (1 + np.array(list(df.values())))) + 1])
+        return tfidf
+
+    def remove_source(self, source: str) -> int:
+        """Tombstone every chunk that came from `source`."""
+        return self.remove_sources([source])
+
+    def remove_sources(self, sources) -> int:
+        """Tombstone every chunk that came from one of `sources`; returns how many."""
+        with self._write_lock:
+            own, dead, kept = self._drop_sources(set(sources))
+            self._apply(kept, dead)
+        self.maybe_compact()
+        return len(own)
+
+    @property
+    def cache_tag(self):
+        return (self.version, self.generation)
+
+    def is_dirty(self) -> bool:
+        return len(self.docs) > self._n_main or bool(self._tombstones)
+
+    def maybe_compact(self, background: bool = True):
+        delta_full = len(self.docs) - self._n_main >= self.compact_delta_rows
+        tomb_full = len(self._tombstones) >= max(self.compact_min_rows, self.compact_ratio * self._n_main)
+        if not (delta_full or tomb_full):
+            return
+        if background:
+            # at most one compaction at a time; the thread releases the lock when done
+            if not self._compact_lock.acquire(blocking=False):
+                return
+            threading.Thread(target=self._compact_in_background, name="retriever-compact", daemon=True).start()
+        else:
+            self.compact()
+
+    def _compact_in_background(self):
+        try:
+            self._compact()
+        finally:
+            self._compact_lock.release()
+
+    def compact(self):
+        """
+        Rebuild the main index from live chunks; queries keep using the old one meanwhile.
+        The live chunks are written to a scratch chunk store (removed once no
+        retriever uses it), so they stay on disk rather than on the heap.
+        Adds and removals are not blocked while the index builds: they land in
+        the delta and tombstones as usual and are replayed onto the new index
+        when it is swapped in.
+        """
+        with self._compact_lock:
+            self._compact()
+
+    def _compact(self):
+        with self._write_lock:
+            if not self.is_dirty():
+                return
+            # rows [0, n) as they are now; readers and writers only ever append past n
+            old, n, tomb, delta = self.docs, len(self.docs), self._tombstones, self._delta
+            hashed_main, index_main, emb_main = self.hashed, self.index, self.embeddings
+            self._dropped = set()
+        try:
+            live = np.setdiff1d(np.arange(n), np.fromiter(tomb, dtype=np.int64, count=len(tomb)))
+            docs = ChunkList(_scratch_store((old[i] for i in live.tolist()), count=len(live)))
+
+            tfidf = tfidf_matrix = embeddings = index = bm25 = hashed = None
+            if self.bm25 is not None:
+                bm25 = BM25Index(docs.texts())
+            elif hashed_main is not None:
+                # no refit: keep the live rows and recount df from them
+                parts = [hashed_main.matrix] + [s.index for s in delta]
+                hashed = hashed_main.with_matrix(sp.vstack(parts, format="csr")[live])
+            elif self.use_faiss:
+                if emb_main is None:
+                    emb_main = index_main.reconstruct_n(0, index_main.ntotal)
+                embeddings = np.vstack([np.asarray(emb_main, dtype="float32")] + [s.emb for s in delta])[live]
+                index = build_index(embeddings, **self.index_params)
+                embeddings = self._stored(embeddings)
+            else:
+                tfidf = TfidfVectorizer(stop_words="english")
+                tfidf_matrix = tfidf.fit_transform(docs.texts())
+
+            rows_by_source = _source_rows(docs)
+            meta = MetadataIndex.for_chunks(docs)
+        except BaseException:
+            with self._write_lock:
+                self._dropped = None
+            raise
+
+        with self._write_lock, self._lock:
+            # what arrived during the build: rows past n, and tombstones on either side of it
+            late = self.docs[n:]
+            late_emb = None
+            if self.use_faiss and late:
+                late_emb = np.vstack([s.emb for s in self._delta])[n - self._n_main:]
+            dead = np.fromiter(self._tombstones - tomb, dtype=np.int64)
+            dead = np.where(dead < n, np.searchsorted(live, dead), len(live) + dead - n)
+            for src in self._dropped:
+                rows_by_source.pop(src, None)
+            self._dropped = None
+
+            self.docs = docs
+            if bm25 is not None:
+                self.bm25 = bm25
+            elif hashed is not None:
+                self.hashed = hashed
+            elif self.use_faiss:
+                self.embeddings, self.index = embeddings, index
+            else:
+                self.tfidf, self.tfidf_matrix = tfidf, tfidf_matrix
+            self._delta = ()
+            self._n_main = len(docs)
+            self._tombstones = frozenset()
+            self._rows_by_source = rows_by_source
+            self._meta = meta
+            self.generation += 1
+            # _lock is held across the replay, so no query sees the index without them
+            self._apply(late, set(dead.tolist()), emb=late_emb)
+
+    # --- SEARCH ---
+    # cap on dense (queries x rows) score blocks in the sparse path, in matrix entries
+    score_block_entries = 1 << 24
+
+    # filtered FAISS queries score allowed rows directly below this many rows
+    filter_brute_rows = 20000
+
+    # filtered sparse queries copy out the allowed rows only when they are at most this
+    # fraction of a segment; broader filters score the whole segment and mask the result
+    filter_slice_ratio = 0.1
+
+    def retrieve(self, query: str, top_k: int = 5, filters: dict = None):
+        return self.retrieve_batch([query], top_k, filters)[0]
+
+    def retrieve_batch(self, queries: list, top_k: int = 5, filters: dict = None):
+        """
+        Score many queries at once: one sparse matrix product per segment on the
+        TF-IDF and hashed paths, one index.search call per segment on the FAISS path. BM25
+        walks each query's posting lists (see core.bm25).
+
+        filters (source / modality / since / until, see core.filters) become a row
+        mask applied while scoring: TF-IDF and hashed segments multiply only the
+        allowed rows under narrow filters and mask the full product under broad
+        ones, BM25 skips other postings, FAISS scores the allowed vectors directly
+        or searches with an ID selector. Tombstoned rows are excluded the same way,
+        so deletes never make a search fetch more than top_k.
+        Returns one list of docs (with "score") per query.
+        """
+        if not queries:
+            return []
+        filters = normalize_filters(filters)
+        with self._lock:
+            docs, tomb, meta = self.docs, self._tombstones, self._meta
+            delta = [(s.index, s.offset, s.emb) for s in self._delta]
+            if self.bm25 is not None:
+                segments = [(self.bm25, 0, None)] + delta
+            elif self.use_faiss:
+                segments = [(self.index, 0, self.embeddings)] + delta
+            elif self.hashed is not None:
+                vectorizer, segments = self.hashed, [(self.hashed.matrix, 0, None)] + delta
+            else:
+                vectorizer, segments = self.tfidf, [(self.tfidf_matrix, 0, None)] + delta
+
+        mask = None
+        if filters is not None:
+            # the cached filter mask is shared between queries: read it, never write it
+            mask = meta.mask(filters, len(docs))
+        if tomb:
+            # deleted rows are masked out like filtered ones, so no search asks for more than top_k
+            live = self._live_mask(tomb, len(docs))
+            mask = live if mask is None else mask & live
+        if mask is not None and not mask.any():
+            return [[] for _ in queries]
+        fetch = top_k
+        rows, scores = [], []
+        dense = self.use_faiss and self.embed_model
+        if self.bm25 is not None:
+            with RETRIEVAL_LATENCY.time(phase="search"):
+                for segment, offset, _ in segments:
+                    if segment is not None and segment.n_docs:
+                        allowed = None if mask is None else mask[offset:offset + segment.n_docs]
+                        r, sc = self._bm25_top(segment, queries, fetch, allowed)
+                        rows.append(np.where(r >= 0, r + offset, -1))
+                        scores.append(sc)
+            return self._collect(queries, docs, tomb, rows, scores, top_k)
+
+        with RETRIEVAL_LATENCY.time(phase="encode"):
+            if dense:
+                Q = np.asarray(self.embed_model.encode(list(queries)), dtype="float32")
+                faiss.normalize_L2(Q)
+            else:
+                Q = vectorizer.transform(queries)
+                postings = vectorizer.postings if isinstance(vectorizer, HashedIndex) else None
+
+        with RETRIEVAL_LATENCY.time(phase="search"):
+            for segment, offset, vectors in segments:
+                if dense:
+                    if segment is None or segment.ntotal == 0:
+                        continue
+                    allowed = None if mask is None else mask[offset:offset + segment.ntotal]
+                    if allowed is not None and not allowed.any():
+                        continue
+                    n_rescore = self.index_params.get("rescore", 0) if offset == 0 and vectors is not None else 0
+                    if allowed is not None and vectors is not None and allowed.sum() <= self.filter_brute_rows:
+                        D, I = exact_top(Q, vectors, np.flatnonzero(allowed), fetch)
+                    else:
+                        # an approximate / compressed main index re-ranks a wider candidate set exactly
+                        k = min(max(fetch, n_rescore), segment.ntotal)
+                        D, I = segment.search(Q, k) if allowed is None else search_filtered(segment, Q, k, allowed)
+                        if n_rescore > fetch:
+                            D, I = rescore(Q, I, vectors, fetch)
+                    rows.append(np.where(I >= 0, I + offset, -1))
+                    scores.append(np.where(I >= 0, D, -np.inf))
+                else:
+                    # TF-IDF and hashed rows are L2-normalized, so the dot product is the cosine similarity
+                    if segment is None or segment.shape[0] == 0:
+                        continue
+                    mt = postings if offset == 0 else None
+                    if mask is not None:
+                        allowed = mask[offset:offset + segment.shape[0]]
+                        n_allowed = np.count_nonzero(allowed)
+                        if not n_allowed:
+                            continue
+                        if n_allowed <= self.filter_slice_ratio * segment.shape[0]:
+                            ids = np.flatnonzero(allowed)
+                            r, sc = self._sparse_top(Q, segment[ids], fetch)
+                            rows.append(ids[r] + offset)
+                            scores.append(sc)
+                            continue
+                        r, sc = self._sparse_top(Q, segment, fetch, mt, allowed)
+                    else:
+                        r, sc = self._sparse_top(Q, segment, fetch, mt)
+                    rows.append(np.where(r >= 0, r + offset, -1))
+                    scores.append(sc)
+        return self._collect(queries, docs, tomb, rows, scores, top_k)
+
+    def _live_mask(self, tomb: frozenset, n: int) -> np.ndarray:
+        """Read-only mask of the rows [0, n) not in `tomb`; kept until the tombstones or row count change."""
+        cached = self._live
+        if cached is not None and cached[0] is tomb and cached[1] == n:
+            return cached[2]
+        live = np.ones(n, dtype=bool)
+        dead = np.fromiter(tomb, dtype=np.int64, count=len(tomb))
+        live[dead[dead < n]] = False
+        live.flags.writeable = False
+        self._live = (tomb, n, live)
+        return live
+
+    @staticmethod
+    def _collect(queries, docs, tomb, rows, scores, top_k):
+        """Merge per-segment (rows, scores) blocks into ranked hit lists, skipping tombstones."""
+        if not rows:
+            return [[] for _ in queries]
+        rows, scores = np.hstack(rows), np.hstack(scores)
+        order = np.argsort(-scores, axis=1, kind="stable")
+        results = []
+        for qi in range(len(queries)):
+            hits = []
+            for j in order[qi]:
+                row = rows[qi, j]
+                if row < 0 or row in tomb:
+                    continue
+                hits.append({**docs[row], "score": float(scores[qi, j])})
+                if len(hits) == top_k:
+                    break
+            results.append(hits)
+        return results
+
+    @staticmethod
+    def _bm25_top(segment, queries, k: int, allowed=None):
+        """Per-query BM25 top-k, padded to a (queries x k) block with row -1 / score -inf."""
+        rows = np.full((len(queries), k), -1, dtype=np.int64)
+        scores = np.full((len(queries), k), -np.inf)
+        for qi, q in enumerate(queries):
+            ids, sc = segment.search(q, k, allowed)
+            rows[qi, :len(ids)] = ids
+            scores[qi, :len(ids)] = sc
+        return rows, scores
+
+    def _sparse_top(self, Q, matrix, k: int, mt=None, allowed=None):
+        """
+        Per-query top-k of Q @ matrix.T, computed in query blocks to bound memory.
+        mt: matrix.T already in CSR form (hashed backend), saves converting it per call.
+        allowed: boolean row mask; other rows score -inf and come back as row -1.
+        """
+        n = matrix.shape[0]
+        k = min(k, n)
+        block = max(1, self.score_block_entries // n)
+        if mt is None:
+            mt = matrix.T.tocsc()
+        excluded = None if allowed is None else np.flatnonzero(~allowed)
+        rows = np.empty((Q.shape[0], k), dtype=np.int64)
+        scores = np.empty((Q.shape[0], k), dtype=np.float64)
+        for start in range(0, Q.shape[0], block):
+            S = (Q[start:start + block] @ mt).toarray()
+            if excluded is not None:
+                S[:, excluded] = -np.inf
+            if k < n:
+                top = np.argpartition(-S, k - 1, axis=1)[:, :k]
+            else:
+                top = np.broadcast_to(np.arange(n), S.shape)
+            rows[start:start + block] = top
+            scores[start:start + block] = np.take_along_axis(S, top, axis=1)
+        if excluded is not None:
+            rows[np.isneginf(scores)] = -1
+        return rows, scores
+
+    def search(self, query: str, k: int = 5, filters: dict = None):
+        return self.retrieve(query, k, filters)
+
+
+# a delta segment: rows [offset, offset + n) of Retriever.docs; index is a BM25Index, a
+# flat FAISS index (emb: its vectors) or a CSR matrix of TF-IDF / hashed rows
+_Segment = collections.namedtuple("_Segment", "offset n index emb")
+
+
+def _source_rows(docs: ChunkList) -> dict:
+    """{source: rows}: stored rows from the store's source column, added ones row by row."""
+    rows = docs.store.postings("source") if docs.store is not None and docs.stored else {}
+    for i, d in enumerate(docs.metadata(docs.stored), docs.stored):
+        add_posting(rows, d.get("source"), i)
+    return rows
+
+
+def _with_duplicates(doc: dict, duplicates: list) -> dict:
+    doc = {k: v for k, v in doc.items() if k != "duplicates"}
+    if duplicates:
+        doc["duplicates"] = duplicates
+    return doc
+
+
+def _duplicate_text(dup: dict, texts: dict):
+    """A deduplicated chunk's own text, sliced from the file at its "path" (None if unavailable)."""
+    path, start, end = dup.get("path"), dup.get("start"), dup.get("end")
+    if path is None or start is None or end is None:
+        return None
+    if path not in texts:
+        try:
+            texts[path] = source_text(path)
+        except OSError:
+            texts[path] = None
+    text = texts[path]
+    return text[start:end] if text is not None and end <= len(text) else None
+
+
+def _scratch_store(docs, count: int) -> ChunkStore:
+    """Write `docs` to a chunk store in a temp directory that is deleted with the returned store."""
+    scratch = tempfile.mkdtemp(prefix="chunks-")
+    try:
+        write_chunk_store(scratch, docs, count=count)
+        store = ChunkStore.open(scratch)
+    except BaseException:
+        shutil.rmtree(scratch, ignore_errors=True)
+        raise
+    weakref.finalize(store, shutil.rmtree, scratch, True)
+    return store
+
+
+def _widen(matrix, n_cols: int):
+    """`matrix` with empty columns appended up to n_cols (shares its arrays)."""
+    if matrix is None or matrix.shape[1] == n_cols:
+        return matrix
+    matrix = sp.csr_matrix(matrix)
+    return sp.csr_matrix((matrix.data, matrix.indices, matrix.indptr), shape=(matrix.shape[0], n_cols))
@@ -0,0 +1,474 @@
+# src/core/shards.py
+"""
+Sharded retrieval: scatter-gather over worker processes.
+
+ShardedRetriever splits the chunks into N shards by a stable hash of their
+source, so every chunk of a file lives in one shard. A near-duplicate chunk is
+indexed through its representative (core.dedup), which may sit in another
+file's shard, so replacing or removing a file is sent to every shard; each
+drops the file's chunks and duplicates it holds. Each shard is its own process holding a local
+retriever (any backend from core.hybrid), so the index is no longer bound to
+one Python heap and a single query keeps N cores busy. A query is sent to all
+shards at once, each returns its own top-k, and the coordinator merges them
+by score. Hybrid shards return their lexical and dense candidates unfused
+(HybridRetriever.retrieve_legs): each leg is merged across shards by its own
+score and fused once at the coordinator, because RRF and min-max scores
+depend on the rest of a shard's list and do not compare across shards.
+
+Each shard has many requests in flight at once: requests carry a sequence
+number, a reader thread on the coordinator matches replies to them, and the
+worker answers reads on a small thread pool while writes run in arrival order.
+Concurrent queries therefore share a shard instead of queueing for it.
+
+A shard that does not answer within SHARD_TIMEOUT, or has died, is left out
+of that answer (counted in shard_failures_total) instead of failing the whole
+query. A dead shard is restarted from its last saved snapshot. Writes are not
+retried: add_documents / remove_source raise if a shard is unavailable.
+
+Sparse backends compute idf per shard, so lexical scores from different shards
+are close to, but not exactly, what one index would give; dense (cosine)
+scores are directly comparable.
+
+On disk: shards.json plus one regular index directory per shard (shard_00, ...).
+
+Config (env):
+ - INDEX_SHARDS      shards for new indexes (read by core.hybrid.build_retriever)
+ - SHARD_TIMEOUT     seconds a query waits for each shard (default 5)
+ - SHARD_RESTART_S   minimum seconds between restarts of a dead shard (default 30)
+ - SHARD_THREADS     reads each shard worker runs concurrently (default 4)
+"""
+import os
+import json
+import time
+import uuid
+import zlib
+import heapq
+import shutil
+import itertools
+import functools
+import threading
+import multiprocessing as mp
+from pathlib import Path
+from concurrent.futures import Future, InvalidStateError, ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from .metrics import RETRIEVAL_LATENCY, SHARD_FAILURES
+from .filters import normalize_filters
+from .chunk_store import STORE_DIR
+from .index_store import CHUNKS_META, SHARDS_META, has_chunks
+from .hybrid import build_local, load_local, fuse, fusion_settings
+
+SHARD_DIR = "shard_{:02d}"
+READ_METHODS = ("count", "retrieve_batch", "retrieve_legs")
+
+
+class ShardError(RuntimeError):
+    """A shard timed out, died, or failed a request."""
+
+
+def shard_of(source, n_shards: int) -> int:
+    # crc32 rather than hash(): it must agree across processes and restarts
+    return zlib.crc32(str(source).encode("utf-8")) % n_shards
+
+
+# --- WORKER PROCESS ---
+def _serve(conn, spec: tuple):
+    """Shard worker loop: (seq, method, args) in, (seq, "ok" | "err", result) out."""
+    kind, arg, backend = spec
+    retriever, init_error = None, None
+    try:
+        if kind == "load":
+            if has_chunks(arg):
+                retriever = load_local(arg, backend)
+        elif arg:
+            retriever = build_local(arg, backend)
+    except Exception as e:
+        init_error = f"shard init failed: {e!r}"
+
+    send_lock = threading.Lock()
+    reads = ThreadPoolExecutor(max_workers=int(os.getenv("SHARD_THREADS", "4")), thread_name_prefix="shard-read")
+    try:
+        while True:
+            try:
+                seq, method, args = conn.recv()
+            except (EOFError, OSError, KeyboardInterrupt):
+                break
+            if method == "close":
+                break
+            if method in READ_METHODS and not init_error:
+                # reads see the retriever as of their arrival; replies go out as they finish
+                reads.submit(_answer, conn, send_lock, seq, functools.partial(_dispatch, retriever, backend, method, args))
+                continue
+            try:
+                if init_error:
+                    raise RuntimeError(init_error)
+                result, retriever = _dispatch(retriever, backend, method, args)
+                reply = (seq, "ok", result)
+            except Exception as e:
+                reply = (seq, "err", f"{type(e).__name__}: {e}")
+            if not _send(conn, send_lock, reply):
+                break
+    finally:
+        reads.shutdown(wait=True)
+
+
+def _answer(conn, send_lock, seq: int, call):
+    try:
+        reply = (seq, "ok", call()[0])
+    except Exception as e:
+        reply = (seq, "err", f"{type(e).__name__}: {e}")
+    _send(conn, send_lock, reply)
+
+
+def _send(conn, send_lock, reply) -> bool:
+    try:
+        with send_lock:
+            conn.send(reply)
+        return True
+    except (BrokenPipeError, OSError):
+        return False
+
+
+def _dispatch(retriever, backend: str, method: str, args: tuple):
+    """Run one request against the shard's retriever; returns (result, retriever)."""
+    if method == "count":
+        return (len(retriever.docs) if retriever is not None else 0), retriever
+    if method == "save":
+        index_dir = Path(args[0])
+        index_dir.mkdir(parents=True, exist_ok=True)
+        if retriever is None:
+            (index_dir / CHUNKS_META).unlink(missing_ok=True)
+            shutil.rmtree(index_dir / STORE_DIR, ignore_errors=True)
+        else:
+            retriever.save(index_dir)
+        return None, retriever
+    if method not in ("retrieve_batch", "retrieve_legs", "add_documents", "remove_sources"):
+        raise ValueError(f"Unknown shard method: {method}")
+    if retriever is None:
+        # empty shard: nothing to search until the first add builds its index
+        if method == "add_documents":
+            docs = args[0]
+            return len(docs), (build_local(docs, backend) if docs else None)
+        if method == "retrieve_batch":
+            return [[] for _ in args[0]], None
+        if method == "retrieve_legs":
+            return [([], []) for _ in args[0]], None
+        return 0, None
+    return getattr(retriever, method)(*args), retriever
+
+
+# --- COORDINATOR ---
+class _Link:
+    """One pipe to a worker process and the requests awaiting a reply on it."""
+    __slots__ = ("conn", "send_lock", "pending", "closed")
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.send_lock = threading.Lock()
+        self.pending = {}   # seq -> Future
+        self.closed = False
+
+
+class _Shard:
+    """Coordinator-side handle: one worker process and the pipe to it."""
+
+    def __init__(self, ctx, index: int, spec: tuple):
+        self.index = index
+        self.backend = spec[2]
+        self.path = Path(spec[1]) if spec[0] == "load" else None   # last saved snapshot
+        self.failures = 0
+        self.restarts = 0
+        self.last_error = None
+        self._ctx = ctx
+        self._lock = threading.Lock()   # guards restarts and every link's pending map
+        self._seq = itertools.count(1)
+        self._start(spec)
+
+    def _start(self, spec: tuple):
+        parent, child = self._ctx.Pipe()
+        self.proc = self._ctx.Process(target=_serve, args=(child, spec), name=f"shard-{self.index}", daemon=True)
+        self.proc.start()
+        child.close()
+        self.conn = parent
+        self._link = _Link(parent)
+        self._started = time.monotonic()
+        threading.Thread(target=self._read_replies, args=(self._link,), name=f"shard-{self.index}-replies",
+                         daemon=True).start()
+
+    def _read_replies(self, link: _Link):
+        """Resolve the futures waiting on `link` by seq; fail the rest once the pipe closes."""
+        while True:
+            try:
+                seq, status, result = link.conn.recv()
+            except (EOFError, OSError, ValueError):
+                break
+            with self._lock:
+                future = link.pending.pop(seq, None)
+            if future is None:
+                continue
+            try:
+                if status == "err":
+                    future.set_exception(ShardError(f"shard {self.index}: {result}"))
+                else:
+                    future.set_result(result)
+            except InvalidStateError:
+                pass   # the caller gave up on it (timeout)
+        with self._lock:
+            link.closed = True
+            left, link.pending = list(link.pending.values()), {}
+        for future in left:
+            try:
+                future.set_exception(ShardError(f"shard {self.index} is down"))
+            except InvalidStateError:
+                pass
+
+    def _ensure_running(self):
+        if self.proc.is_alive():
+            return
+        wait = float(os.getenv("SHARD_RESTART_S", "30"))
+        if self.path is None or time.monotonic() - self._started < wait:
+            raise ShardError(f"shard {self.index} is down")
+        print(f"[WARN] Shard {self.index} died; restarting from {self.path}", flush=True)
+        self.conn.close()
+        self._start(("load", str(self.path), self.backend))
+        self.restarts += 1
+
+    def submit(self, method: str, *args) -> Future:
+        """Send one request without waiting; the reply resolves the returned future."""
+        future = Future()
+        with self._lock:
+            self._ensure_running()
+            link = self._link
+            if link.closed:
+                raise ShardError(f"shard {self.index} is down")
+            seq = next(self._seq)
+            link.pending[seq] = future
+        try:
+            with link.send_lock:
+                link.conn.send((seq, method, args))
+        except (OSError, ValueError) as e:
+            with self._lock:
+                link.pending.pop(seq, None)
+            raise ShardError(f"shard {self.index} is down: {e!r}")
+        return future
+
+    def wait(self, future: Future, timeout: float = None):
+        try:
+            return future.result(timeout)
+        except FutureTimeout:
+            future.cancel()   # a late reply is dropped by the reader
+            raise ShardError(f"shard {self.index} timed out")
+
+    def call(self, method: str, *args, timeout: float = None):
+        return self.wait(self.submit(method, *args), timeout)
+
+    def close(self, timeout: float = 5.0):
+        try:
+            if self.proc.is_alive():
+                with self._link.send_lock:
+                    self.conn.send((0, "close", ()))
+        except (OSError, ValueError):
+            pass
+        self.proc.join(timeout)
+        if self.proc.is_alive():
+            self.proc.terminate()
+            self.proc.join(timeout)
+        self.conn.close()
+
+    def status(self) -> dict:
+        return {
+            "shard": self.index,
+            "alive": self.proc.is_alive(),
+            "pid": self.proc.pid,
+            "failures": self.failures,
+            "restarts": self.restarts,
+            "last_error": self.last_error,
+        }
+
+
+def _merge(hit_lists, k: int) -> list:
+    return heapq.nlargest(k, (hit for hits in hit_lists for hit in hits), key=lambda h: h["score"])
+
+
+def _context():
+    # spawn, not fork: the parent runs threads and may already hold torch / faiss state
+    return mp.get_context("spawn")
+
+
+class ShardedRetriever:
+    def __init__(self, shards: list, backend: str, timeout: float = None):
+        self.shards = shards
+        self._backend = backend
+        self.timeout = float(timeout if timeout is not None else os.getenv("SHARD_TIMEOUT", "5"))
+        self.version = uuid.uuid4().hex[:12]
+        self._writes = 0
+
+    @classmethod
+    def build(cls, docs: list, n_shards: int, backend: str = "tfidf", **kwargs):
+        parts = [[] for _ in range(n_shards)]
+        for d in docs:
+            parts[shard_of(d.get("source"), n_shards)].append(d)
+        ctx = _context()
+        self = cls([_Shard(ctx, i, ("build", part, backend)) for i, part in enumerate(parts)], backend, **kwargs)
+        try:
+            self._fanout("count", timeout=None, strict=True)   # returns once every shard is built
+        except Exception:
+            self.close()
+            raise
+        return self
+
+    @classmethod
+    def load(cls, index_dir: Path, backend: str = None, **kwargs):
+        index_dir = Path(index_dir)
+        meta = json.loads((index_dir / SHARDS_META).read_text(encoding="utf-8"))
+        backend = backend or meta.get("backend")
+        ctx = _context()
+        shards = [_Shard(ctx, i, ("load", str(index_dir / SHARD_DIR.format(i)), backend))
+                  for i in range(int(meta["shards"]))]
+        self = cls(shards, backend, **kwargs)
+        try:
+            self._fanout("count", timeout=None, strict=True)
+        except Exception:
+            self.close()
+            raise
+        return self
+
+    def save(self, index_dir: Path):
+        index_dir = Path(index_dir)
+        index_dir.mkdir(parents=True, exist_ok=True)
+        dirs = [index_dir / SHARD_DIR.format(i) for i in range(len(self.shards))]
+        self._fanout("save", [(str(d),) for d in dirs], timeout=None, strict=True)
+        counts = self._fanout("count", timeout=None, strict=True)
+        for shard, d in zip(self.shards, dirs):
+            shard.path = d
+        # shard directories left over from an index with more shards
+        for d in index_dir.glob("shard_*"):
+            if d.is_dir() and d not in dirs:
+                shutil.rmtree(d, ignore_errors=True)
+        meta = {"shards": len(self.shards), "backend": self._backend, "chunks": counts}
+        tmp = index_dir / (SHARDS_META + ".tmp")
+        tmp.write_text(json.dumps(meta, indent=2), encoding="utf-8")
+        os.replace(tmp, index_dir / SHARDS_META)
+
+    def close(self):
+        for shard in self.shards:
+            shard.close()
+
+    # --- SAME SURFACE AS Retriever ---
+    @property
+    def backend(self) -> str:
+        return self._backend
+
+    @property
+    def num_shards(self) -> int:
+        return len(self.shards)
+
+    @property
+    def num_chunks(self) -> int:
+        return sum(c or 0 for c in self._fanout("count", timeout=self.timeout))
+
+    @property
+    def generation(self):
+        # a restarted shard serves its last snapshot, which also changes answers
+        return self._writes + sum(s.restarts for s in self.shards)
+
+    @property
+    def cache_tag(self):
+        return (self.version, self.generation)
+
+    def shard_status(self) -> list:
+        return [s.status() for s in self.shards]
+
+    def add_documents(self, docs: list, replace: bool = True) -> int:
+        parts = {}
+        for d in docs:
+            parts.setdefault(shard_of(d.get("source"), len(self.shards)), []).append(d)
+        sources = {d.get("source") for d in docs}
+        sent, adds = [], []
+        for i, shard in enumerate(self.shards):
+            part = parts.get(i, [])
+            # the other shards may hold duplicates of these sources' old chunks
+            others = sources - {d.get("source") for d in part}
+            if replace and others:
+                sent.append((shard, shard.submit("remove_sources", list(others))))
+            if part:
+                adds.append((shard, shard.submit("add_documents", part, replace)))
+        for shard, f in sent:
+            shard.wait(f)
+        added = sum(shard.wait(f) for shard, f in adds)
+        self._writes += 1
+        return added
+
+    def remove_source(self, source: str) -> int:
+        return self.remove_sources([source])
+
+    def remove_sources(self, sources) -> int:
+        sent = [(shard, shard.submit("remove_sources", list(sources))) for shard in self.shards]
+        removed = sum(shard.wait(f) for shard, f in sent)
+        self._writes += 1
+        return removed
+
+    def retrieve(self, query: str, top_k: int = 5, filters: dict = None):
+        return self.retrieve_batch([query], top_k, filters)[0]
+
+    def search(self, query: str, k: int = 5, filters: dict = None):
+        return self.retrieve(query, k, filters)
+
+    def retrieve_batch(self, queries: list, top_k: int = 5, filters: dict = None):
+        """Every shard scores all queries; per query the shards' top-k lists are merged by score."""
+        if not queries:
+            return []
+        filters = normalize_filters(filters)   # bad filters fail here, not as a shard error
+        if self._backend == "hybrid":
+            return self._retrieve_hybrid(queries, top_k, filters)
+        with RETRIEVAL_LATENCY.time(phase="scatter"):
+            parts = self._fanout("retrieve_batch", (list(queries), top_k, filters), timeout=self.timeout)
+        answered = [p for p in parts if p is not None]
+        if not answered:
+            raise ShardError("no shard answered")
+        with RETRIEVAL_LATENCY.time(phase="gather"):
+            return [_merge((p[qi] for p in answered), top_k) for qi in range(len(queries))]
+
+    def _retrieve_hybrid(self, queries: list, top_k: int, filters: dict):
+        """Gather each leg's candidates from every shard, then fuse once over the merged legs."""
+        fusion, alpha, depth = fusion_settings()
+        depth = max(top_k, depth)
+        with RETRIEVAL_LATENCY.time(phase="scatter"):
+            parts = self._fanout("retrieve_legs", (list(queries), depth, filters), timeout=self.timeout)
+        answered = [p for p in parts if p is not None]
+        if not answered:
+            raise ShardError("no shard answered")
+        with RETRIEVAL_LATENCY.time(phase="gather"):
+            results = []
+            for qi in range(len(queries)):
+                lexical = _merge((p[qi][0] for p in answered), depth)
+                dense = _merge((p[qi][1] for p in answered), depth)
+                results.append(fuse(lexical, dense, top_k, fusion, alpha) if dense else lexical[:top_k])
+            return results
+
+    def _fanout(self, method: str, args=(), timeout: float = None, strict: bool = False) -> list:
+        """
+        Call `method` on every shard in parallel. `args` is one tuple for all shards
+        or a list with one tuple per shard. Failed shards give None, or raise with strict.
+        """
+        per_shard = args if isinstance(args, list) else [args] * len(self.shards)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        sent = []
+        for shard, a in zip(self.shards, per_shard):
+            try:
+                sent.append(shard.submit(method, *a))
+            except ShardError as e:
+                sent.append(e)
+        results = []
+        for shard, f in zip(self.shards, sent):
+            try:
+                if isinstance(f, ShardError):
+                    raise f
+                results.append(shard.wait(f, None if deadline is None else max(0.0, deadline - time.monotonic())))
+            except Exception as e:
+                if strict:
+                    raise
+                shard.failures += 1
+                shard.last_error = str(e)
+                SHARD_FAILURES.inc(shard=str(shard.index), method=method)
+                results.append(None)
+        return results
@@ -0,0 +1,254 @@
+# src/core/snapshots.py
+"""
+Versioned index snapshots and reference-counted hot swapping.
+
+Every build writes a complete index into its own directory and then publishes
+it by rewriting the manifest (temp file + rename), so readers see either the
+old or the new current version, never a half-written index:
+ - data/index/snapshots/<version>/   chunk store, backend files, index_manifest.json
+ - data/index/snapshots.json         {"current": version, "snapshots": {version: {...}}}
+A published snapshot is never modified. Indexes saved before snapshots existed
+(files directly in data/index) are served as the "legacy" snapshot until the
+first publish.
+
+ActiveIndex holds the snapshot a process is serving. Queries acquire() it,
+which pins that snapshot for the duration of the query; swap() installs a new
+one and retires the old, which is closed (and its directory becomes
+collectable) once the last in-flight query releases it. gc_snapshots() then
+removes published snapshots that are neither current, pinned, nor among the
+SNAPSHOT_KEEP most recent. Other processes serving a removed snapshot keep
+their memory maps until they reload.
+
+Snapshots only hold what a build indexed. Files added or removed through the
+API since are recorded in data/index/ingest_journal.jsonl (IngestJournal), one
+JSON line per change, and replayed onto every snapshot a process loads, so a
+reload or restart does not drop them.
+
+Config (env):
+ - SNAPSHOT_KEEP    older published snapshots kept on disk for rollback (default 1)
+"""
+import os
+import json
+import time
+import uuid
+import shutil
+import threading
+import contextlib
+from pathlib import Path
+from datetime import datetime, timezone
+from .index_store import INGEST_JOURNAL, SNAPSHOTS_DIR, SNAPSHOTS_MANIFEST, index_exists
+
+LEGACY_VERSION = "legacy"
+DEFAULT_KEEP = 1
+
+_manifest_lock = threading.Lock()
+_journal_lock = threading.Lock()
+
+
+def new_version() -> str:
+    """Sortable, unique snapshot name: UTC timestamp plus a random suffix."""
+    return time.strftime("%Y%m%dT%H%M%S", time.gmtime()) + "-" + uuid.uuid4().hex[:6]
+
+
+def snapshot_dir(index_dir: Path, version: str) -> Path:
+    if version == LEGACY_VERSION:
+        return Path(index_dir)
+    return Path(index_dir) / SNAPSHOTS_DIR / version
+
+
+def read_snapshots(index_dir: Path) -> dict:
+    p = Path(index_dir) / SNAPSHOTS_MANIFEST
+    try:
+        return json.loads(p.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {"current": None, "snapshots": {}}
+
+
+def _write_snapshots(index_dir: Path, manifest: dict):
+    p = Path(index_dir) / SNAPSHOTS_MANIFEST
+    tmp = p.with_name(f"{p.name}.{uuid.uuid4().hex[:8]}.tmp")
+    tmp.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    os.replace(tmp, p)
+
+
+def current_snapshot(index_dir: Path):
+    """(version, path) of the snapshot to serve, or (None, None) when there is no index."""
+    current = read_snapshots(index_dir).get("current")
+    if current and index_exists(snapshot_dir(index_dir, current)):
+        return current, snapshot_dir(index_dir, current)
+    if index_exists(index_dir):
+        return LEGACY_VERSION, Path(index_dir)
+    return None, None
+
+
+def publish_snapshot(index_dir: Path, version: str, **info) -> dict:
+    """Make `version` (already fully written) the current snapshot."""
+    with _manifest_lock:
+        manifest = read_snapshots(index_dir)
+        manifest.setdefault("snapshots", {})[version] = {
+            "published_at": datetime.now(timezone.utc).isoformat(), **info}
+        manifest["current"] = version
+        _write_snapshots(index_dir, manifest)
+    return manifest
+
+
+def gc_snapshots(index_dir: Path, in_use=(), keep: int = None) -> list:
+    """Delete published snapshots that are not current, not in `in_use` and older than the `keep` newest."""
+    keep = int(os.getenv("SNAPSHOT_KEEP", str(DEFAULT_KEEP))) if keep is None else keep
+    with _manifest_lock:
+        manifest = read_snapshots(index_dir)
+        current = manifest.get("current")
+        older = sorted((v for v in manifest.get("snapshots", {}) if v != current), reverse=True)
+        doomed = [v for v in older[keep:] if v not in in_use]
+        for v in doomed:
+            manifest["snapshots"].pop(v, None)
+        if doomed:
+            _write_snapshots(index_dir, manifest)
+    for v in doomed:
+        shutil.rmtree(snapshot_dir(index_dir, v), ignore_errors=True)
+    return doomed
+
+
+class IngestJournal:
+    """Append-only log of live index changes: {"op": "add" | "remove", "source": ..., **fields} per line."""
+
+    def __init__(self, index_dir: Path):
+        self.path = Path(index_dir) / INGEST_JOURNAL
+
+    def append(self, op: str, source: str, **fields):
+        line = json.dumps({"op": op, "source": source, **fields}, default=str)
+        with _journal_lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as fh:
+                fh.write(line + "\n")
+                fh.flush()
+                os.fsync(fh.fileno())
+
+    def entries(self) -> list:
+        """
+        The latest entry per source, in the order they were last written. Once
+        most lines are superseded, the file is rewritten with these alone.
+        """
+        with _journal_lock:
+            try:
+                lines = self.path.read_text(encoding="utf-8").splitlines()
+            except FileNotFoundError:
+                return []
+            latest = {}
+            for line in lines:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue   # a line cut short by a crash
+                latest.pop(entry.get("source"), None)
+                latest[entry.get("source")] = entry
+            entries = list(latest.values())
+            if len(lines) > 2 * len(entries):
+                tmp = self.path.with_name(f"{self.path.name}.{uuid.uuid4().hex[:8]}.tmp")
+                tmp.write_text("".join(json.dumps(e) + "\n" for e in entries), encoding="utf-8")
+                os.replace(tmp, self.path)
+            return entries
+
+    def latest(self, source: str):
+        """The last entry written for `source`, or None."""
+        for entry in reversed(self.entries()):
+            if entry.get("source") == source:
+                return entry
+        return None
+
+
+class _Pin:
+    __slots__ = ("retriever", "version", "refs", "retired")
+
+    def __init__(self, retriever, version):
+        self.retriever, self.version = retriever, version
+        self.refs, self.retired = 1, False   # the ActiveIndex itself holds one reference
+
+
+class ActiveIndex:
+    """The index a process serves, swapped atomically and retired by reference count."""
+
+    def __init__(self, on_retire=None):
+        """on_retire(version): called (on a helper thread) once a replaced snapshot has no readers left."""
+        self._lock = threading.Lock()
+        self._pin = None
+        self._retired = []
+        self._on_retire = on_retire
+
+    @property
+    def retriever(self):
+        pin = self._pin
+        return pin.retriever if pin is not None else None
+
+    @property
+    def version(self):
+        pin = self._pin
+        return pin.version if pin is not None else None
+
+    @contextlib.contextmanager
+    def acquire(self):
+        """Pin the current snapshot while the block runs; yields its retriever (or None)."""
+        with self._lock:
+            pin = self._pin
+            if pin is not None:
+                pin.refs += 1
+        try:
+            yield pin.retriever if pin is not None else None
+        finally:
+            if pin is not None:
+                self._release(pin)
+
+    def swap(self, retriever, version: str = None, wait: bool = False):
+        """
+        Serve `retriever` from now on; the previous one is closed after its last
+        query (right here if it has none and wait=True, else on a helper thread).
+        """
+        new = _Pin(retriever, version) if retriever is not None else None
+        with self._lock:
+            if new is not None and self._pin is not None and self._pin.retriever is retriever:
+                self._pin.version = version   # same index, newly persisted
+                return
+            old, self._pin = self._pin, new
+            if old is not None:
+                old.retired = True
+                self._retired.append(old)
+        if old is not None:
+            self._release(old, wait)
+
+    def close(self):
+        self.swap(None, wait=True)
+
+    def in_use(self) -> set:
+        """Versions still referenced: the current one and retired ones with queries in flight."""
+        with self._lock:
+            pins = ([self._pin] if self._pin is not None else []) + self._retired
+            return {p.version for p in pins if p.version is not None}
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "version": self._pin.version if self._pin is not None else None,
+                "in_flight": self._pin.refs - 1 if self._pin is not None else 0,
+                "retired": [{"version": p.version, "in_flight": p.refs} for p in self._retired],
+            }
+
+    def _release(self, pin: _Pin, wait: bool = False):
+        with self._lock:
+            pin.refs -= 1
+            done = pin.retired and pin.refs == 0
+            if done:
+                self._retired.remove(pin)
+        if done and wait:
+            self._retire(pin)
+        elif done:
+            # closing stops shard processes; keep it off the request path
+            threading.Thread(target=self._retire, args=(pin,), name="index-retire", daemon=True).start()
+
+    def _retire(self, pin: _Pin):
+        if pin.retriever is not None and hasattr(pin.retriever, "close"):
+            try:
+                pin.retriever.close()
+            except Exception:
+                pass
+        if self._on_retire is not None and pin.version is not None:
+            self._on_retire(pin.version)
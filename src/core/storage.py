@@ -14,7 +14,8 @@ CREATE TABLE IF NOT EXISTS uploads (
     filepath TEXT,
     filetype TEXT,
     uploaded_at TEXT,
-    source TEXT
+    source TEXT,
+    content_hash TEXT
 );
 
 CREATE TABLE IF NOT EXISTS processing_results (
@@ -32,30 +33,60 @@ CREATE TABLE IF NOT EXISTS processing_results (
 );
 
 CREATE TABLE IF NOT EXISTS retrieval_chunks (
-    id TEXT PRIMARY KEY,
-    source_file TEXT,
+    source_file TEXT NOT NULL,
+    chunk_index INTEGER NOT NULL,
+    id TEXT,
+    text_path TEXT,
     start_token INTEGER,
     end_token INTEGER,
-    metadata TEXT
+    metadata TEXT,
+    PRIMARY KEY (source_file, chunk_index)
 );
 """
 
+# retrieval_chunks used to be keyed by chunk id, which repeats across files with the same name
+_MIGRATE_CHUNKS_SQL = """
+ALTER TABLE retrieval_chunks RENAME TO retrieval_chunks_old;
+CREATE TABLE retrieval_chunks (
+    source_file TEXT NOT NULL,
+    chunk_index INTEGER NOT NULL,
+    id TEXT,
+    text_path TEXT,
+    start_token INTEGER,
+    end_token INTEGER,
+    metadata TEXT,
+    PRIMARY KEY (source_file, chunk_index)
+);
+INSERT INTO retrieval_chunks (source_file, chunk_index, id, start_token, end_token, metadata)
+    SELECT COALESCE(source_file, ''), ROW_NUMBER() OVER (PARTITION BY COALESCE(source_file, '') ORDER BY rowid) - 1,
+           id, start_token, end_token, metadata
+    FROM retrieval_chunks_old;
+DROP TABLE retrieval_chunks_old;
+"""
+
 def init_db():
     DB_PATH.parent.mkdir(parents=True, exist_ok=True)
     conn = sqlite3.connect(DB_PATH)
     cur = conn.cursor()
     cur.executescript(SCHEMA_SQL)
+    # databases created before content hashing lack the column
+    cols = {row[1] for row in cur.execute("PRAGMA table_info(uploads)")}
+    if "content_hash" not in cols:
+        cur.execute("ALTER TABLE uploads ADD COLUMN content_hash TEXT")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_uploads_content_hash ON uploads(content_hash)")
+    if "chunk_index" not in {row[1] for row in cur.execute("PRAGMA table_info(retrieval_chunks)")}:
+        cur.executescript(_MIGRATE_CHUNKS_SQL)
     conn.commit()
     conn.close()
 
-def record_upload(filename, filepath, filetype="unknown", source="local"):
+def record_upload(filename, filepath, filetype="unknown", source="local", content_hash=None):
     conn = sqlite3.connect(DB_PATH)
     cur = conn.cursor()
     # FIXED: Use timezone-aware datetime
     now = datetime.now(timezone.utc).isoformat()
     cur.execute(
-        "INSERT INTO uploads (filename, filepath, filetype, uploaded_at, source) VALUES (?,?,?,?,?)",
-        (filename, str(filepath), filetype, now, source)
+        "INSERT INTO uploads (filename, filepath, filetype, uploaded_at, source, content_hash) VALUES (?,?,?,?,?,?)",
+        (filename, str(filepath), filetype, now, source, content_hash)
     )
     uid = cur.lastrowid
     conn.commit()
@@ -83,13 +114,80 @@ def record_result(upload_id, summary_json_path, summaries, sentiment, follow_up)
     conn.commit()
     conn.close()
 
-def register_chunks(chunks):
+def find_result_by_hash(content_hash):
+    """
+    Latest processing result for previously seen content, or None.
+    Returns the saved output JSON when it is still on disk and was written for
+    this content (<content_hash>/<stem>_summary.json), otherwise what the DB row holds.
+    """
+    if not content_hash:
+        return None
     conn = sqlite3.connect(DB_PATH)
+    conn.row_factory = sqlite3.Row
     cur = conn.cursor()
+    cur.execute(
+        """SELECT u.filepath, r.* FROM processing_results r
+           JOIN uploads u ON u.id = r.upload_id
+           WHERE u.content_hash = ?
+           ORDER BY r.id DESC LIMIT 1""",
+        (content_hash,)
+    )
+    row = cur.fetchone()
+    conn.close()
+    if row is None:
+        return None
+
+    p = Path(row["summary_json_path"] or "")
+    # outputs written before they were keyed by hash are shared by every file with the same name
+    if p.parent.name == content_hash and p.is_file():
+        try:
+            return json.loads(p.read_text(encoding="utf-8"))
+        except Exception:
+            pass
+    return {
+        "file": row["filepath"],
+        "summaries": {
+            "one_line": row["one_line"],
+            "three_bullets": row["three_bullets"],
+            "five_sentence": row["five_sentence"],
+        },
+        "sentiment": {"label": row["sentiment_label"], "score": row["sentiment_score"]},
+        "follow_up_needed": bool(row["follow_up_needed"]),
+    }
+
+def register_chunks(chunks, replace_sources=True):
+    """
+    Record chunk offsets, keyed by (source file, index of the chunk within it):
+    word offsets in start_token / end_token, the file the offsets point into in
+    text_path, the character span (start / end) in metadata. With replace_sources,
+    older rows of the same source files are dropped first, so a re-ingested file
+    leaves no stale chunks.
+    """
+    conn = sqlite3.connect(DB_PATH)
+    cur = conn.cursor()
+    if replace_sources:
+        sources = {c.get("source") or "" for c in chunks}
+        cur.executemany("DELETE FROM retrieval_chunks WHERE source_file = ?", [(s,) for s in sources])
+    rows, counts = [], {}
+    if not replace_sources:
+        # append after the chunks already recorded for each source
+        for source in {c.get("source") or "" for c in chunks}:
+            cur.execute("SELECT MAX(chunk_index) FROM retrieval_chunks WHERE source_file = ?", (source,))
+            last = cur.fetchone()[0]
+            if last is not None:
+                counts[source] = last
     for c in chunks:
-        cur.execute(
-            "INSERT OR REPLACE INTO retrieval_chunks (id, source_file, start_token, end_token, metadata) VALUES (?,?,?,?,?)",
-            (c.get("id"), c.get("source"), c.get("start",0), c.get("end",0), json.dumps(c.get("metadata",{})))
-        )
+        source = c.get("source") or ""
+        index = counts[source] = counts.get(source, -1) + 1
+        meta = {**c.get("metadata", {}), "start": c.get("start", 0), "end": c.get("end", 0)}
+        if c.get("duplicates"):
+            meta["duplicates"] = c["duplicates"]
+        rows.append((source, index, c.get("id"), c.get("path"), c.get("start_token", 0), c.get("end_token", 0),
+                     json.dumps(meta)))
+    cur.executemany(
+        """INSERT OR REPLACE INTO retrieval_chunks
+           (source_file, chunk_index, id, text_path, start_token, end_token, metadata) VALUES (?,?,?,?,?,?,?)""",
+        rows
+    )
     conn.commit()
     conn.close()
\ No newline at end of file
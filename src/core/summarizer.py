@@ -1,7 +1,6 @@
 # src/core/summarizer.py
 import nltk
 import re
-from heapq import nlargest
 
 # --- CRITICAL FIX FOR RENDER DEPLOYMENT ---
 # Automatically download missing NLTK data if not present
@@ -30,61 +29,91 @@ except LookupError:
 from nltk.corpus import stopwords
 from nltk.tokenize import sent_tokenize, word_tokenize
 
+# summary field -> sentences, as produced by summarize_all
+SUMMARY_LENGTHS = {"one_line": 1, "three_bullets": 3, "five_sentence": 5}
+
+MAX_SCORED_WORDS = 30   # longer sentences are never picked
+
+_WORD = re.compile(r"\w+|[^\w\s]")
+
 class ExtractiveSummarizer:
+    """
+    Frequency-based extractive summaries. The text is tokenized and every
+    sentence scored once (rank); any number of summary lengths are then read
+    off that single ranking, each keeping its sentences in document order.
+    """
     def __init__(self):
         try:
             self.stop_words = set(stopwords.words('english'))
         except Exception:
             self.stop_words = set()
 
-    def summarize(self, text, num_sentences=5):
-        if not text:
-            return ""
-        
-        # Clean text
-        text = re.sub(r'\s+', ' ', text)
-        
+    @staticmethod
+    def _sentences(text):
         try:
-            sentences = sent_tokenize(text)
+            return sent_tokenize(text)
         except Exception as e:
             # Fallback if tokenizer fails
             print(f"Tokenizer error: {e}")
-            sentences = text.split('. ')
+            return text.split('. ')
 
-        if len(sentences) <= num_sentences:
-            return text
+    @staticmethod
+    def _words(sentence, fallback):
+        if not fallback:
+            try:
+                return word_tokenize(sentence), False
+            except LookupError:
+                pass
+        return _WORD.findall(sentence), True
 
-        word_frequencies = {}
-        for word in word_tokenize(text.lower()):
-            if word not in self.stop_words and word.isalnum():
-                if word not in word_frequencies:
-                    word_frequencies[word] = 1
-                else:
-                    word_frequencies[word] += 1
+    def rank(self, text):
+        """
+        (cleaned text, sentences, ranking): ranking lists the indexes of the
+        scorable sentences, best first (ties keep document order), or is None
+        when no word carries any weight.
+        """
+        text = re.sub(r'\s+', ' ', text)
+        sentences = self._sentences(text)
+
+        # one word_tokenize per sentence, shared by the frequencies and the scores
+        fallback, tokens = False, []
+        for sent in sentences:
+            words, fallback = self._words(sent.lower(), fallback)
+            tokens.append([w for w in words if w not in self.stop_words and w.isalnum()])
 
+        word_frequencies = {}
+        for words in tokens:
+            for word in words:
+                word_frequencies[word] = word_frequencies.get(word, 0) + 1
         if not word_frequencies:
-            return " ".join(sentences[:num_sentences])
+            return text, sentences, None
 
         max_frequency = max(word_frequencies.values())
-        for word in word_frequencies.keys():
-            word_frequencies[word] = (word_frequencies[word] / max_frequency)
+        scores = {}
+        for i, (sent, words) in enumerate(zip(sentences, tokens)):
+            if words and len(sent.split(' ')) < MAX_SCORED_WORDS:
+                scores[i] = sum(word_frequencies[w] for w in words) / max_frequency
+        ranking = sorted(scores, key=lambda i: -scores[i])
+        return text, sentences, ranking
 
-        sentence_scores = {}
-        for sent in sentences:
-            for word in word_tokenize(sent.lower()):
-                if word in word_frequencies:
-                    if len(sent.split(' ')) < 30:
-                        if sent not in sentence_scores:
-                            sentence_scores[sent] = word_frequencies[word]
-                        else:
-                            sentence_scores[sent] += word_frequencies[word]
+    def summarize_lengths(self, text, lengths):
+        """{n: summary of n sentences} for every n in lengths, from one tokenization and ranking."""
+        if not text:
+            return {n: "" for n in lengths}
+        text, sentences, ranking = self.rank(text)
+        out = {}
+        for n in lengths:
+            if len(sentences) <= n:
+                out[n] = text
+            elif ranking is None:
+                out[n] = " ".join(sentences[:n])
+            else:
+                out[n] = " ".join(sentences[i] for i in sorted(ranking[:n]))
+        return out
 
-        summary_sentences = nlargest(num_sentences, sentence_scores, key=sentence_scores.get)
-        return ' '.join(summary_sentences)
+    def summarize(self, text, num_sentences=5):
+        return self.summarize_lengths(text, [num_sentences])[num_sentences]
 
     def summarize_all(self, text):
-        return {
-            "one_line": self.summarize(text, 1),
-            "three_bullets": self.summarize(text, 3),
-            "five_sentence": self.summarize(text, 5)
-        }
\ No newline at end of file
+        by_length = self.summarize_lengths(text, sorted(set(SUMMARY_LENGTHS.values())))
+        return {name: by_length[n] for name, n in SUMMARY_LENGTHS.items()}
@@ -174,26 +174,17 @@ def clean_text(text: str) -> str:
     return text.strip()
 
 def chunk_text(text: str, max_tokens: int = 500, overlap: int = 50) -> List[str]:
-    if not text:
-        return []
-    approx_chunk_size = max_tokens * 4
-    chunks = []
-    start = 0
-    L = len(text)
-    while start < L:
-        end = min(L, start + approx_chunk_size)
-        chunk = text[start:end].strip()
-        if chunk:
-            chunks.append(chunk)
-        start = end - overlap * 4
-        if start < 0:
-            start = 0
-        if start >= L:
-            break
-    return chunks
-
-def save_output_json(obj: dict, out_dir: str = "demo/outputs") -> Path:
-    outp = Path(out_dir)
+    """Sentence-aware chunks of at most max_tokens words (see core.chunking)."""
+    from .chunking import chunk_spans
+    return [text[s:e] for s, e, _, _ in chunk_spans(text, max_tokens, overlap)]
+
+def save_output_json(obj: dict, out_dir: str = "demo/outputs", content_hash: str = None) -> Path:
+    """
+    Write obj as <out_dir>/<stem>_summary.json, or under <out_dir>/<content_hash>/
+    when the content hash is known, so different files with the same name do not
+    overwrite each other's output.
+    """
+    outp = Path(out_dir) / content_hash if content_hash else Path(out_dir)
     outp.mkdir(parents=True, exist_ok=True)
     fname = obj.get("file", "output").replace("/", "_").replace("\\", "_")
     dest = outp / f"{Path(fname).stem}_summary.json"
@@ -0,0 +1,112 @@
+# src/scripts/bench_ann.py
+"""
+Recall / latency / memory benchmark for the FAISS index types in core/ann.py.
+
+Loads the saved embeddings (data/index/embeddings.npy, or Data/index/...),
+uses a sample of them, slightly perturbed, as queries, and for every setting
+in the grid reports build time, index size, recall@k against the exact flat
+index, and p50 / p99 single-query latency.
+
+    python scripts/bench_ann.py --k 10 --queries 200
+    python scripts/bench_ann.py --embeddings big.npy --json ann.json
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+import faiss
+
+from core.ann import build_index, set_search_params, index_bytes, default_nlist
+
+CANDIDATES = [Path("data/index/embeddings.npy"), Path("Data/index/embeddings.npy")]
+
+
+def load_embeddings(path: Path = None) -> np.ndarray:
+    for p in ([path] if path else CANDIDATES):
+        if p and p.exists():
+            emb = np.ascontiguousarray(np.load(p), dtype="float32")
+            faiss.normalize_L2(emb)
+            return emb
+    raise SystemExit("No embeddings found; build a FAISS index first (scripts/build_index.py).")
+
+
+def make_queries(emb: np.ndarray, n: int, noise: float = 0.05, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    q = emb[rng.integers(0, len(emb), n)] + noise * rng.standard_normal((n, emb.shape[1])).astype("float32")
+    q = np.ascontiguousarray(q, dtype="float32")
+    faiss.normalize_L2(q)
+    return q
+
+
+def default_grid(n: int) -> list:
+    nlist = default_nlist(n)
+    grid = [{"kind": "flat"}, {"kind": "fp16"}, {"kind": "sq8"}, {"kind": "pq"}]
+    for nprobe in sorted({1, max(1, nlist // 8), max(1, nlist // 2)}):
+        grid.append({"kind": "ivf", "nlist": nlist, "nprobe": nprobe})
+        grid.append({"kind": "ivfpq", "nlist": nlist, "nprobe": nprobe})
+    for ef in (16, 64, 256):
+        grid.append({"kind": "hnsw", "hnsw_m": 32, "ef_search": ef})
+    return grid
+
+
+def run(emb: np.ndarray, queries: np.ndarray, k: int, grid: list) -> list:
+    exact = faiss.IndexFlatIP(emb.shape[1])
+    exact.add(emb)
+    _, truth = exact.search(queries, k)
+
+    rows = []
+    for params in grid:
+        t0 = time.perf_counter()
+        index = build_index(emb, **params)
+        build_s = time.perf_counter() - t0
+        set_search_params(index, **params)
+
+        _, found = index.search(queries, k)
+        recall = np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)])
+
+        lat = []
+        for q in queries:
+            t0 = time.perf_counter()
+            index.search(q[None, :], k)
+            lat.append(time.perf_counter() - t0)
+        lat = np.array(lat) * 1000
+        rows.append({
+            **params,
+            "recall_at_k": round(float(recall), 4),
+            "p50_ms": round(float(np.percentile(lat, 50)), 4),
+            "p99_ms": round(float(np.percentile(lat, 99)), 4),
+            "build_s": round(build_s, 3),
+            "index_mb": round(index_bytes(index) / 2**20, 3),
+        })
+    return rows
+
+
+def print_table(rows: list, k: int):
+    print(f"{'index':<44} {'recall@' + str(k):>9} {'p50 ms':>8} {'p99 ms':>8} {'build s':>8} {'MB':>8}")
+    for r in rows:
+        name = ", ".join(f"{key}={v}" for key, v in r.items() if key in ("kind", "nlist", "nprobe", "hnsw_m", "ef_search"))
+        print(f"{name:<44} {r['recall_at_k']:>9.3f} {r['p50_ms']:>8.3f} {r['p99_ms']:>8.3f} {r['build_s']:>8.2f} {r['index_mb']:>8.2f}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark FAISS ANN index settings against the flat index.")
+    ap.add_argument("--embeddings", type=Path, help="embeddings .npy (default: data/index or Data/index)")
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--json", type=Path, help="also write the results here")
+    args = ap.parse_args()
+
+    emb = load_embeddings(args.embeddings)
+    queries = make_queries(emb, args.queries)
+    k = min(args.k, len(emb))
+    print(f"{len(emb)} vectors x {emb.shape[1]} dims, {len(queries)} queries, k={k}")
+    rows = run(emb, queries, k, default_grid(len(emb)))
+    print_table(rows, k)
+    if args.json:
+        args.json.write_text(json.dumps({"n": len(emb), "dim": emb.shape[1], "k": k, "results": rows}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,365 @@
+# src/scripts/bench_retrieval.py
+"""
+Retrieval benchmark and regression gate over the bundled corpus.
+
+Chunks Data/text and Data/pdfs (PDFs that already have a text version are
+skipped) from the text the index is built from: a .txt file's raw content,
+as the API reads it, or a PDF's cleaned extracted text, as
+scripts/build_index.py stores it. Then builds every requested backend over
+them and replays a query set at a configurable concurrency. Per backend it reports:
+ - build time, on-disk index size and peak RSS
+ - QPS and p50 / p95 / p99 query latency
+ - recall@k and MRR against labeled pairs (bench_queries.json, matched by
+   source file) and against generated known-item queries (a run of words taken
+   from a chunk, which should bring back that chunk; these favour lexical
+   backends, the labeled set does not)
+
+Every backend is built and queried in a fresh process, so peak RSS is its own.
+Sharded runs keep the index in worker processes whose peaks cannot be summed
+after the fact: their peak_rss_mb is left unmeasured (null) and the largest
+shard worker's peak is reported as max_shard_rss_mb instead.
+Backend specs are tfidf | hashed | bm25 | faiss | hybrid, "faiss:<ann kind>" for an ANN
+index (see core/ann.py) and "<spec>@<n>" for n shards (see core/shards.py).
+
+Run from the repository root, with src/ on the import path:
+
+    PYTHONPATH=src python src/scripts/bench_retrieval.py --json bench.json
+    PYTHONPATH=src python src/scripts/bench_retrieval.py --backends bm25,faiss:hnsw,bm25@4 --concurrency 8
+    PYTHONPATH=src python src/scripts/bench_retrieval.py --json new.json --compare bench.json   (exit 1 on regression)
+    PYTHONPATH=src python src/scripts/bench_retrieval.py --current new.json --compare bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import multiprocessing as mp
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+from core.utils import clean_text
+from core.dedup import dedup_chunks
+from core.chunking import chunk_document, source_text
+
+DATA_ROOTS = [Path("Data"), Path("../Data"), Path("data")]
+LABELED_QUERIES = Path(__file__).with_name("bench_queries.json")
+DEFAULT_BACKENDS = "tfidf,hashed,bm25,faiss,faiss:hnsw,hybrid"
+
+# metric: (which direction is better, allowed slack, slack is relative?)
+REGRESSION_RULES = {
+    "qps": ("higher", 0.15, True),
+    "p50_ms": ("lower", 0.20, True),
+    "p95_ms": ("lower", 0.20, True),
+    "p99_ms": ("lower", 0.30, True),
+    "build_s": ("lower", 0.30, True),
+    "index_mb": ("lower", 0.10, True),
+    "peak_rss_mb": ("lower", 0.15, True),
+    "labeled_recall": ("higher", 0.01, False),
+    "labeled_mrr": ("higher", 0.01, False),
+    "generated_recall": ("higher", 0.01, False),
+    "generated_mrr": ("higher", 0.01, False),
+}
+
+
+# --- CORPUS ---
+def find_data_root(path: Path = None) -> Path:
+    for p in ([path] if path else DATA_ROOTS):
+        if p and (p / "text").exists():
+            return p
+    raise SystemExit("No corpus found; pass --data pointing at a folder with text/ (and pdfs/).")
+
+
+def load_corpus(root: Path) -> list:
+    docs = []
+    text_files = sorted((root / "text").glob("*.txt"))
+    for p in text_files:
+        docs.append({"name": p.name, "text": source_text(p)})
+    have_text = {p.stem for p in text_files}
+    for p in sorted((root / "pdfs").glob("*.pdf")) if (root / "pdfs").exists() else []:
+        if p.stem in have_text:
+            continue
+        try:
+            from pdfminer.high_level import extract_text
+            docs.append({"name": p.name, "text": clean_text(extract_text(str(p)))})
+        except Exception as e:
+            print(f"[WARN] PDF text extraction failed for {p.name}: {e}")
+    return docs
+
+
+def chunk_docs(docs: list) -> list:
+    # same chunker and CHUNK_* settings as the API
+    chunks = []
+    for d in docs:
+        chunks.extend(chunk_document(d["text"], d["name"], d["name"]))
+    return chunks
+
+
+# --- QUERIES ---
+def load_labeled(path: Path) -> list:
+    if not path or not path.exists():
+        return []
+    return [{"query": q["query"], "sources": q["sources"], "kind": "labeled"} for q in json.loads(path.read_text(encoding="utf-8"))]
+
+
+def generate_queries(chunks: list, n: int, words: int = 8, seed: int = 0) -> list:
+    """Known-item queries: a random run of `words` words from a random chunk."""
+    rng = random.Random(seed)
+    candidates = [c for c in chunks if len(c["text"].split()) >= 2 * words]
+    queries = []
+    for c in rng.sample(candidates, min(n, len(candidates))):
+        tokens = re.findall(r"\w+", c["text"])
+        if len(tokens) < words:
+            continue
+        start = rng.randrange(0, len(tokens) - words + 1)
+        queries.append({"query": " ".join(tokens[start:start + words]), "ids": [c["id"]], "kind": "generated"})
+    return queries
+
+
+def judge(query: dict, hits: list, k: int):
+    """(recall@k, reciprocal rank) of one ranked hit list."""
+    if "ids" in query:
+        # a deduplicated hit also answers for the chunks it replaced
+        wanted = set(query["ids"])
+        keys = [next((x for x in [h.get("id")] + [d["id"] for d in h.get("duplicates", ())] if x in wanted), h.get("id"))
+                for h in hits[:k]]
+    else:
+        wanted, keys = set(query["sources"]), [Path(str(h.get("source"))).name for h in hits[:k]]
+    found = wanted & set(keys)
+    rr = next((1.0 / rank for rank, key in enumerate(keys, 1) if key in wanted), 0.0)
+    return len(found) / len(wanted), rr
+
+
+# --- ONE BACKEND (runs in its own process) ---
+def parse_spec(spec: str):
+    spec, _, shards = spec.partition("@")
+    backend, _, kind = spec.partition(":")
+    return backend, kind or None, int(shards or 1)
+
+
+def build(chunks: list, spec: str):
+    from core.retrieval import Retriever
+    from core.hybrid import build_local
+    from core.ann import index_params_from_env
+
+    backend, kind, shards = parse_spec(spec)
+    if shards > 1:
+        if kind:
+            os.environ["ANN_INDEX"] = kind   # read by each shard's Retriever
+        from core.shards import ShardedRetriever
+        return ShardedRetriever.build(chunks, shards, backend)
+    if backend == "faiss":
+        r = Retriever(chunks, backend="faiss", index_params={**index_params_from_env(), "kind": kind or "flat"})
+        if not r.use_faiss:
+            raise RuntimeError("dense retrieval unavailable (faiss / sentence-transformers missing)")
+        return r
+    return build_local(chunks, backend)
+
+
+def dir_bytes(path: Path) -> int:
+    return sum(p.stat().st_size for p in Path(path).rglob("*") if p.is_file())
+
+
+def percentile_ms(lat: list, q: float) -> float:
+    return round(float(np.percentile(lat, q)) * 1000, 3) if lat else 0.0
+
+
+def run_backend(spec: str, chunks: list, queries: list, k: int, concurrency: int, rounds: int) -> dict:
+    t0 = time.perf_counter()
+    retriever = build(chunks, spec)
+    build_s = time.perf_counter() - t0
+    notes = []
+    if getattr(retriever, "backend", None) == "hybrid" and getattr(retriever, "dense", True) is None:
+        notes.append("dense leg unavailable, lexical only")
+
+    try:
+        # warm-up: first-touch costs (lazy imports, page faults on mmaps) are not steady state
+        for q in queries[:min(10, len(queries))]:
+            retriever.retrieve(q["query"], k)
+
+        def timed(q):
+            start = time.perf_counter()
+            hits = retriever.retrieve(q["query"], k)
+            return time.perf_counter() - start, hits
+
+        latencies, judged = [], {}
+        wall = 0.0
+        for _ in range(rounds):
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                start = time.perf_counter()
+                answers = list(pool.map(timed, queries))
+                wall += time.perf_counter() - start
+            latencies.extend(lat for lat, _ in answers)
+            for i, (_, hits) in enumerate(answers):
+                judged[i] = judge(queries[i], hits, k)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            retriever.save(Path(tmp))
+            size = dir_bytes(Path(tmp))
+    finally:
+        if hasattr(retriever, "close"):
+            retriever.close()
+
+    peak_rss_mb = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    if parse_spec(spec)[2] > 1:
+        # the shard workers have been joined by close(), so RUSAGE_CHILDREN holds the largest of them
+        notes.append("peak RSS not measured: the index lives in shard worker processes")
+        peak_rss_mb = None
+    row = {
+        "build_s": round(build_s, 3),
+        "index_mb": round(size / 2**20, 3),
+        "peak_rss_mb": peak_rss_mb,
+        "qps": round(len(latencies) / wall, 2) if wall else 0.0,
+        "p50_ms": percentile_ms(latencies, 50),
+        "p95_ms": percentile_ms(latencies, 95),
+        "p99_ms": percentile_ms(latencies, 99),
+    }
+    if peak_rss_mb is None:
+        row["max_shard_rss_mb"] = round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1)
+    for kind in ("labeled", "generated"):
+        scores = [judged[i] for i, q in enumerate(queries) if q["kind"] == kind]
+        if scores:
+            row[f"{kind}_recall"] = round(float(np.mean([s[0] for s in scores])), 4)
+            row[f"{kind}_mrr"] = round(float(np.mean([s[1] for s in scores])), 4)
+            row[f"{kind}_queries"] = len(scores)
+    if notes:
+        row["notes"] = notes
+    return row
+
+
+def run_isolated(spec: str, *args) -> dict:
+    with ProcessPoolExecutor(max_workers=1, mp_context=mp.get_context("spawn")) as pool:
+        try:
+            return pool.submit(run_backend, spec, *args).result()
+        except Exception as e:
+            return {"skipped": f"{type(e).__name__}: {e}"}
+
+
+# --- REPORTING ---
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def print_table(results: dict, k: int):
+    print(f"{'backend':<16} {'build s':>8} {'MB':>8} {'RSS MB':>8} {'QPS':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'R@' + str(k) + ' lab':>8} {'MRR lab':>8} {'R@' + str(k) + ' gen':>8} {'MRR gen':>8}")
+    for spec, r in results.items():
+        if "skipped" in r:
+            print(f"{spec:<16} skipped: {r['skipped']}")
+            continue
+        rss = f"{r['peak_rss_mb']:>8.1f}" if r.get("peak_rss_mb") is not None else f"{'n/a':>8}"
+        print(f"{spec:<16} {r['build_s']:>8.2f} {r['index_mb']:>8.2f} {rss} {r['qps']:>9.1f} "
+              f"{r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f} "
+              f"{r.get('labeled_recall', 0):>8.3f} {r.get('labeled_mrr', 0):>8.3f} "
+              f"{r.get('generated_recall', 0):>8.3f} {r.get('generated_mrr', 0):>8.3f}")
+        for note in r.get("notes", []):
+            print(f"{'':<16} note: {note}")
+
+
+def compare(baseline: dict, current: dict) -> list:
+    """
+    Metric changes of `current` against `baseline`, flagging those outside
+    REGRESSION_RULES. A backend measured in the baseline but skipped now (it
+    failed to build or query) is a regression too.
+    """
+    rows = []
+    for spec, new in current.get("results", {}).items():
+        old = baseline.get("results", {}).get(spec)
+        if not old or "skipped" in old:
+            continue
+        if "skipped" in new:
+            rows.append({"backend": spec, "metric": "status", "baseline": "measured", "current": "skipped",
+                         "change": None, "regressed": True})
+            continue
+        for metric, (better, slack, relative) in REGRESSION_RULES.items():
+            if old.get(metric) is None or new.get(metric) is None:
+                continue
+            a, b = old[metric], new[metric]
+            allowed = abs(a) * slack if relative else slack
+            worse = (a - b) if better == "higher" else (b - a)
+            rows.append({"backend": spec, "metric": metric, "baseline": a, "current": b,
+                         "change": round((b - a) / a, 4) if a else None, "regressed": worse > allowed})
+    return rows
+
+
+def print_comparison(rows: list, baseline: dict, current: dict):
+    print(f"\nvs baseline {baseline.get('meta', {}).get('commit')} -> {current.get('meta', {}).get('commit')}")
+    for r in rows:
+        change = f"{r['change']:+.1%}" if r["change"] is not None else "n/a"
+        flag = "  REGRESSION" if r["regressed"] else ""
+        print(f"  {r['backend']:<16} {r['metric']:<18} {r['baseline']:>10} -> {r['current']:>10} {change:>8}{flag}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark retrieval backends over the bundled corpus.")
+    ap.add_argument("--data", type=Path, help="corpus folder with text/ and pdfs/ (default: Data or data)")
+    ap.add_argument("--backends", default=DEFAULT_BACKENDS, help=f"comma-separated specs (default: {DEFAULT_BACKENDS})")
+    ap.add_argument("--queries", type=Path, default=LABELED_QUERIES, help="labeled query set (JSON)")
+    ap.add_argument("--generated", type=int, default=200, help="generated known-item queries")
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--concurrency", type=int, default=1, help="queries in flight at once")
+    ap.add_argument("--rounds", type=int, default=1, help="times the query set is replayed")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--dedup", type=float, metavar="THRESHOLD", help="drop near-duplicate chunks first (see core/dedup.py)")
+    ap.add_argument("--json", type=Path, help="write the results here")
+    ap.add_argument("--compare", type=Path, help="baseline JSON; exit 1 if any metric regressed")
+    ap.add_argument("--current", type=Path, help="compare this results JSON instead of running the benchmark")
+    args = ap.parse_args()
+
+    if args.current:
+        current = json.loads(args.current.read_text(encoding="utf-8"))
+    else:
+        root = find_data_root(args.data)
+        chunks = chunk_docs(load_corpus(root))
+        queries = load_labeled(args.queries) + generate_queries(chunks, args.generated, seed=args.seed)
+        if args.dedup:
+            # queries come from the full chunk set, so dropped chunks still count through their representative
+            total = len(chunks)
+            chunks = dedup_chunks(chunks, args.dedup)
+            print(f"dedup: {total} -> {len(chunks)} chunks")
+        print(f"{len(chunks)} chunks from {root}, {len(queries)} queries, k={args.k}, concurrency={args.concurrency}")
+
+        results = {}
+        for spec in [s.strip() for s in args.backends.split(",") if s.strip()]:
+            print(f"   ... {spec}", flush=True)
+            results[spec] = run_isolated(spec, chunks, queries, args.k, args.concurrency, args.rounds)
+        current = {
+            "meta": {
+                "commit": git_commit(),
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "python": platform.python_version(),
+                "cpus": os.cpu_count(),
+                "chunks": len(chunks),
+                "queries": len(queries),
+                "k": args.k,
+                "dedup": args.dedup,
+                "concurrency": args.concurrency,
+                "rounds": args.rounds,
+            },
+            "results": results,
+        }
+        print_table(results, args.k)
+        if args.json:
+            args.json.write_text(json.dumps(current, indent=2), encoding="utf-8")
+
+    if args.compare:
+        baseline = json.loads(args.compare.read_text(encoding="utf-8"))
+        rows = compare(baseline, current)
+        print_comparison(rows, baseline, current)
+        if any(r["regressed"] for r in rows):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
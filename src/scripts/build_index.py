@@ -1,14 +1,32 @@
 # src/scripts/build_index.py
 """
 Build retrieval index from text files in data/.
-Produces:
- - data/index/index_meta.json
+Writes a new snapshot, data/index/snapshots/<version>/, with:
+ - chunks/ (memory-mapped chunk store, see core/chunk_store.py)
+ - data/index/index_manifest.json (source fingerprint, lets the API skip rebuilds)
  - (TF-IDF) pickled vectorizer and matrix, OR
+ - (hashed, --sparse hashed) CSR .npy arrays + hashed_stats.npz, streamed in batches, OR
  - (FAISS) saved faiss index + embeddings if sentence-transformers available
+and then publishes it in data/index/snapshots.json; a running API picks it up
+through its snapshot watcher (or POST /admin/reload) without a restart.
+
+The FAISS index type is flat (exact) by default; pick an ANN index with e.g.
+    python scripts/build_index.py --index hnsw --hnsw-m 32
+    python scripts/build_index.py --index ivfpq --nlist 256 --pq-m 48
+    python scripts/build_index.py --index sq8 --store-dtype float16   (then serve with ANN_RESCORE=50)
+(see core/ann.py; nprobe / efSearch are applied at load time from ANN_* env).
 """
-import json
+import argparse
+import os
+import shutil
 from pathlib import Path
-from core.utils import chunk_text, clean_text
+from core.utils import clean_text
+from core.chunking import canonical_text, chunk_document
+from core.dedup import dedup_if_enabled
+from core.chunk_store import write_chunk_store
+from core.hashing import HashedIndexWriter
+from core.index_store import write_manifest
+from core.snapshots import new_version, snapshot_dir, publish_snapshot, gc_snapshots
 import pickle
 import numpy as np
 
@@ -18,28 +36,30 @@ DATA_PDFS = ROOT / "data" / "pdfs"
 OUT = ROOT / "data" / "index"
 OUT.mkdir(parents=True, exist_ok=True)
 
-def load_text_files():
+def load_text_files(text_dir: Path):
+    """
+    One doc per file with the text its chunks are cut from (see core/chunking.py):
+    a .txt file's raw content, or a PDF's extracted text saved under text_dir.
+    """
     docs = []
     # text folder
     for p in sorted(DATA_TEXT.glob("*.txt")):
-        txt = p.read_text(encoding="utf-8")
-        docs.append({"id": str(p.name), "text": clean_text(txt), "source": str(p)})
+        txt, path = canonical_text(p)
+        docs.append({"id": str(p.name), "text": txt, "source": str(p.resolve()), "path": str(path.resolve())})
     # try extracting simple text from PDFs using pdfminer
     from pdfminer.high_level import extract_text
     for p in sorted(DATA_PDFS.glob("*.pdf")):
         try:
-            txt = extract_text(str(p))
-            docs.append({"id": str(p.name), "text": clean_text(txt), "source": str(p)})
+            txt, path = canonical_text(p, clean_text(extract_text(str(p))), sidecar=text_dir / f"{p.name}.txt")
+            docs.append({"id": str(p.name), "text": txt, "source": str(p.resolve()), "path": str(path.resolve())})
         except Exception as e:
             print("pdf text extract failed for", p, e)
     return docs
 
-def chunk_docs(docs, chunk_size=500, overlap=100):
+def chunk_docs(docs, max_tokens=None, overlap_tokens=None):
     chunks = []
     for d in docs:
-        pieces = chunk_text(d["text"], chunk_size=chunk_size, overlap=overlap)
-        for i, piece in enumerate(pieces):
-            chunks.append({"id": f"{d['id']}_chunk{i}", "text": piece, "source": d["source"]})
+        chunks.extend(chunk_document(d["text"], d["id"], d["source"], max_tokens, overlap_tokens, path=d["path"]))
     return chunks
 
 def build_tfidf_index(chunks, outdir: Path):
@@ -50,42 +70,88 @@ def build_tfidf_index(chunks, outdir: Path):
     # save
     pickle.dump(vec, open(outdir / "tfidf_vectorizer.pkl", "wb"))
     pickle.dump(mat, open(outdir / "tfidf_matrix.pkl", "wb"))
-    open(outdir / "chunks_meta.json", "w", encoding="utf-8").write(json.dumps(chunks, indent=2))
+    write_chunk_store(outdir, chunks)
     print("Saved TF-IDF index in", outdir)
 
-def try_build_faiss(chunks, outdir: Path):
+def build_hashed_index(chunks, outdir: Path):
+    # vectorized batch by batch (HASH_BATCH) and spooled to disk: no vocabulary, no refit
+    writer = HashedIndexWriter(outdir)
+    writer.add(c["text"] for c in chunks)
+    writer.close()
+    write_chunk_store(outdir, chunks)
+    print("Saved hashed sparse index in", outdir)
+
+def try_build_faiss(chunks, outdir: Path, index_params: dict = None):
     try:
         from sentence_transformers import SentenceTransformer
         import faiss
     except Exception as e:
         print("FAISS or sentence-transformers not available:", e)
         return False
+    from core.embeddings import embed_texts, EMBED_MODEL_NAME
+    from core.embed_cache import default_cache
     texts = [c["text"] for c in chunks]
-    model = SentenceTransformer("all-MiniLM-L6-v2")
-    emb = np.vstack([model.encode(t) for t in texts]).astype("float32")
-    # build flat index
-    dim = emb.shape[1]
-    index = faiss.IndexFlatIP(dim)
-    faiss.normalize_L2(emb)
-    index.add(emb)
+    model = SentenceTransformer(EMBED_MODEL_NAME)
+    # batched (EMBED_BATCH_SIZE / EMBED_WORKERS), written straight into embeddings.npy;
+    # chunks embedded by an earlier build come from the cache (EMBED_CACHE)
+    dim = model.get_sentence_embedding_dimension()
+    emb = np.lib.format.open_memmap(outdir / "embeddings.npy", mode="w+", dtype=np.float32, shape=(len(texts), dim))
+    embed_texts(texts, model=model, out=emb, normalize=True, cache=default_cache())
+    emb.flush()
+    from core.ann import build_index
+    index = build_index(emb, **(index_params or {"kind": "flat"}))
     faiss.write_index(index, str(outdir / "faiss.index"))
-    np.save(outdir / "embeddings.npy", emb)
-    open(outdir / "chunks_meta.json", "w", encoding="utf-8").write(json.dumps(chunks, indent=2))
+    store_dtype = (index_params or {}).get("store_dtype", "float32")
+    if store_dtype != "float32":
+        tmp = outdir / "embeddings.npy.tmp"
+        with open(tmp, "wb") as fh:
+            np.save(fh, emb.astype(store_dtype))
+        del emb
+        os.replace(tmp, outdir / "embeddings.npy")
+    write_chunk_store(outdir, chunks)
     print("Saved FAISS index in", outdir)
     return True
 
+def parse_args(argv=None):
+    from core.ann import INDEX_KINDS, STORE_DTYPES, index_params_from_env
+    env = index_params_from_env()
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--index", choices=INDEX_KINDS, default=env["kind"], help="FAISS index type")
+    ap.add_argument("--nlist", type=int, default=env.get("nlist"), help="IVF cells")
+    ap.add_argument("--pq-m", type=int, default=env.get("pq_m"), help="PQ sub-quantizers (IVF-PQ)")
+    ap.add_argument("--hnsw-m", type=int, default=env.get("hnsw_m"), help="links per node (HNSW)")
+    ap.add_argument("--store-dtype", choices=STORE_DTYPES, default=env["store_dtype"], help="dtype of embeddings.npy")
+    ap.add_argument("--sparse", choices=("tfidf", "hashed"), default="tfidf", help="sparse index when FAISS is unavailable")
+    return ap.parse_args(argv)
+
 def main():
-    docs = load_text_files()
+    args = parse_args()
+    index_params = {"kind": args.index, "nlist": args.nlist, "pq_m": args.pq_m, "hnsw_m": args.hnsw_m,
+                    "store_dtype": args.store_dtype}
+    index_params = {k: v for k, v in index_params.items() if v is not None}
+    version = new_version()
+    out = snapshot_dir(OUT, version)
+    out.mkdir(parents=True)
+    # extracted PDF text lives with the snapshot whose chunks point into it
+    docs = load_text_files(out / "texts")
     if not docs:
+        shutil.rmtree(out, ignore_errors=True)
         print("No documents found in data/text or data/pdfs. Run the data downloader first.")
         return
     chunks = chunk_docs(docs)
-    print(f"Created {len(chunks)} chunks.")
+    total = len(chunks)
+    chunks = dedup_if_enabled(chunks)
+    print(f"Created {len(chunks)} chunks ({total - len(chunks)} near-duplicates dropped).")
     # try FAISS first
-    ok = try_build_faiss(chunks, OUT)
+    ok = try_build_faiss(chunks, out, index_params)
     if not ok:
-        build_tfidf_index(chunks, OUT)
-    print("Index build complete.")
+        (build_hashed_index if args.sparse == "hashed" else build_tfidf_index)(chunks, out)
+    built = "faiss" if ok else args.sparse
+    write_manifest(out, backend=built, source_dirs=[DATA_TEXT, DATA_PDFS], num_chunks=len(chunks),
+                   index_params=index_params if ok else None)
+    publish_snapshot(OUT, version, backend=built, num_chunks=len(chunks))
+    removed = gc_snapshots(OUT)
+    print(f"Index build complete: snapshot {version}" + (f" ({len(removed)} old snapshots removed)." if removed else "."))
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
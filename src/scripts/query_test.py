@@ -1,20 +1,29 @@
 # src/scripts/query_test.py
 
-import json
 from pathlib import Path
 import numpy as np
 
-INDEX_DIR = Path("data/index")
-CHUNKS_META = INDEX_DIR / "chunks_meta.json"
-FAISS_INDEX = INDEX_DIR / "faiss.index"
-EMBEDDINGS = INDEX_DIR / "embeddings.npy"
+INDEX_ROOT = Path("data/index")
+FAISS_INDEX = "faiss.index"
 
 
-def load_chunks():
-    return json.load(open(CHUNKS_META, encoding="utf-8"))
+def current_index_dir():
+    """The snapshot directory the API serves (see core.snapshots), not the data/index root."""
+    # core imports stay inside functions so pytest can collect this *_test.py file without src/ on sys.path
+    from core.snapshots import current_snapshot
+    _, path = current_snapshot(INDEX_ROOT)
+    if path is None:
+        raise SystemExit(f"No index under {INDEX_ROOT}; run scripts/build_index.py first.")
+    return path
 
 
-def query_faiss(query_text, topk=5):
+def load_chunks(index_dir):
+    from core.chunk_store import ChunkStore
+    # memory-mapped; only the chunks that are printed get decoded
+    return ChunkStore.open(index_dir)
+
+
+def query_faiss(query_text, index_dir, topk=5):
     """
     Query FAISS index if available.
     """
@@ -25,8 +34,8 @@ def query_faiss(query_text, topk=5):
     model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
 
     # Load index & embeddings
-    index = faiss.read_index(str(FAISS_INDEX))
-    chunk_meta = load_chunks()
+    index = faiss.read_index(str(index_dir / FAISS_INDEX))
+    chunk_meta = load_chunks(index_dir)
 
     # Encode query
     q_emb = model.encode([query_text]).astype("float32")
@@ -43,16 +52,16 @@ def query_faiss(query_text, topk=5):
         )
 
 
-def query_tfidf(query_text, topk=5):
+def query_tfidf(query_text, index_dir, topk=5):
     """
     Fallback if FAISS index does not exist.
     """
     import pickle
     from sklearn.metrics.pairwise import cosine_similarity
 
-    vectorizer = pickle.load(open(INDEX_DIR / "tfidf_vectorizer.pkl", "rb"))
-    matrix = pickle.load(open(INDEX_DIR / "tfidf_matrix.pkl", "rb"))
-    chunks = load_chunks()
+    vectorizer = pickle.load(open(index_dir / "tfidf_vectorizer.pkl", "rb"))
+    matrix = pickle.load(open(index_dir / "tfidf_matrix.pkl", "rb"))
+    chunks = load_chunks(index_dir)
 
     q_vec = vectorizer.transform([query_text])
     sims = cosine_similarity(q_vec, matrix)[0]
@@ -73,7 +82,8 @@ if __name__ == "__main__":
 
     print(f"\nRunning query: {query}\n")
 
-    if FAISS_INDEX.exists():
-        query_faiss(query)
+    index_dir = current_index_dir()
+    if (index_dir / FAISS_INDEX).exists():
+        query_faiss(query, index_dir)
     else:
-        query_tfidf(query)
\ No newline at end of file
+        query_tfidf(query, index_dir)
\ No newline at end of file
@@ -0,0 +1,6 @@
+# tests/conftest.py
+import os
+import sys
+
+# make the packages under src/ (core, api, scripts) importable from every test module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
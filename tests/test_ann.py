@@ -0,0 +1,120 @@
+import numpy as np
+import pytest
+
+faiss = pytest.importorskip("faiss")
+from core.ann import build_index, set_search_params, index_kind, rescore
+
+def _data(n=2000, dim=32, seed=0):
+    x = np.random.default_rng(seed).standard_normal((n, dim)).astype("float32")
+    faiss.normalize_L2(x)
+    return x
+
+@pytest.mark.parametrize("kind", ["flat", "fp16", "sq8", "pq", "ivf", "ivfpq", "hnsw"])
+def test_build_index_kinds(kind):
+    x = _data()
+    index = build_index(x, kind=kind, nlist=16, nprobe=4)
+    assert index_kind(index) == kind and index.ntotal == len(x)
+    _, ids = index.search(x[:5], 1)
+    if kind not in ("pq", "ivfpq"):
+        assert ids[:, 0].tolist() == list(range(5))
+
+def test_ivf_with_all_cells_probed_is_exact():
+    x = _data()
+    exact = build_index(x)
+    ivf = set_search_params(build_index(x, kind="ivf", nlist=16), nprobe=16)
+    q = _data(20, seed=1)
+    assert (exact.search(q, 10)[1] == ivf.search(q, 10)[1]).all()
+
+def test_rescore_restores_exact_ranking_for_compressed_index():
+    x = _data()
+    q = _data(20, seed=1)
+    exact = build_index(x).search(q, 10)[1]
+    pq = build_index(x, kind="pq", pq_m=8)
+    recall = lambda I: np.mean([len(set(a) & set(b)) / 10 for a, b in zip(I, exact)])
+    _, candidates = pq.search(q, 400)
+    _, I = rescore(q, candidates, x.astype("float16"), 10)
+    assert recall(I) > max(0.95, recall(pq.search(q, 10)[1]))
+
+def test_stored_embeddings_are_memory_mapped_before_save():
+    from core.retrieval import Retriever
+    r = Retriever([{"id": "a", "text": "Sea level rise.", "source": "a.txt"}], index_params={"store_dtype": "float16"})
+    x = _data(50)
+    stored = r._stored(x)
+    assert isinstance(stored, np.memmap) and stored.dtype == np.float16
+    _, I = rescore(x[:5], np.tile(np.arange(50), (5, 1)), stored, 1)
+    assert (I[:, 0] == np.arange(5)).all()
+
+class _WordModel:
+    """Stand-in sentence encoder: hashed bag of words, enough to exercise the FAISS code paths."""
+    dim = 64
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+    def encode(self, texts, **kwargs):
+        import zlib
+        out = np.zeros((len(texts), self.dim), dtype="float32")
+        for i, t in enumerate(texts):
+            for w in t.lower().split():
+                out[i, zlib.crc32(w.strip(".,").encode()) % self.dim] += 1
+        return out + 1e-3
+
+def _faiss_retriever(docs, monkeypatch, **index_params):
+    from core.retrieval import Retriever
+    monkeypatch.setenv("EMBED_CACHE", "off")
+    r = Retriever.__new__(Retriever)
+    r._init_state(docs)
+    r.index_params = {"kind": "flat", **index_params}
+    r.embed_model, r.use_faiss = _WordModel(), True
+    emb = r._encode(r.docs.texts())
+    r.index = build_index(emb, **r.index_params)
+    r.embeddings = r._stored(emb)
+    return r
+
+def test_faiss_live_updates_append_delta_segments(monkeypatch):
+    docs = [{"id": f"d{i}", "text": f"report{i} on coastal flooding", "source": f"{i}.txt"} for i in range(20)]
+    r = _faiss_retriever(docs, monkeypatch)
+    for i in range(20, 30):
+        r.add_documents([{"id": f"d{i}", "text": f"report{i} on coastal flooding", "source": f"{i}.txt"}])
+    assert [s.n for s in r._delta] == [8, 2]
+    assert all(s.index.ntotal == len(s.emb) == s.n for s in r._delta)
+    assert r.retrieve("report25", 1)[0]["id"] == "d25"
+    r.remove_source("25.txt")
+    assert r.retrieve("report25", 1)[0]["id"] != "d25"
+    r.compact()
+    assert r._delta == () and r.index.ntotal == 29
+    assert r.retrieve("report27", 1)[0]["id"] == "d27"
+
+def test_faiss_excludes_tombstones_with_a_selector(monkeypatch):
+    # distinct word mixes, so the HNSW graph is not a clump of identical vectors
+    docs = [{"id": f"d{i}", "text": f"report{i} site{i % 7} year{i % 11} on coastal flooding", "source": f"{i}.txt"}
+            for i in range(50)]
+    r = _faiss_retriever(docs, monkeypatch, kind="hnsw", hnsw_m=8)
+    r.filter_brute_rows = 0   # always search the index itself
+    full = r.retrieve("coastal flooding", 50)
+    for h in full[:40]:
+        r.remove_source(h["source"])
+    hits = r.retrieve("coastal flooding", 5)
+    assert len(hits) == 5 and {h["id"] for h in hits} <= {h["id"] for h in full[40:]}
+
+def test_faiss_compaction_replays_adds_with_their_vectors(monkeypatch):
+    import core.retrieval as retrieval
+    docs = [{"id": f"d{i}", "text": f"report{i} on coastal flooding", "source": f"{i}.txt"} for i in range(10)]
+    r = _faiss_retriever(docs, monkeypatch)
+    r.remove_source("3.txt")
+    build_store = retrieval._scratch_store
+
+    def slow_build(docs, count):
+        r.add_documents([{"id": "late", "text": "late report on heat waves", "source": "late.txt"}])
+        r.remove_source("5.txt")
+        return build_store(docs, count)
+
+    monkeypatch.setattr(retrieval, "_scratch_store", slow_build)
+    encoded, encode = [], r._encode
+    monkeypatch.setattr(r, "_encode", lambda texts, **kw: encoded.append(list(texts)) or encode(texts, **kw))
+    r.compact()
+    # the late add is encoded once, by add_documents; the replay reuses its vectors
+    assert encoded == [["late report on heat waves"]]
+    assert r.index.ntotal == 9 and [s.n for s in r._delta] == [1]
+    assert r.retrieve("heat waves", 1)[0]["id"] == "late"
+    assert "d5" not in {h["id"] for h in r.retrieve("report5 coastal flooding", 9)}
@@ -1,10 +1,5 @@
 # tests/test_api.py
 from fastapi.testclient import TestClient
-import sys
-import os
-
-# Add src to path so we can import the app
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
 
 from api.app import app
 
@@ -36,4 +31,51 @@ def test_demo_outputs():
     """Test if demo outputs endpoint works."""
     response = client.get("/demo-outputs")
     assert response.status_code == 200
-    assert "outputs" in response.json()
\ No newline at end of file
+    assert "outputs" in response.json()
+
+def test_query_batch_endpoint():
+    """Batch search returns one result list per query."""
+    response = client.post("/query/batch", json={"queries": ["sea level", ""], "k": 2})
+    assert response.status_code == 200
+    assert len(response.json()["results"]) == 2
+
+def test_ready_reports_index_status():
+    """Readiness is separate from liveness and reports the build state."""
+    response = client.get("/ready")
+    assert response.status_code in (200, 503)
+    body = response.json()
+    assert "build" in body and "version" in body["index"]
+
+def test_cached_upload_is_indexed_when_missing(tmp_path, monkeypatch):
+    """A result from the DB still makes the file searchable; unknown text means processing it again."""
+    import api.app as app_module
+
+    class Jobs:
+        submitted = []
+        def check_admission(self):
+            pass
+        def submit(self, path, **kwargs):
+            self.submitted.append(path.name)
+            return {"id": "job-1", "status": "queued"}
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(app_module, "INDEX_DIR", tmp_path / "index")
+    monkeypatch.setattr(app_module, "register_chunks", None)
+    monkeypatch.setattr(app_module, "_jobs", Jobs())
+    monkeypatch.setattr(app_module, "find_result_by_hash", lambda h: {"summaries": {}})
+    upload = ("ice.txt", b"Glaciers retreat every decade as winters warm.", "text/plain")
+    try:
+        first = client.post("/process", files={"file": upload}).json()
+        assert first["status"] == "done" and first["result"]["indexed_chunks"] == 1
+        assert client.post("/process", files={"file": upload}).json()["result"]["indexed_chunks"] == 0
+        hits = client.post("/query", json={"query": "glaciers", "k": 1}).json()["results"]
+        assert hits[0]["source"] == "ice.txt_part_1"
+
+        source = str((tmp_path / "uploads" / first["content_hash"] / "ice.txt").resolve())
+        assert client.request("DELETE", "/documents", json={"source": source}).json() == {"removed": 1}
+        assert client.post("/process", files={"file": upload}).json()["result"]["indexed_chunks"] == 1
+
+        resp = client.post("/process", files={"file": ("scan.pdf", b"%PDF-1.4", "application/pdf")}).json()
+        assert resp["job_id"] == "job-1" and Jobs.submitted == ["scan.pdf"]
+    finally:
+        app_module._index.close()
@@ -0,0 +1,30 @@
+import random
+import numpy as np
+from core.bm25 import BM25Index
+
+def _exhaustive(index, query, k):
+    scores = np.zeros(index.n_docs)
+    for w in set(index.analyzer(query)):
+        if w in index.vocab:
+            ids, imp = index._postings(index.vocab[w])
+            scores[ids] += imp
+    return np.sort(scores)[::-1][:k]
+
+def test_max_score_pruning_matches_exhaustive_scoring():
+    rng = random.Random(0)
+    words = [f"term{i}" for i in range(300)]
+    weights = [1 / (i + 1) for i in range(300)]
+    texts = [" ".join(rng.choices(words, weights=weights, k=30)) for _ in range(2000)]
+    index = BM25Index(texts)
+    for _ in range(50):
+        query = " ".join(rng.choices(words, k=4))
+        ids, scores = index.search(query, 10)
+        assert np.allclose(scores, _exhaustive(index, query, 10), atol=1e-5)
+
+def test_bm25_save_and_load(tmp_path):
+    index = BM25Index(["sea level rise", "coral reef bleaching", "sea ice loss"])
+    index.save(tmp_path / "bm25.npz")
+    loaded = BM25Index.load(tmp_path / "bm25.npz")
+    ids, _ = loaded.search("coral reef", 2)
+    assert ids.tolist() == [1]
+    assert BM25Index([]).search("anything", 3)[0].size == 0
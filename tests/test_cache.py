@@ -0,0 +1,29 @@
+from core.cache import QueryCache
+
+def test_query_cache_lru_and_normalization():
+    c = QueryCache(maxsize=2, ttl=60)
+    c.put(c.make_key("Sea  Level Rise", 5, tag=1), ["a"])
+    assert c.get(c.make_key("sea level rise", 5, tag=1)) == ["a"]
+    assert c.get(c.make_key("sea level rise", 3, tag=1)) is None
+
+    c.put(c.make_key("b", 5, tag=1), ["b"])
+    c.put(c.make_key("c", 5, tag=1), ["c"])
+    assert c.get(c.make_key("b", 5, tag=1)) == ["b"]
+    assert c.get(c.make_key("sea level rise", 5, tag=1)) is None  # evicted
+    assert c.stats()["hits"] == 2 and c.stats()["misses"] == 2
+
+def test_query_cache_keeps_tags_apart_and_ttl_invalidates():
+    c = QueryCache(maxsize=10, ttl=60, max_tags=2)
+    c.put(c.make_key("q", 5, tag=("v1", 0)), ["old"])
+    assert c.get(c.make_key("q", 5, tag=("v1", 1))) is None
+    c.put(c.make_key("q", 5, tag=("v1", 1)), ["new"])
+    # a query still pinned to the old index neither misses nor wipes the new entries
+    assert c.get(c.make_key("q", 5, tag=("v1", 0))) == ["old"]
+    assert c.get(c.make_key("q", 5, tag=("v1", 1))) == ["new"]
+    c.put(c.make_key("q", 5, tag=("v2", 0)), ["newer"])
+    assert c.get(c.make_key("q", 5, tag=("v1", 0))) is None   # least recently used tag dropped
+    assert c.stats()["size"] == 2 and c.stats()["tags"] == 2
+
+    c = QueryCache(maxsize=10, ttl=0)
+    c.put(c.make_key("q", 5), ["x"])
+    assert c.get(c.make_key("q", 5)) is None
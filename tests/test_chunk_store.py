@@ -0,0 +1,72 @@
+import json
+
+from core.chunk_store import ChunkStore, write_chunk_store
+from core.retrieval import Retriever
+from core.filters import normalize_filters
+
+DOCS = [
+    {"id": "sea_part_1", "text": "Sea level rise threatens coastal cities.", "source": "sea.txt",
+     "start": 0, "end": 40, "start_token": 0, "end_token": 6, "modality": "text", "ingested_at": 1700000000.0},
+    {"id": "fire_part_1", "text": "Wildfires spread faster — in hot dry summers.", "source": "fire.txt",
+     "duplicates": [{"id": "fire2_part_1", "source": "fire2.txt"}]},
+    {"id": "coral_part_1", "text": "", "source": None, "ingested_at": "2024-05-01"},
+]
+
+def test_round_trip_and_lookup_by_id(tmp_path):
+    write_chunk_store(tmp_path, DOCS)
+    store = ChunkStore.open(tmp_path)
+    assert len(store) == 3
+    assert [store[i] for i in range(3)] == [
+        DOCS[0], DOCS[1], {"id": "coral_part_1", "text": "", "source": None, "ingested_at": "2024-05-01"}]
+    assert store[-2]["text"] == DOCS[1]["text"]
+    assert store.text_of("fire_part_1") == DOCS[1]["text"]
+    assert store.get("sea_part_1")["source"] == "sea.txt"
+    assert store.get("missing") is None
+    assert json.loads((tmp_path / "chunks" / "strings.json").read_text())["source"] == ["sea.txt", "fire.txt"]
+
+def test_retriever_serves_saved_chunks_from_the_store(tmp_path):
+    r = Retriever([d for d in DOCS if d["text"]])
+    r.save(tmp_path)
+    assert not (tmp_path / "chunks_meta.json").exists()
+    loaded = Retriever.load(tmp_path)
+    assert loaded.docs.store is not None
+    hit = loaded.retrieve("sea level", 1)[0]
+    assert hit["id"] == "sea_part_1" and hit["start_token"] == 0
+    assert loaded.retrieve("wildfires", 1, filters={"source": "fire2.txt"})[0]["id"] == "fire_part_1"
+
+    loaded.add_documents([{"id": "ice_part_1", "text": "Glaciers retreat every decade.", "source": "ice.txt"}])
+    loaded.save(tmp_path)
+    reloaded = Retriever.load(tmp_path)
+    assert [d["id"] for d in reloaded.docs] == ["sea_part_1", "fire_part_1", "ice_part_1"]
+    assert reloaded.retrieve("glaciers", 1)[0]["id"] == "ice_part_1"
+
+def test_loaded_and_compacted_indexes_filter_like_in_memory_ones(tmp_path):
+    docs = [d for d in DOCS if d["text"]] + [
+        {"id": "ice_part_1", "text": "Glaciers retreat every decade.", "source": "ice.pdf", "ingested_at": "2024-05-01"}]
+    r = Retriever(docs, backend="bm25")
+    r.save(tmp_path)
+    loaded = Retriever.load(tmp_path)
+    filters = [{"source": "fire2.txt"}, {"modality": "pdf"}, {"modality": "text"}, {"since": "2024-01-01"}]
+    masks = [r._meta.mask(f).tolist() for f in map(normalize_filters, filters)]
+    assert [loaded._meta.mask(f).tolist() for f in map(normalize_filters, filters)] == masks
+    assert {k: list(v) for k, v in loaded._rows_by_source.items()} == {"sea.txt": [0], "fire.txt": [1], "ice.pdf": [2]}
+
+    loaded.remove_source("sea.txt")
+    loaded.compact()
+    # compacted rows are served from a (scratch) store, not rebuilt as dicts on the heap
+    assert loaded.docs.store is not None and loaded.docs.stored == len(loaded.docs) == 2
+    assert [loaded._meta.mask(f).tolist() for f in map(normalize_filters, filters)] == [m[1:] for m in masks]
+    assert loaded.retrieve("glaciers", 1, filters={"modality": "pdf"})[0]["id"] == "ice_part_1"
+    loaded.save(tmp_path)
+    assert [d["id"] for d in Retriever.load(tmp_path).docs] == ["fire_part_1", "ice_part_1"]
+
+def test_store_without_path_column_is_still_read(tmp_path):
+    import numpy as np
+    write_chunk_store(tmp_path, DOCS[:1])
+    cols = tmp_path / "chunks" / "columns.npy"
+    old = np.load(cols)
+    names = [n for n in old.dtype.names if n != "path"]
+    np.save(cols, old[names].astype([(n, old.dtype[n]) for n in names]))
+    store = ChunkStore.open(tmp_path)
+    assert store[0] == DOCS[0]
+    assert list(store.postings("path")) == [None]
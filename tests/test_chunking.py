@@ -0,0 +1,46 @@
+from core.chunking import canonical_text, chunk_document, chunk_spans, source_text
+from core.utils import chunk_text
+
+TEXT = ("Sea levels are rising. Oceans absorb most of the extra heat! "
+        "Coral reefs bleach in warm water.\n\nWildfires spread faster in dry summers. "
+        "Glaciers retreat every decade.")
+
+def test_chunks_end_on_sentence_boundaries_within_budget():
+    chunks = chunk_document(TEXT, "doc", "doc.txt", max_tokens=12, overlap_tokens=0)
+    assert [c["text"] for c in chunks] == [
+        "Sea levels are rising. Oceans absorb most of the extra heat!",
+        "Coral reefs bleach in warm water.",
+        "Wildfires spread faster in dry summers. Glaciers retreat every decade.",
+    ]
+    for c in chunks:
+        assert TEXT[c["start"]:c["end"]] == c["text"]
+        assert c["end_token"] - c["start_token"] == len(c["text"].split()) <= 12
+    assert [c["id"] for c in chunks] == ["doc_part_1", "doc_part_2", "doc_part_3"]
+
+def test_overlap_repeats_whole_trailing_sentences():
+    chunks = chunk_document(TEXT, "doc", max_tokens=14, overlap_tokens=6)
+    assert chunks[1]["text"].startswith("Coral reefs bleach")
+    assert chunks[2]["text"].startswith("Wildfires spread")
+    assert chunks[2]["start_token"] < chunks[1]["end_token"]
+    assert chunks[-1]["end"] == len(TEXT)
+
+def test_long_unpunctuated_text_is_split_with_overlap():
+    words = " ".join(f"w{i}" for i in range(50))
+    spans = chunk_spans(words, max_tokens=20, overlap_tokens=5)
+    assert [(t0, t1) for _, _, t0, t1 in spans] == [(0, 20), (15, 35), (30, 50)]
+    # utils.chunk_text terminates and covers the end (it used to re-slice the tail forever)
+    assert chunk_text(words, max_tokens=20, overlap=5)[-1].endswith("w49")
+    assert chunk_text("") == []
+
+def test_offsets_point_into_the_canonical_text(tmp_path):
+    raw = tmp_path / "notes.txt"
+    raw.write_text("  Sea levels   are rising.\r\n\r\nCoral reefs bleach.  ", encoding="utf-8")
+    pdf = tmp_path / "report.pdf"
+    pdf.write_bytes(b"%PDF-1.4")
+    for path, extracted in ((raw, None), (pdf, "Extracted text. It has two sentences.")):
+        text, text_path = canonical_text(path, extracted)
+        assert text_path == (raw if extracted is None else tmp_path / "report.pdf.txt")
+        chunks = chunk_document(text, path.name, str(path), max_tokens=4, overlap_tokens=0, path=str(text_path))
+        assert len(chunks) == 2
+        for c in chunks:
+            assert source_text(c["path"])[c["start"]:c["end"]] == c["text"]
@@ -0,0 +1,33 @@
+import random
+
+from core.dedup import MinHasher, dedup_chunks, near_duplicate_groups
+
+WORDS = "sea level ocean heat carbon glacier drought wildfire coral reef rain storm policy emission".split()
+
+def _text(seed, n=120):
+    rng = random.Random(seed)
+    return " ".join(rng.choice(WORDS) + str(rng.randrange(50)) for _ in range(n))
+
+def test_signature_agreement_tracks_jaccard():
+    h = MinHasher()
+    a = _text(1)
+    b = a.rsplit(" ", 3)[0] + " one two three"
+    assert (h.signature(a) == h.signature(a)).all()
+    assert (h.signature(a) == h.signature(b)).mean() > 0.8
+    assert (h.signature(a) == h.signature(_text(2))).mean() < 0.1
+
+def test_dedup_collapses_clusters_and_keeps_provenance():
+    base = _text(3)
+    docs = [
+        {"id": "a1", "text": base, "source": "a.txt"},
+        {"id": "u1", "text": _text(4), "source": "a.txt"},
+        {"id": "b1", "text": base.replace(base.split()[5], "changed", 1), "source": "b.txt"},
+        {"id": "c1", "text": "Subscribe to our newsletter. " + base, "source": "c.txt"},
+        {"id": "e1", "text": "", "source": "e.txt"},
+        {"id": "e2", "text": "", "source": "e.txt"},
+    ]
+    assert near_duplicate_groups([d["text"] for d in docs]) == [0, 1, 0, 0, 4, 5]
+    kept = dedup_chunks(docs)
+    assert [d["id"] for d in kept] == ["a1", "u1", "e1", "e2"]
+    assert kept[0]["duplicates"] == [{"id": "b1", "source": "b.txt"}, {"id": "c1", "source": "c.txt"}]
+    assert "duplicates" not in kept[1]
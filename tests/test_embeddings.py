@@ -0,0 +1,44 @@
+import numpy as np
+from core.embeddings import embed_texts
+from core.embed_cache import EmbeddingCache
+
+class CountingModel:
+    """Deterministic stand-in encoder: [len(text), vowels, 1]."""
+    def __init__(self):
+        self.calls = 0
+
+    def get_sentence_embedding_dimension(self):
+        return 3
+
+    def encode(self, texts, **kwargs):
+        self.calls += 1
+        return np.array([[len(t), sum(c in "aeiou" for c in t), 1.0] for t in texts], dtype=np.float32)
+
+TEXTS = [f"chunk number {i} about sea ice" for i in range(50)]
+
+def test_embed_texts_batches_into_preallocated_array():
+    model = CountingModel()
+    out = np.zeros((len(TEXTS), 3), dtype=np.float32)
+    emb = embed_texts(TEXTS, model=model, batch_size=16, out=out)
+    assert emb is out and model.calls == 4
+    assert emb[10, 0] == len(TEXTS[10])
+
+def test_embed_texts_process_pool_matches_in_process():
+    serial = embed_texts(TEXTS, model=CountingModel(), batch_size=8, normalize=True)
+    parallel = embed_texts(TEXTS, model=CountingModel(), batch_size=8, workers=2, normalize=True)
+    assert np.allclose(serial, parallel)
+    assert np.allclose(np.linalg.norm(parallel, axis=1), 1.0)
+
+def test_embedding_cache_only_encodes_new_chunks(tmp_path):
+    cache = EmbeddingCache(tmp_path / "cache.sqlite")
+    first = embed_texts(TEXTS, model=CountingModel(), batch_size=16, cache=cache)
+    model = CountingModel()
+    changed = TEXTS[:-1] + ["a brand new chunk"]
+    second = embed_texts(changed, model=model, batch_size=16, cache=cache)
+    assert model.calls == 1
+    assert np.allclose(first[:-1], second[:-1])
+    assert second[-1, 0] == len("a brand new chunk")
+
+    # vectors of another model key are evicted on first use of a new key
+    cache.evict_other_models("other-model")
+    assert cache.count() == 0
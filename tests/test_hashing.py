@@ -0,0 +1,40 @@
+import numpy as np
+
+from core.hashing import HashedIndex, HashedIndexWriter
+from core.retrieval import Retriever
+
+DOCS = [
+    {"id": "a", "text": "Sea level rise threatens coastal cities.", "source": "a.txt"},
+    {"id": "b", "text": "Wildfires spread faster in hot dry summers.", "source": "b.txt"},
+    {"id": "c", "text": "Coral reefs bleach when ocean temperatures climb.", "source": "c.txt"},
+]
+
+def test_streamed_build_matches_in_memory_build(tmp_path):
+    texts = [d["text"] for d in DOCS] * 3
+    writer = HashedIndexWriter(tmp_path, n_features=1 << 12)
+    assert writer.add(texts, batch_size=2) == 9
+    writer.close()
+    loaded = HashedIndex.load(tmp_path)
+    built = HashedIndex(texts, n_features=1 << 12)
+    assert not loaded.matrix.data.flags.writeable   # a view of the read-only mapping, not a copy
+    assert (loaded.df == built.df).all() and loaded.n_docs == built.n_docs == 9
+    assert abs(loaded.matrix - built.matrix).max() < 1e-6
+    assert not list(tmp_path.glob("*.spool"))
+
+def test_hashed_backend_grows_without_refit(tmp_path):
+    r = Retriever(DOCS, backend="hashed")
+    assert r.backend == "hashed"
+    assert r.retrieve("coastal sea level", 1)[0]["id"] == "a"
+
+    # terms never seen before are searchable as soon as they are added
+    r.add_documents([{"id": "d", "text": "Permafrost thaw releases methane.", "source": "d.txt"}])
+    assert r.hashed.df.sum() > 0 and r.hashed.n_docs == 4
+    assert r.retrieve("permafrost methane", 1)[0]["id"] == "d"
+
+    r.remove_source("b.txt")
+    r.compact()
+    assert r.hashed.n_docs == 3
+    r.save(tmp_path)
+    loaded = Retriever.load(tmp_path)
+    assert loaded.backend == "hashed"
+    assert [h["id"] for h in loaded.retrieve("methane coral wildfires", 3)][:2] == ["d", "c"]
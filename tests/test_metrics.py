@@ -0,0 +1,23 @@
+from core import metrics
+
+def test_histogram_renders_prometheus_text():
+    h = metrics.Histogram("test_stage_seconds", "Test histogram.", buckets=(0.1, 1.0))
+    h.observe(0.05, stage="ocr_page")
+    h.observe(0.5, stage="ocr_page")
+    h.observe(5.0, stage="ocr_page")
+    text = metrics.render()
+    assert "# TYPE test_stage_seconds histogram" in text
+    assert 'test_stage_seconds_bucket{stage="ocr_page",le="0.1"} 1' in text
+    assert 'test_stage_seconds_bucket{stage="ocr_page",le="1.0"} 2' in text
+    assert 'test_stage_seconds_bucket{stage="ocr_page",le="+Inf"} 3' in text
+    assert 'test_stage_seconds_count{stage="ocr_page"} 3' in text
+
+def test_worker_samples_replay_into_parent(monkeypatch):
+    c = metrics.Counter("test_bytes_total", "Test counter.")
+    monkeypatch.setattr(metrics, "_buffer", [])
+    c.inc(10)
+    samples = metrics.drain_samples()
+    monkeypatch.setattr(metrics, "_buffer", None)
+    assert c.value() == 0
+    metrics.replay(samples)
+    assert c.value() == 10
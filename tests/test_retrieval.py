@@ -0,0 +1,269 @@
+import threading
+
+import pytest
+from core.retrieval import Retriever
+from core.hybrid import HybridRetriever, fuse, load_retriever
+from core.index_store import index_exists, is_stale, write_manifest
+
+DOCS = [
+    {"id": "a", "text": "Sea level rise threatens coastal cities.", "source": "a.txt"},
+    {"id": "b", "text": "Wildfires spread faster in hot dry summers.", "source": "b.txt"},
+    {"id": "c", "text": "Coral reefs bleach when ocean temperatures climb.", "source": "c.txt"},
+]
+
+def test_retriever_save_and_load(tmp_path):
+    r = Retriever(DOCS)
+    r.save(tmp_path)
+    loaded = Retriever.load(tmp_path)
+    assert loaded.retrieve("sea level", 1)[0]["id"] == "a"
+    assert loaded.retrieve("coral reefs", 1)[0]["id"] == "c"
+
+def test_index_staleness(tmp_path):
+    src = tmp_path / "text"
+    src.mkdir()
+    doc = src / "doc.txt"
+    doc.write_text("Glaciers are melting.")
+    idx = tmp_path / "index"
+    assert not index_exists(idx)
+
+    Retriever(DOCS).save(idx)
+    write_manifest(idx, backend="tfidf", source_dirs=[src])
+    assert index_exists(idx)
+    assert not is_stale(idx)
+
+    doc.write_text("Glaciers are melting faster every decade.")
+    assert is_stale(idx)
+
+def test_add_documents_is_searchable_and_replaces_source():
+    r = Retriever(DOCS)
+    r.add_documents([{"id": "d", "text": "Rising ocean temperatures bleach coral reefs.", "source": "c.txt"}])
+    ids = [d["id"] for d in r.retrieve("coral reefs", 3)]
+    assert "d" in ids and "c" not in ids
+
+    r.remove_source("c.txt")
+    assert all(d["source"] != "c.txt" for d in r.retrieve("coral reefs", 3))
+
+def test_compact_drops_tombstones():
+    r = Retriever(DOCS)
+    r.add_documents([{"id": "e", "text": "Permafrost thaw releases methane.", "source": "b.txt"}])
+    r.compact()
+    assert not r.is_dirty()
+    assert [d["id"] for d in r.docs] == ["a", "c", "e"]
+    # terms unseen at the original fit are searchable after compaction
+    assert r.retrieve("permafrost methane", 1)[0]["id"] == "e"
+
+def test_writes_during_compaction_do_not_block_and_are_replayed(monkeypatch):
+    import core.retrieval as retrieval
+    build_store = retrieval._scratch_store
+
+    def write_meanwhile():
+        r.remove_source("a.txt")
+        r.add_documents([{"id": "e", "text": "Permafrost thaw releases methane.", "source": "e.txt"}])
+        r.add_documents([{"id": "f", "text": "Hot summers dry out forests.", "source": "b.txt"}])
+
+    def slow_build(docs, count):
+        # runs off the write lock: a writer thread must get through while the index builds
+        writer = threading.Thread(target=write_meanwhile)
+        writer.start()
+        writer.join(timeout=10)
+        assert not writer.is_alive()
+        return build_store(docs, count)
+
+    for backend in ("tfidf", "hashed", "bm25"):
+        r = Retriever(DOCS, backend=backend)
+        r.add_documents([{"id": "d", "text": "Glaciers retreat as winters warm.", "source": "d.txt"}])
+        r.remove_source("c.txt")
+        monkeypatch.setattr(retrieval, "_scratch_store", slow_build)
+        r.compact()
+        monkeypatch.setattr(retrieval, "_scratch_store", build_store)
+        assert r._n_main == 3 and len(r.docs) == 5
+        assert {h["id"] for h in r.retrieve("coastal cities wildfires summers glaciers permafrost coral", 5)} == {"d", "e", "f"}
+        assert r.remove_source("e.txt") == 1
+        assert all(h["id"] != "e" for h in r.retrieve("permafrost methane", 5))
+        r.compact()
+        assert [d["id"] for d in r.docs] == ["d", "f"]
+
+def test_tfidf_terms_unseen_at_fit_are_searchable_before_compaction():
+    r = Retriever(DOCS)
+    r.add_documents([{"id": "e", "text": "Permafrost thaw releases methane.", "source": "e.txt"}])
+    r.add_documents([{"id": "f", "text": "Methane leaks from thawing tundra.", "source": "f.txt"}])
+    assert r.is_dirty()
+    assert [h["id"] for h in r.retrieve("permafrost methane", 2)] == ["e", "f"]
+    assert r.retrieve("tundra", 1)[0]["id"] == "f"
+    assert r.retrieve("sea level", 1)[0]["id"] == "a"
+
+def test_retrieve_batch_matches_single_queries():
+    r = Retriever(DOCS)
+    r.add_documents([{"id": "d", "text": "Heat waves and wildfires in the summer.", "source": "d.txt"}])
+    queries = ["sea level", "wildfires summer", "coral ocean"]
+    batch = r.retrieve_batch(queries, 2)
+    assert len(batch) == 3
+    for q, hits in zip(queries, batch):
+        single = r.retrieve(q, 2)
+        assert [h["id"] for h in hits] == [h["id"] for h in single]
+        assert hits[0]["score"] >= hits[1]["score"]
+
+def test_bm25_backend_roundtrip_and_live_updates(tmp_path):
+    r = Retriever(DOCS, backend="bm25")
+    assert r.retrieve("wildfires", 1)[0]["id"] == "b"
+    r.add_documents([{"id": "f", "text": "Drought fuels wildfires across the west.", "source": "f.txt"}])
+    assert {d["id"] for d in r.retrieve("wildfires", 2)} == {"b", "f"}
+    r.save(tmp_path)
+    loaded = Retriever.load(tmp_path)
+    assert loaded.backend == "bm25"
+    assert loaded.retrieve("drought", 1)[0]["id"] == "f"
+
+def test_hybrid_fuses_both_legs():
+    lexical = Retriever(DOCS, backend="bm25")
+    dense = Retriever(DOCS)   # any second leg exercises the fusion
+    for fusion in ("rrf", "weighted"):
+        h = HybridRetriever(lexical, dense, fusion=fusion)
+        hits = h.retrieve("coral reefs ocean", 2)
+        assert hits[0]["id"] == "c"
+        assert set(hits[0]["leg_scores"]) == {"lexical", "dense"}
+        lex_hits, dense_hits = h.retrieve_legs(["coral reefs ocean"], 2)[0]
+        assert fuse(lex_hits, dense_hits, 2, fusion) == hits
+        h.close()
+    assert HybridRetriever(lexical).retrieve("wildfires", 1)[0]["id"] == "b"
+    # every hybrid shares one leg pool instead of leaking threads per index
+    for _ in range(10):
+        HybridRetriever(lexical, dense).retrieve("wildfires", 1)
+    assert sum(t.name.startswith("hybrid") for t in threading.enumerate()) <= 4
+
+def test_hybrid_reloads_as_hybrid_without_env(tmp_path, monkeypatch):
+    monkeypatch.delenv("RETRIEVER_BACKEND", raising=False)
+    HybridRetriever(Retriever(DOCS, backend="bm25"), Retriever(DOCS)).save(tmp_path)
+    write_manifest(tmp_path, backend="hybrid", source_dirs=[tmp_path])
+    loaded = load_retriever(tmp_path)
+    assert isinstance(loaded, HybridRetriever) and loaded.lexical.backend == "bm25"
+    assert loaded.retrieve("wildfires", 1)[0]["id"] == "b"
+
+def test_metadata_filters_restrict_every_backend():
+    docs = [
+        {**DOCS[0], "modality": "pdf", "ingested_at": "2024-01-10"},
+        {**DOCS[1], "modality": "audio", "ingested_at": "2024-03-01"},
+        {**DOCS[2], "modality": "pdf", "ingested_at": "2024-06-01"},
+    ]
+    for backend in ("tfidf", "bm25"):
+        r = Retriever(docs, backend=backend)
+        assert [h["id"] for h in r.retrieve("coral reefs sea level", 3, {"modality": "pdf", "since": "2024-05-01"})] == ["c"]
+        hits = r.retrieve("coral reefs sea level", 3, {"source": ["a.txt", "b.txt"]})
+        assert hits[0]["id"] == "a" and {h["id"] for h in hits} <= {"a", "b"}
+        assert r.retrieve("wildfires", 3, {"modality": "image"}) == []
+
+        r.add_documents([{"id": "d", "text": "Wildfires near the coast.", "source": "d.txt", "modality": "image"}])
+        assert [h["id"] for h in r.retrieve("wildfires", 3, {"modality": "image"})] == ["d"]
+        r.remove_source("d.txt")
+        assert r.retrieve("wildfires", 3, {"modality": "image"}) == []
+
+    with pytest.raises(ValueError):
+        Retriever(docs).retrieve("coral", 1, {"colour": "blue"})
+
+def test_shipped_text_files_keep_the_modality_they_were_converted_from(tmp_path):
+    from pathlib import Path
+    from core.chunking import chunk_document, source_text
+    from core.filters import source_modality
+    text_dir = Path(__file__).resolve().parents[1] / "Data" / "text"
+    files = sorted(text_dir.glob("*.txt"))
+    modality = {p.name: source_modality(p) for p in files}
+    assert modality["Global Warming 101 ｜ National Geographic.en.txt"] == "youtube"
+    assert modality["IPCC_AR6_WGII_SummaryForPolicymakers.txt"] == "pdf"
+    assert modality["climate_basics.txt"] == "text"
+    assert sorted(modality.values()).count("youtube") == 3
+
+    chunks = [c for p in files for c in chunk_document(source_text(p), p.name, str(p))]
+    youtube = {str(p) for p in files if modality[p.name] == "youtube"}
+    # chunks built without a modality (e.g. by scripts/build_index.py) get it from their source
+    r = Retriever(chunks, backend="bm25")
+    r.save(tmp_path)
+    for r in (r, Retriever.load(tmp_path, backend="bm25")):
+        hits = r.retrieve("global warming", 5, {"modality": "youtube"})
+        assert hits and {h["source"] for h in hits} <= youtube
+
+def test_broad_and_narrow_filters_rank_the_same():
+    docs = [{"id": f"{i}", "text": f"Wildfire report {i} " + "smoke " * (i % 7), "source": f"{i % 3}.txt"}
+            for i in range(60)]
+    for backend in ("tfidf", "hashed"):
+        r = Retriever(docs, backend=backend)
+        r.remove_source("2.txt")
+        r.add_documents([{"id": "new", "text": "Wildfire smoke smoke", "source": "0.txt"}], replace=False)
+        runs = []
+        for ratio in (0.0, 1.0):   # always slice the allowed rows / always mask the full product
+            r.filter_slice_ratio = ratio
+            runs.append(r.retrieve_batch(["wildfire smoke", "report 7"], 5, {"source": ["0.txt", "2.txt"]}))
+        # same scores (ties may come back in either order), same unambiguous winners
+        for sliced, masked in zip(*runs):
+            assert [h["score"] for h in sliced] == pytest.approx([h["score"] for h in masked])
+        assert [h["id"] for h in runs[0][0]] == [h["id"] for h in runs[1][0]]
+        assert all(h["source"] == "0.txt" for hits in runs[0] for h in hits) and len(runs[0][0]) == 5
+
+def test_removing_a_source_keeps_near_duplicates_from_other_sources(tmp_path):
+    from core.chunking import canonical_text, chunk_document
+    from core.dedup import dedup_chunks
+    a, b, c = (tmp_path / n for n in ("a.txt", "b.txt", "c.txt"))
+    a.write_text("Sea level rise threatens coastal cities around the whole world.", encoding="utf-8")
+    b.write_text("Annual climate report for the year.\n\nSea level rise threatens coastal cities around the whole world.",
+                 encoding="utf-8")
+    c.write_text("Wildfires spread faster in hot dry summers.", encoding="utf-8")
+    chunks = []
+    for p in (a, b, c):
+        text, path = canonical_text(p)
+        chunks.extend(chunk_document(text, p.name, str(p), max_tokens=10, overlap_tokens=0, path=str(path)))
+    docs = dedup_chunks(chunks)
+    assert [d["id"] for d in docs] == ["a.txt_part_1", "b.txt_part_1", "c.txt_part_1"]
+    assert docs[0]["duplicates"][0]["id"] == "b.txt_part_2"
+    start = b.read_text(encoding="utf-8").index("Sea")
+
+    r = Retriever(docs, backend="bm25")
+    assert r.remove_source(str(a)) == 1
+    hit = r.retrieve("coastal cities", 1)[0]
+    assert (hit["id"], hit["source"], hit["start"]) == ("b.txt_part_2", str(b), start)
+    assert hit["text"] == b.read_text(encoding="utf-8")[start:] and "duplicates" not in hit
+    assert r.retrieve("coastal cities", 3, filters={"source": str(a)}) == []
+    assert r.remove_source(str(b)) == 2
+    assert r.retrieve("coastal cities", 3) == []
+
+    # removing the duplicate's source instead leaves the representative without it
+    r = Retriever(docs, backend="bm25")
+    r.remove_source(str(b))
+    assert r.retrieve("coastal cities", 3, filters={"source": str(b)}) == []
+    assert "duplicates" not in r.retrieve("coastal cities", 1)[0]
+    r.compact()
+    r.remove_source(str(a))
+    assert r.retrieve("coastal cities", 3) == []
+
+def test_adds_append_small_delta_segments():
+    for backend in ("tfidf", "hashed", "bm25"):
+        r = Retriever(DOCS, backend=backend)
+        for i in range(100):
+            r.add_documents([{"id": f"n{i}", "text": f"Storm surge number{i} floods harbours.", "source": f"n{i}.txt"}])
+        # merged like a binary counter: one segment per set bit of the row count
+        assert len(r._delta) == bin(100).count("1")
+        assert sum(s.n for s in r._delta) == 100
+        assert [s.offset for s in r._delta] == sorted(s.offset for s in r._delta)
+        assert r.retrieve("number7 harbours", 1)[0]["id"] == "n7"
+        assert r.retrieve("number99 harbours", 1)[0]["id"] == "n99"
+        assert r.retrieve("coral reefs", 1)[0]["id"] == "c"
+        r.compact()
+        assert r._delta == () and r.retrieve("number42", 1)[0]["id"] == "n42"
+
+def test_tombstones_are_masked_not_over_fetched(monkeypatch):
+    docs = [{"id": f"{i}", "text": f"Flood warning {i} " + "flood " * (i % 5), "source": f"{i}.txt"} for i in range(40)]
+    for backend in ("tfidf", "bm25"):
+        r = Retriever(docs, backend=backend)
+        top = r.retrieve("flood warning", 40)
+        for h in top[:30]:
+            r.remove_source(h["source"])
+        asked = []
+        name = "_bm25_top" if backend == "bm25" else "_sparse_top"
+        real = getattr(Retriever, name)
+        def spy(*args, **kwargs):
+            asked.append(args[2] if backend == "bm25" else args[3])
+            return real(*args, **kwargs)
+        monkeypatch.setattr(Retriever, name, staticmethod(spy) if backend == "bm25" else spy)
+        hits = r.retrieve("flood warning", 5)
+        monkeypatch.undo()
+        # the same scores as the live rows of the full ranking (ties may swap)
+        assert [h["score"] for h in hits] == pytest.approx([h["score"] for h in top[30:35]])
+        assert {h["id"] for h in hits} <= {h["id"] for h in top[30:]}
+        assert asked and max(asked) == 5
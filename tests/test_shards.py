@@ -0,0 +1,79 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from core.shards import ShardedRetriever, shard_of
+from core.hybrid import load_retriever
+
+DOCS = [
+    {"id": "a", "text": "Sea level rise threatens coastal cities.", "source": "sea.txt"},
+    {"id": "b", "text": "Wildfires spread faster in hot dry summers.", "source": "fire.txt"},
+    {"id": "c", "text": "Coral reefs bleach when ocean temperatures climb.", "source": "coral.txt"},
+    {"id": "d", "text": "Glaciers retreat as winters warm.", "source": "ice.txt"},
+]
+
+@pytest.fixture
+def sharded():
+    r = ShardedRetriever.build(DOCS, 2, backend="bm25", timeout=10)
+    yield r
+    r.close()
+
+def test_scatter_gather_merges_shards(sharded):
+    assert sharded.num_chunks == len(DOCS)
+    assert sharded.retrieve("coral reefs", 1)[0]["id"] == "c"
+    hits = sharded.retrieve_batch(["wildfires", "glaciers winters"], 2)
+    assert [h[0]["id"] for h in hits] == ["b", "d"]
+    assert all(h[0]["score"] >= h[-1]["score"] for h in hits)
+
+    # a shard that dies is left out of answers instead of failing them
+    assert shard_of("coral.txt", 2) != shard_of("sea.txt", 2)
+    dead = shard_of("coral.txt", 2)
+    sharded.shards[dead].proc.kill()
+    sharded.shards[dead].proc.join()
+    ids = {h["id"] for h in sharded.retrieve("sea level coral reefs", 4)}
+    assert "a" in ids and "c" not in ids
+    assert sharded.shard_status()[dead]["alive"] is False
+
+def test_writes_route_by_source_and_roundtrip(sharded, tmp_path):
+    sharded.add_documents([{"id": "e", "text": "Drought fuels wildfires.", "source": "fire.txt"}])
+    assert [h["id"] for h in sharded.retrieve("wildfires", 3)] == ["e"]
+    assert sharded.remove_source("fire.txt") == 1
+    assert sharded.retrieve("drought wildfires", 3) == []
+
+    sharded.add_documents([{"id": "f", "text": "Heatwaves strain power grids.", "source": "f.txt"}])
+    sharded.save(tmp_path)
+    loaded = load_retriever(tmp_path)
+    try:
+        assert loaded.num_shards == 2 and loaded.backend == "bm25"
+        assert loaded.retrieve("heatwaves", 1)[0]["id"] == "f"
+    finally:
+        loaded.close()
+
+def test_hybrid_shards_fuse_at_the_coordinator():
+    sharded = ShardedRetriever.build(DOCS, 2, backend="hybrid", timeout=30)
+    try:
+        assert sharded.retrieve("coral reefs", 1)[0]["id"] == "c"
+        legs = sharded._fanout("retrieve_legs", (["glaciers"], 10, None), timeout=30)
+        assert all(len(p) == 1 and len(p[0]) == 2 for p in legs)
+        assert [h["id"] for h in sharded.retrieve_batch(["wildfires", "glaciers winters"], 1)[1]] == ["d"]
+    finally:
+        sharded.close()
+
+def test_concurrent_queries_share_a_shard(sharded):
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        answers = list(pool.map(lambda q: sharded.retrieve(q, 1)[0]["id"], ["coral reefs", "wildfires"] * 40))
+    assert answers == ["c", "b"] * 40
+    assert all(s["failures"] == 0 for s in sharded.shard_status())
+
+def test_removing_a_source_promotes_its_duplicates_on_other_shards():
+    assert shard_of("sea.txt", 2) != shard_of("coral.txt", 2)
+    docs = [dict(DOCS[0], duplicates=[{"id": "a2", "source": "coral.txt"}]), DOCS[2]]
+    r = ShardedRetriever.build(docs, 2, backend="bm25", timeout=10)
+    try:
+        assert r.remove_source("sea.txt") == 1
+        hit = r.retrieve("coastal cities", 1)[0]
+        assert (hit["id"], hit["source"]) == ("a2", "coral.txt")
+        assert r.remove_source("coral.txt") == 2
+        assert r.retrieve("coastal cities", 3) == []
+    finally:
+        r.close()
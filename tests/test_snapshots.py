@@ -0,0 +1,127 @@
+import time
+
+from fastapi.testclient import TestClient
+
+from core.retrieval import Retriever
+from core.snapshots import ActiveIndex, current_snapshot, gc_snapshots, publish_snapshot, read_snapshots, snapshot_dir
+import api.app as app_module
+
+DOCS = [
+    {"id": "a", "text": "Sea level rise threatens coastal cities.", "source": "a.txt"},
+    {"id": "b", "text": "Wildfires spread faster in hot dry summers.", "source": "b.txt"},
+]
+
+def _publish(index_dir, version, docs=DOCS):
+    Retriever(docs).save(snapshot_dir(index_dir, version))
+    publish_snapshot(index_dir, version, num_chunks=len(docs))
+
+def test_publish_and_gc_keep_current_recent_and_pinned(tmp_path):
+    assert current_snapshot(tmp_path) == (None, None)
+    for v in ("v1", "v2", "v3", "v4"):
+        _publish(tmp_path, v)
+    assert current_snapshot(tmp_path) == ("v4", snapshot_dir(tmp_path, "v4"))
+
+    assert gc_snapshots(tmp_path, in_use={"v1"}, keep=1) == ["v2"]
+    assert sorted(read_snapshots(tmp_path)["snapshots"]) == ["v1", "v3", "v4"]
+    assert not snapshot_dir(tmp_path, "v2").exists()
+    assert gc_snapshots(tmp_path, keep=1) == ["v1"]
+    assert snapshot_dir(tmp_path, "v3").exists() and snapshot_dir(tmp_path, "v4").exists()
+
+class _Closable:
+    closed = False
+    def close(self):
+        self.closed = True
+
+def test_swapped_out_index_is_retired_after_its_last_query():
+    retired = []
+    active = ActiveIndex(on_retire=retired.append)
+    old, new = _Closable(), _Closable()
+    active.swap(old, "v1")
+    with active.acquire() as r:
+        active.swap(new, "v2")
+        assert r is old and active.retriever is new
+        assert active.in_use() == {"v1", "v2"} and not old.closed
+    deadline = time.time() + 5
+    while not old.closed and time.time() < deadline:
+        time.sleep(0.01)
+    assert old.closed and not new.closed
+    assert retired == ["v1"] and active.in_use() == {"v2"}
+
+def _admin_client(monkeypatch):
+    monkeypatch.setenv("ADMIN_TOKEN", "secret")
+    return TestClient(app_module.app, headers={"X-Admin-Token": "secret"})
+
+def test_admin_reload_is_disabled_without_a_token(tmp_path, monkeypatch):
+    monkeypatch.setattr(app_module, "INDEX_DIR", tmp_path)
+    monkeypatch.setitem(app_module._index_status, "state", "ready")
+    monkeypatch.delenv("ADMIN_TOKEN", raising=False)
+    _publish(tmp_path, "v1")
+    client = TestClient(app_module.app)
+    assert client.post("/admin/reload").status_code == 403
+    monkeypatch.setenv("ADMIN_TOKEN", "secret")
+    assert client.post("/admin/reload", headers={"X-Admin-Token": "wrong"}).status_code == 403
+    assert not app_module._reload_lock.locked()
+
+def test_admin_reload_swaps_in_published_snapshot(tmp_path, monkeypatch):
+    monkeypatch.setattr(app_module, "INDEX_DIR", tmp_path)
+    monkeypatch.setitem(app_module._index_status, "state", "ready")
+    client = _admin_client(monkeypatch)
+    _publish(tmp_path, "v1")
+    try:
+        assert client.post("/admin/reload", json={"version": "nope"}).status_code == 404
+        resp = client.post("/admin/reload")
+        assert resp.status_code == 202 and resp.json()["version"] == "v1"
+        deadline = time.time() + 10
+        while app_module._index.version != "v1" and time.time() < deadline:
+            time.sleep(0.05)
+        assert client.get("/ready").json()["index"]["snapshot"]["version"] == "v1"
+        hits = client.post("/query", json={"query": "wildfires", "k": 1}).json()["results"]
+        assert hits[0]["source"] == "b"
+    finally:
+        while app_module._reload_lock.locked():
+            time.sleep(0.05)
+        app_module._index.close()
+
+def _wait_for_version(version):
+    deadline = time.time() + 10
+    while (app_module._index.version != version or app_module._reload_lock.locked()) and time.time() < deadline:
+        time.sleep(0.05)
+    assert app_module._index.version == version
+
+def test_reload_keeps_documents_ingested_through_the_api(tmp_path, monkeypatch):
+    monkeypatch.setattr(app_module, "INDEX_DIR", tmp_path / "index")
+    monkeypatch.setattr(app_module, "register_chunks", None)
+    monkeypatch.setitem(app_module._index_status, "state", "ready")
+    client = _admin_client(monkeypatch)
+    _publish(tmp_path / "index", "v1")
+    upload = tmp_path / "ice.txt"
+    upload.write_text("Glaciers retreat every decade as winters warm.", encoding="utf-8")
+    try:
+        assert client.post("/admin/reload").status_code == 202
+        _wait_for_version("v1")
+        assert app_module._index_document(upload, upload.read_text(encoding="utf-8")) == 1
+        assert app_module._index_document(upload, upload.read_text(encoding="utf-8")) == 1
+
+        # a snapshot built without the upload, e.g. by scripts/build_index.py
+        client.post("/query", json={"query": "glaciers winters", "k": 3})
+        _publish(tmp_path / "index", "v2")
+        assert client.post("/admin/reload").status_code == 202
+        _wait_for_version("v2")
+        # warmed after the journal replay, so under the generation queries now see
+        with app_module._index.acquire() as served:
+            assert app_module._query_cache.get(app_module._cache_key(served, "glaciers winters", 3)) is not None
+        hits = client.post("/query", json={"query": "glaciers winters", "k": 3}).json()["results"]
+        assert [h["source"] for h in hits if h["score"] > 0] == ["ice.txt_part_1"]
+        assert client.post("/query", json={"query": "wildfires", "k": 1}).json()["results"][0]["source"] == "b"
+
+        assert client.request("DELETE", "/documents", json={"source": str(upload.resolve())}).json() == {"removed": 1}
+        _publish(tmp_path / "index", "v3")
+        assert client.post("/admin/reload").status_code == 202
+        _wait_for_version("v3")
+        hits = client.post("/query", json={"query": "glaciers winters", "k": 3}).json()["results"]
+        assert all(h["source"] != "ice.txt_part_1" for h in hits)
+        assert len(app_module._journal().entries()) == 1
+    finally:
+        while app_module._reload_lock.locked():
+            time.sleep(0.05)
+        app_module._index.close()
@@ -0,0 +1,80 @@
+import core.storage as storage
+
+def test_find_result_by_hash(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "DB_PATH", tmp_path / "db.sqlite")
+    storage.init_db()
+    assert storage.find_result_by_hash("abc") is None
+
+    uid = storage.record_upload("report.pdf", tmp_path / "report.pdf", filetype="pdf", content_hash="abc")
+    summaries = {"one_line": "Seas rise.", "three_bullets": "a\nb\nc", "five_sentence": "Long."}
+    storage.record_result(uid, tmp_path / "missing.json", summaries, {"label": "neutral", "score": 0.0}, False)
+
+    cached = storage.find_result_by_hash("abc")
+    assert cached["summaries"]["one_line"] == "Seas rise."
+    assert cached["follow_up_needed"] is False
+    assert storage.find_result_by_hash("other") is None
+
+def test_init_db_adds_content_hash_to_old_schema(tmp_path, monkeypatch):
+    import sqlite3
+    db = tmp_path / "old.sqlite"
+    conn = sqlite3.connect(db)
+    conn.execute("CREATE TABLE uploads (id INTEGER PRIMARY KEY AUTOINCREMENT, filename TEXT, filepath TEXT, filetype TEXT, uploaded_at TEXT, source TEXT)")
+    conn.commit()
+    conn.close()
+    monkeypatch.setattr(storage, "DB_PATH", db)
+    storage.init_db()
+    storage.record_upload("a.txt", "a.txt", content_hash="h")
+
+def _chunk_rows(db):
+    import sqlite3
+    conn = sqlite3.connect(db)
+    rows = conn.execute("SELECT source_file, chunk_index, id, text_path FROM retrieval_chunks ORDER BY 1, 2").fetchall()
+    conn.close()
+    return rows
+
+def test_chunks_of_same_named_files_do_not_collide(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "DB_PATH", tmp_path / "db.sqlite")
+    storage.init_db()
+    a = [{"id": "notes.txt_part_1", "source": "/a/notes.txt", "path": "/a/notes.txt"}]
+    b = [{"id": "notes.txt_part_1", "source": "/b/notes.txt", "path": "/b/notes.txt"}]
+    storage.register_chunks(a)
+    storage.register_chunks(b)
+    storage.register_chunks(a, replace_sources=False)
+    assert _chunk_rows(storage.DB_PATH) == [
+        ("/a/notes.txt", 0, "notes.txt_part_1", "/a/notes.txt"),
+        ("/a/notes.txt", 1, "notes.txt_part_1", "/a/notes.txt"),
+        ("/b/notes.txt", 0, "notes.txt_part_1", "/b/notes.txt"),
+    ]
+
+def test_init_db_rekeys_old_retrieval_chunks(tmp_path, monkeypatch):
+    import sqlite3
+    db = tmp_path / "old.sqlite"
+    conn = sqlite3.connect(db)
+    conn.execute("CREATE TABLE retrieval_chunks (id TEXT PRIMARY KEY, source_file TEXT, start_token INTEGER, end_token INTEGER, metadata TEXT)")
+    conn.executemany("INSERT INTO retrieval_chunks VALUES (?,?,0,0,'{}')",
+                     [("x_part_1", "x.txt"), ("x_part_2", "x.txt"), ("y_part_1", "y.txt")])
+    conn.commit()
+    conn.close()
+    monkeypatch.setattr(storage, "DB_PATH", db)
+    storage.init_db()
+    assert _chunk_rows(db) == [("x.txt", 0, "x_part_1", None), ("x.txt", 1, "x_part_2", None),
+                               ("y.txt", 0, "y_part_1", None)]
+
+def test_same_named_files_keep_their_own_cached_result(tmp_path, monkeypatch):
+    from core.utils import save_output_json
+    monkeypatch.setattr(storage, "DB_PATH", tmp_path / "db.sqlite")
+    storage.init_db()
+    out = tmp_path / "outputs"
+    for h, line in (("h1", "Seas rise."), ("h2", "Fires spread.")):
+        obj = {"file": f"uploads/{h}/notes.txt", "summaries": {"one_line": line}}
+        path = save_output_json(obj, out, content_hash=h)
+        uid = storage.record_upload("notes.txt", obj["file"], content_hash=h)
+        storage.record_result(uid, path, obj["summaries"], {"label": "neutral", "score": 0.0}, False)
+    assert storage.find_result_by_hash("h1")["summaries"]["one_line"] == "Seas rise."
+    assert storage.find_result_by_hash("h2")["summaries"]["one_line"] == "Fires spread."
+
+    # a row from before outputs were keyed by hash: its JSON may belong to another file
+    shared = save_output_json({"file": "notes.txt", "summaries": {"one_line": "Other file."}}, out)
+    uid = storage.record_upload("notes.txt", "notes.txt", content_hash="h3")
+    storage.record_result(uid, shared, {"one_line": "Ice melts."}, {"label": "neutral", "score": 0.0}, False)
+    assert storage.find_result_by_hash("h3")["summaries"]["one_line"] == "Ice melts."
@@ -7,4 +7,19 @@ def test_summarizer_short_text():
     out = s.summarize_all(text)
     assert out["one_line"] != ""
     assert "three_bullets" in out
-    assert "five_sentence" in out
\ No newline at end of file
+    assert "five_sentence" in out
+
+def test_summarize_lengths_share_one_ranking_in_document_order():
+    text = ("Glaciers are retreating. Carbon emissions drive warming and carbon keeps rising. "
+            "Cats sleep a lot. Warming oceans absorb carbon and heat. Ice sheets melt as warming continues. "
+            "The weather was nice.")
+    s = ExtractiveSummarizer()
+    out = s.summarize_lengths(text, [3, 1, 2])
+    _, sentences, _ = s.rank(text)
+    for n, summary in out.items():
+        picked = [x for x in sentences if x in summary]
+        assert len(picked) == n
+        assert picked == sorted(picked, key=sentences.index)
+    assert out[1] in out[2] and all(x in out[3] for x in out[2].split(". "))
+    assert s.summarize(text, 2) == out[2]
+    assert s.summarize_lengths(text, [10])[10] == text